@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+merge_subtitle.py --align 的耗时和准确率: 生成字幕和逐条对应的"译文", 按比例随机把相邻两行合并成一行,
+漏掉一行, 或把一行拆成两行, 再对齐回去, 统计每条字幕用到的译文行是否正确
+
+用法: python benchmarks/bench_align.py [字幕条数] [出错比例]
+
+最后按 5, 10, 25, 50 倍字幕条数测一遍, 看耗时是否与条数成正比: 漏行和长度误差在长文件里累积,
+估计位置与实际位置越差越远, 搜索带跟不上时会变成平方级
+"""
+import random
+import sys
+import time
+
+import srt_data  # noqa: F401  把项目根目录加入 sys.path
+from srtkit import SubtitleItem, SubtitleTrack, align_translations
+
+_words = "we need to talk about the money Logan said it was never going to work out for us".split()
+_endings = {'.': '。', '?': '？', '!': '！', ',': '，', '': ''}
+
+
+def make_pair(cue_count: int, rng: random.Random):
+    """返回字幕轨道和逐条对应的译文, 译文长度与原文成比例, 保留句末标点和数字"""
+    items, translations, start = [], [], 0
+    for i in range(cue_count):
+        words = [rng.choice(_words) for _ in range(rng.randint(3, 12))]
+        number = f" {rng.randint(1, 999)}" if rng.random() < 0.2 else ""
+        ending = rng.choice(list(_endings))
+        items.append(SubtitleItem(i + 1, start, start + 1500, ' '.join(words) + number + ending))
+        translations.append('字' * (len(words) * 2) + number.strip() + _endings[ending])
+        # 句子没说完的字幕紧接着下一条, 其余的中间有停顿
+        start += 1500 + (0 if not ending else rng.choice([100, 2000]))
+    return SubtitleTrack.from_items(items), translations
+
+
+def corrupt(translations, error_rate: float, rng: random.Random):
+    """模拟模型的输出, 返回 (译文行, 每条字幕应该对应的第一行, 没有译文的为 None)"""
+    lines, expected = [], []
+    i = 0
+    while i < len(translations):
+        r = rng.random()
+        if r < error_rate * 0.7 and i + 1 < len(translations):
+            lines.append(translations[i] + translations[i + 1])
+            expected += [len(lines) - 1] * 2
+            i += 2
+            continue
+        if r < error_rate * 0.85:
+            expected.append(None)
+        elif r < error_rate:
+            half = len(translations[i]) // 2
+            lines += [translations[i][:half], translations[i][half:]]
+            expected.append(len(lines) - 2)
+        else:
+            lines.append(translations[i])
+            expected.append(len(lines) - 1)
+        i += 1
+    return lines, expected
+
+
+def measure(count: int, error_rate: float, rng: random.Random, details: bool = True):
+    track, translations = make_pair(count, rng)
+    lines, expected = corrupt(translations, error_rate, rng)
+    start = time.perf_counter()
+    alignment = align_translations(track, lines)
+    elapsed = time.perf_counter() - start
+    correct = sum(1 for cue, line in zip(alignment.cues, expected) if (cue.lines[0] if cue.lines else None) == line)
+    print(f"{count} 条字幕, {len(lines)} 行译文: {elapsed:.2f}s ({count / elapsed:.0f} 条/s), "
+          f"准确率 {correct / count:.1%}, 需要校对 {len(alignment.low_confidence(0.5))} 条", file=sys.stderr)
+    if details:
+        print(f"  {alignment.summary()}", file=sys.stderr)
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    error_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    rng = random.Random(1)
+
+    for count in (cue_count // 10, cue_count):
+        measure(count, error_rate, rng)
+    print("长文件 (条/s 应基本不变):", file=sys.stderr)
+    for factor in (5, 10, 25, 50):
+        measure(cue_count * factor, error_rate, rng, details=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+对比 capitalize.py 每个文件启动一次进程, 与批量模式 (--output-dir) 一次处理整个目录的耗时,
+以及输入没有变化时再跑一次批量模式 (全部跳过) 的耗时
+
+用法: python benchmarks/bench_batch.py [文件数] [每个文件的字幕条数]
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from srt_data import make_srt
+
+_repo_dir = Path(__file__).resolve().parent.parent
+
+
+def run(*args: str, cwd: str):
+    subprocess.run([sys.executable, str(_repo_dir / "capitalize.py"), *args], cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cue_count = int(sys.argv[2]) if len(sys.argv) > 2 else 800
+
+    with tempfile.TemporaryDirectory() as tmp:
+        episodes = Path(tmp) / "episodes"
+        episodes.mkdir()
+        for i in range(file_count):
+            make_srt(str(episodes / f"ep{i + 1:03d}.srt"), cue_count)
+        output_dir = str(Path(tmp) / "out")
+        total_cues = file_count * cue_count
+
+        results = []
+        start = time.perf_counter()
+        for episode in sorted(episodes.glob("*.srt")):
+            run(str(episode), cwd=tmp)
+        results.append(("每个文件一个进程", time.perf_counter() - start))
+
+        for label, extra in (("批量模式, 首次", []), ("批量模式, 再跑一次 (全部跳过)", []),
+                             ("批量模式, --force", ["--force"])):
+            start = time.perf_counter()
+            run(str(episodes), "--output-dir", output_dir, *extra, cwd=tmp)
+            results.append((label, time.perf_counter() - start))
+
+        print(f"{file_count} 个文件 x {cue_count} 条字幕, capitalize.py:", file=sys.stderr)
+        for label, elapsed in results:
+            print(f"  {label}: {elapsed:.2f}s, {file_count / elapsed:.0f} 文件/s, {total_cues / elapsed:.0f} 条/s",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+编码识别的耗时和准确率: 生成 GBK, Big5, UTF-16, Windows-1252 等编码的字幕文件, 测量
+第一次识别 (写入缓存), 再次识别 (新的缓存对象, 只查 SQLite, 相当于下一次批量运行) 和按识别结果解析的耗时
+
+用法: python benchmarks/bench_encoding.py [每种编码的文件数] [每个文件的字幕条数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from srt_data import make_srt  # noqa: F401  把项目根目录加入 sys.path
+from srtkit import EncodingCache, detect_encoding, format_timestamp, iter_srt
+
+_texts = {
+    'gbk': ["我们必须谈谈钱的事。", "他说这件事不会有结果的", "你为什么还在这里？", "这是我第一次来北京"],
+    'big5': ["我們必須談談錢的事。", "他說這件事不會有結果的", "你為什麼還在這裡？", "這是我第一次來台北"],
+    'cp1252': ["We need to talk about the café.", "Déjà vu, isn't it?", "Naïve “quotes” – señor", "Ça va bien"],
+    'utf-16': ["日本語の字幕です", "中文字幕", "Mixed 字幕 text", "第二行"],
+    'utf-16-le': ["没有 BOM 的 UTF-16", "中文字幕", "Mixed text", "第二行"],
+    'utf-16-be': ["English only", "no BOM either", "Second line", "Last one"],
+    'utf-8': ["Plain UTF-8 字幕", "中文字幕", "Ünïcödé", "第二行"],
+}
+# 识别结果与写入时用的编码不同名但等价
+_equivalent = {'gbk': 'gb18030', 'big5': 'cp950', 'utf-8': 'utf-8-sig'}
+
+
+def write_file(path: Path, encoding: str, cue_count: int):
+    texts = _texts[encoding]
+    blocks = [f"{i + 1}\r\n{format_timestamp(i * 2000)} --> {format_timestamp(i * 2000 + 1900)}\r\n"
+              f"{texts[i % len(texts)]}\r\n{texts[(i + 1) % len(texts)]}\r\n\r\n" for i in range(cue_count)]
+    path.write_bytes(''.join(blocks).encode(encoding))
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    cue_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for encoding in _texts:
+            for i in range(file_count):
+                path = Path(tmp) / f"{encoding}-{i}.srt"
+                write_file(path, encoding, cue_count)
+                files.append((str(path), _equivalent.get(encoding, encoding)))
+        cache_path = str(Path(tmp) / "encodings.sqlite3")
+        print(f"{len(files)} 个文件 x {cue_count} 条字幕:", file=sys.stderr)
+
+        for name, cache in (("第一次识别", EncodingCache(cache_path)), ("再次识别 (查缓存)", EncodingCache(cache_path))):
+            start = time.perf_counter()
+            detected = [detect_encoding(path, cache) for path, _ in files]
+            elapsed = time.perf_counter() - start
+            correct = sum(1 for result, (_, expected) in zip(detected, files) if result == expected)
+            print(f"  {name:<16} {elapsed:.3f}s, 每个文件 {elapsed / len(files) * 1000:.2f}ms, "
+                  f"正确 {correct}/{len(files)}", file=sys.stderr)
+
+        for encoding in _texts:
+            group = [path for path, _ in files if Path(path).name.startswith(f"{encoding}-")]
+            start = time.perf_counter()
+            cues = sum(1 for path in group for _ in iter_srt(path))
+            elapsed = time.perf_counter() - start
+            print(f"  解析 {encoding:<10} {cues / elapsed:>10.0f} 条/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
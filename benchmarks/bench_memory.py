@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+翻译记忆的效果: 用第一集的原文和译文建立翻译记忆, 对比第二集不带/带翻译记忆时的请求数, 发送的字幕条数和耗时,
+以及建立索引和每个分段查找术语, 相似字幕的耗时; 最后用本地批量任务替身带翻译记忆再翻译一遍,
+批量请求中术语和相似字幕在字幕数组前面, 确认整集都能从结果文件中取回; 使用假翻译服务, 可离线运行
+
+用法: python benchmarks/bench_memory.py [每集字幕条数] [重复台词比例] [单次请求延迟秒数]
+"""
+import contextlib
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fakes import FakeTranslationService, fake_batch_responder
+from batch import LocalBatchBackend
+from memory import TranslationMemory, items_header
+from srtkit import format_timestamp
+from translator import SubtitleTranslator
+
+_names = ["Logan", "Kendall", "Shiv", "Roman", "Waystar Royco", "New York"]
+
+
+def make_episode(path: str, cue_count: int, repeat_ratio: float, seed: int):
+    """repeat_ratio 比例的字幕是每集都有的台词, 其余是本集独有的台词, 都带一些专有名词"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(cue_count):
+            name = rng.choice(_names)
+            if rng.random() < repeat_ratio:
+                text = f"{name}, we need to talk about line {rng.randrange(50)}."
+            else:
+                text = f"Episode {seed} says something new to {name} at cue {i}."
+            start = i * 2000
+            f.write(f"{i + 1}\n{format_timestamp(start)} --> {format_timestamp(start + 1900)}\n{text}\n\n")
+
+
+def translate(input_file: str, output_file: str, latency: float, memory=None, batch_backend=None) -> tuple:
+    service = FakeTranslationService(latency)
+    translator = SubtitleTranslator(service, max_workers=4, memory=memory)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        translator.translate_file(input_file, output_file, batch_backend=batch_backend, batch_poll_interval=0)
+    return time.perf_counter() - start, service.calls, service.cues_sent
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    with tempfile.TemporaryDirectory() as tmp:
+        episodes = [str(Path(tmp) / f"ep{n}.srt") for n in (1, 2)]
+        for seed, path in enumerate(episodes, 1):
+            make_episode(path, cue_count, repeat_ratio, seed)
+        translated = str(Path(tmp) / "ep1.zh.srt")
+        translate(episodes[0], translated, latency)
+
+        start = time.perf_counter()
+        memory = TranslationMemory()
+        memory.add_srt_pair(episodes[0], translated)
+        memory.extract_terms()
+        print(f"建立索引: {len(memory)} 条原文, {(time.perf_counter() - start) * 1000:.0f}ms", file=sys.stderr)
+
+        texts = [f"Kendall, we need to talk about line {n}!" for n in range(20)]
+        start = time.perf_counter()
+        hints = memory.hints_for(texts)
+        print(f"一个 20 条的分段查找提示: {(time.perf_counter() - start) * 1000:.1f}ms, "
+              f"{len(hints.terms) if hints else 0} 条术语, {len(hints.examples) if hints else 0} 条相似字幕",
+              file=sys.stderr)
+
+        without = translate(episodes[1], str(Path(tmp) / "plain.srt"), latency)
+        memory.lookups = memory.hits = 0
+        with_memory = translate(episodes[1], str(Path(tmp) / "memory.srt"), latency, memory)
+        for label, (elapsed, calls, cues) in (("不带翻译记忆", without), ("带翻译记忆", with_memory)):
+            print(f"{label}: {elapsed:.2f}s, {calls} 次请求, 发送 {cues} 条字幕", file=sys.stderr)
+        print(memory.summary(), file=sys.stderr)
+
+        # 批量模式: 分段请求写进一个文件由本地替身作答, 只有结果校验不通过的字幕才走同步请求
+        batch_requests = []
+
+        def responder(body: dict) -> str:
+            batch_requests.append(body)
+            return fake_batch_responder(body)
+
+        output_file = str(Path(tmp) / "batch.srt")
+        elapsed, calls, _ = translate(episodes[1], output_file, latency, memory,
+                                      LocalBatchBackend(str(Path(tmp) / "batch"), responder))
+        with_hints = sum(1 for body in batch_requests if items_header in body["messages"][-1]["content"])
+        translated = sum(1 for line in open(output_file, encoding='utf-8') if line.startswith("译文 "))
+        print(f"带翻译记忆 + 批量: {elapsed:.2f}s, {len(batch_requests)} 个批量请求 ({with_hints} 个带提示), "
+              f"{calls} 次同步补翻, 译文 {translated}/{cue_count} 条", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+对比旧的整文件 re.split 解析与 srtkit 流式解析的速度和内存峰值
+
+用法: python benchmarks/bench_parse.py [字幕条数]
+"""
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+from srt_data import make_srt
+from srtkit import iter_srt, parse_srt
+
+
+@dataclass
+class LegacySubtitleItem:
+    index: int
+    timestamp: str
+    content: str
+
+
+def legacy_parse(file_path: str):
+    """改造前 merge_subtitle.parse_srt / translator.parse_file 的实现"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    subtitle_items = []
+    for block in re.split(r'\n\n+', content.strip()):
+        lines = block.split('\n')
+        index = int(re.sub(r'\D', '', lines[0].strip()))
+        subtitle_items.append(LegacySubtitleItem(index, lines[1].strip(), '\n'.join(lines[2:])))
+    return subtitle_items
+
+
+def count_streaming(file_path: str):
+    """只遍历不保存, 调用方逐条处理字幕时的内存占用"""
+    count = 0
+    for _ in iter_srt(file_path):
+        count += 1
+    return count
+
+
+def peak_memory(func, file_path) -> int:
+    tracemalloc.start()
+    func(file_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    parsers = [("旧实现 re.split", legacy_parse), ("srtkit.parse_srt", parse_srt),
+               ("srtkit.iter_srt (流式)", count_streaming)]
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = str(Path(tmp) / "input.srt")
+        make_srt(file_path, cue_count)
+        print(f"{cue_count:,} 条字幕, 文件大小 {Path(file_path).stat().st_size / 1024 / 1024:.1f} MB")
+        peaks = [peak_memory(func, file_path) for _, func in parsers]
+        # tracemalloc 本身会拖慢速度, 再单独计时; 各实现轮流运行, 取每个实现最快的一次,
+        # 机器负载的起伏对各实现的影响差不多
+        best = [float('inf')] * len(parsers)
+        for _ in range(rounds):
+            for k, (_, func) in enumerate(parsers):
+                start = time.perf_counter()
+                func(file_path)
+                best[k] = min(best[k], time.perf_counter() - start)
+        for (name, _), elapsed, peak in zip(parsers, best, peaks):
+            print(f"{name:<24} {cue_count / elapsed:>12,.0f} 条/秒  内存峰值 {peak / 1024 / 1024:>8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+对比逐个脚本处理每一集字幕 (每个文件每一步都启动一个进程, 写一次中间文件) 与 pipeline.py 一个进程处理整个目录的耗时
+
+用法: python benchmarks/bench_pipeline.py [文件数] [每个文件的字幕条数]
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from srt_data import make_srt
+
+_repo_dir = Path(__file__).resolve().parent.parent
+
+
+def run(*args: str, cwd: str):
+    subprocess.run([sys.executable, *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+
+
+def main():
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    cue_count = int(sys.argv[2]) if len(sys.argv) > 2 else 800
+
+    with tempfile.TemporaryDirectory() as tmp:
+        episodes = Path(tmp) / "episodes"
+        episodes.mkdir()
+        for i in range(file_count):
+            make_srt(str(episodes / f"ep{i + 1:02d}.srt"), cue_count)
+
+        separate = Path(tmp) / "separate"
+        separate.mkdir()
+        start = time.perf_counter()
+        for episode in sorted(episodes.glob("*.srt")):
+            cleaned = str(separate / episode.name)
+            run(str(_repo_dir / "remove_srt_symbol.py"), str(episode), cleaned, cwd=str(separate))
+            run(str(_repo_dir / "capitalize.py"), cleaned, cwd=str(separate))
+        separate_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        run(str(_repo_dir / "pipeline.py"), str(episodes), "--stages", "clean,capitalize",
+            "--output-dir", str(Path(tmp) / "pipeline"), cwd=tmp)
+        pipeline_elapsed = time.perf_counter() - start
+
+        print(f"{file_count} 个文件 x {cue_count} 条字幕, clean + capitalize:", file=sys.stderr)
+        print(f"  逐个脚本: {separate_elapsed:.2f}s, 每个文件 {separate_elapsed / file_count * 1000:.0f}ms", file=sys.stderr)
+        print(f"  pipeline.py: {pipeline_elapsed:.2f}s, 每个文件 {pipeline_elapsed / file_count * 1000:.0f}ms, "
+              f"快 {separate_elapsed / pipeline_elapsed:.1f}x", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
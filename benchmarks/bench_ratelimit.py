@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+用模拟时钟对比有无客户端限流时的吞吐量和 429 次数, 不真的等待, 几秒内跑完
+
+服务端配额为 --rpm / --tpm, 客户端分别:
+  1. 不设配额, 只靠 429 退避
+  2. 按真实配额限流
+  3. 配额填高了一倍, 靠 429 自适应降速
+
+用法: python benchmarks/bench_ratelimit.py [模拟分钟数]
+"""
+import statistics
+import sys
+
+from fakes import QuotaTranslationService, SimulatedClock
+from ratelimit import RateLimiter
+from translator import RateLimitedTranslationService, SubtitleItem
+
+_rpm = 60
+_tpm = 100000
+
+
+def simulate(minutes: int, client_rpm, client_tpm) -> str:
+    clock = SimulatedClock()
+    service = QuotaTranslationService(clock, _rpm, _tpm)
+    limiter = RateLimiter(client_rpm, client_tpm, clock=clock, sleep=clock.sleep)
+    limited = RateLimitedTranslationService(service, limiter, max_throttle_retries=100)
+    chunk = [SubtitleItem(i, i * 1000, i * 1000 + 900, f"This is subtitle line number {i}.") for i in range(1, 21)]
+
+    while clock() < minutes * 60:
+        limited.translate_chunk(chunk)
+
+    per_minute = [0] * minutes
+    for finished in service.completed:
+        if finished < minutes * 60:
+            per_minute[int(finished // 60)] += 1
+    # 第一分钟桶是满的, 不计入稳定性统计
+    steady = per_minute[1:] or per_minute
+    return (f"平均 {statistics.mean(steady):.1f} 次/分钟 (配额 {_rpm}, 限流器按 90% 配额发送), "
+            f"每分钟波动 {min(steady)}~{max(steady)}, 429 {service.rejected} 次")
+
+
+def main():
+    minutes = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(f"不限流, 只靠 429 退避: {simulate(minutes, None, None)}")
+    print(f"按真实配额限流:       {simulate(minutes, _rpm, _tpm)}")
+    print(f"配额填高一倍:         {simulate(minutes, _rpm * 2, _tpm * 2)}")
+
+
+if __name__ == "__main__":
+    main()
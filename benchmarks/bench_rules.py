@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+多条文本规则的耗时: 像原来的 remove_srt_symbol.py / capitalize.py 那样每条规则读写一遍整个文件,
+与 TextRules 解析一次, 每行依次经过全部规则后写出一次对比
+
+用法: python benchmarks/bench_rules.py [字幕条数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from srt_data import make_srt
+from srtkit import TextRules, named_rules
+
+_rules = ["whitespace", "strip-punctuation", "capitalize", ("number (\\d+)", "#\\1")]
+
+
+def per_rule_passes(input_file: str, output_file: str, rules: TextRules):
+    """每条规则一遍: 读入所有行, 逐行处理 (包括序号和时间戳), 写出, 下一条规则再读"""
+    current = input_file
+    for rule in rules.rules:
+        single = TextRules([rule])
+        with open(current, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(single.apply_line(line) if '-->' not in line else line for line in lines))
+        current = output_file
+
+
+def measure(name: str, function, cue_count: int):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {elapsed:>7.3f}s  {cue_count / elapsed:>10.0f} 条/s", file=sys.stderr)
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rules = TextRules(_rules)
+    print(f"{cue_count} 条字幕, {len(rules)} 条规则 (可用的命名规则: {', '.join(named_rules)})", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = str(Path(tmp) / "input.srt")
+        make_srt(input_file, cue_count)
+        measure("每条规则读写一遍", lambda: per_rule_passes(input_file, str(Path(tmp) / "a.srt"), rules), cue_count)
+        measure("TextRules 一遍", lambda: rules.apply_file(input_file, str(Path(tmp) / "b.srt")), cue_count)
+
+
+if __name__ == "__main__":
+    main()
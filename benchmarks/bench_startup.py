@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+用 python -X importtime 测量各个脚本打印用法 (--help) 时的启动耗时和导入的模块
+
+用法:
+  python benchmarks/bench_startup.py                  # 测量当前代码
+  python benchmarks/bench_startup.py --baseline HEAD~1  # 同时测量某个 git 版本, 对比启动耗时
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+_repo_dir = Path(__file__).resolve().parent.parent
+_entry_points = (
+    "python/subtitles-translator-ai/translator.py",
+    "python/azure-tts-python/tts.py",
+    "pipeline.py",
+    "merge_subtitle.py",
+    "capitalize.py",
+)
+# 这些包导入很慢 (gRPC/protobuf, 原生库), 只打印用法时不应该出现
+_sdk_prefixes = ("openai", "google", "grpc", "azure")
+# import time:   self [us] | cumulative | 模块名 (前面的空格表示嵌套层级)
+_importtime_line = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def measure(repo_dir: Path, script: str, runs: int):
+    """返回 (启动耗时中位数 ms, 导入耗时 ms, 导入的模块数, 导入的 SDK 顶层包), 脚本出错退出时返回 None"""
+    command = [sys.executable, "-X", "importtime", str(repo_dir / script), "--help"]
+    wall = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=repo_dir, capture_output=True, text=True)
+        wall.append((time.perf_counter() - start) * 1000)
+        if "Traceback" in result.stderr:
+            # 通常是没装对应的 SDK, 这时的耗时没有参考价值
+            return None
+
+    import_us = modules = 0
+    sdks = set()
+    for line in result.stderr.splitlines():
+        match = _importtime_line.match(line)
+        if not match:
+            continue
+        self_us, _, _, name = match.groups()
+        import_us += int(self_us)
+        modules += 1
+        if name.split('.')[0] in _sdk_prefixes:
+            sdks.add(name.split('.')[0])
+    return statistics.median(wall), import_us / 1000, modules, sorted(sdks)
+
+
+def export_revision(revision: str, directory: Path):
+    archive = subprocess.run(["git", "archive", revision], cwd=_repo_dir, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(directory)
+
+
+def report(label: str, repo_dir: Path, runs: int):
+    print(f"{label}:", file=sys.stderr)
+    results = {}
+    for script in _entry_points:
+        if not (repo_dir / script).exists():
+            continue
+        result = measure(repo_dir, script, runs)
+        if result is None:
+            print(f"  {script}: 运行出错, 跳过", file=sys.stderr)
+            continue
+        wall, imports, modules, sdks = results[script] = result
+        print(f"  {script}: 启动 {wall:.0f}ms, 导入 {imports:.0f}ms, {modules} 个模块, "
+              f"SDK: {', '.join(sdks) or '无'}", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量脚本的启动耗时")
+    parser.add_argument("--baseline", default=None, help="对比的 git 版本, 如 HEAD~1")
+    parser.add_argument("--runs", type=int, default=5, help="每个脚本运行几次, 取中位数 (默认: 5)")
+    args = parser.parse_args()
+
+    current = report("当前代码", _repo_dir, args.runs)
+    if not args.baseline:
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        export_revision(args.baseline, Path(tmp))
+        baseline = report(args.baseline, Path(tmp), args.runs)
+    print("启动耗时对比:", file=sys.stderr)
+    for script, (wall, *_) in current.items():
+        if script in baseline:
+            print(f"  {script}: {baseline[script][0]:.0f}ms -> {wall:.0f}ms, 快 {baseline[script][0] / wall:.1f}x",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
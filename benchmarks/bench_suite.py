@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+整条工具链的基准测试: 在生成的 1k ~ 1M 条字幕上依次测量解析, 翻译, 合并译文, 清理标点, 首字母大写, 配音合成,
+翻译和配音使用假服务 (可设置延迟, 抖动, 错误率), 不需要 API key
+
+每个 (场景, 字幕条数) 在单独的子进程中运行, 内存峰值互不影响; 结果以 JSON 输出:
+吞吐量 (条/s), 延迟 p50/p95 (翻译和配音是每次请求的耗时, 其他场景是每轮的耗时), 内存峰值 (RSS)
+用 --compare 对比之前保存的结果, 吞吐量下降超过 --threshold 的场景标记为退化
+
+用法:
+  python benchmarks/bench_suite.py --output results.json
+  python benchmarks/bench_suite.py --sizes 1000,100000 --latency 0.2 --jitter 0.1 --error-rate 0.05
+  python benchmarks/bench_suite.py --output new.json --compare results.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from fakes import FakeSpeechBackend, FakeTranslationService
+from srt_data import make_srt
+
+_repo_dir = Path(__file__).resolve().parent.parent
+
+# 场景函数: (输入 srt, 临时目录, 参数) -> (每次请求或每轮的耗时列表, 请求数)
+Scenario = Callable[[str, Path, argparse.Namespace], tuple]
+_scenarios: Dict[str, Scenario] = {}
+# 调用假服务的场景, 字幕条数超过 --max-service-cues 时跳过, 否则 1M 条字幕要发几万次请求
+_service_scenarios = {"translate", "dub"}
+
+
+def scenario(name: str):
+    def register(function: Scenario) -> Scenario:
+        _scenarios[name] = function
+        return function
+
+    return register
+
+
+def _repeat(args, function: Callable[[], None]) -> tuple:
+    latencies = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    return latencies, 0
+
+
+@scenario("parse")
+def _parse(input_file: str, tmp: Path, args) -> tuple:
+    from translator import parse_file
+    return _repeat(args, lambda: parse_file(input_file))
+
+
+@scenario("load_track")
+def _load_track(input_file: str, tmp: Path, args) -> tuple:
+    from srtkit import load_srt
+    return _repeat(args, lambda: load_srt(input_file))
+
+
+@scenario("translate")
+def _translate(input_file: str, tmp: Path, args) -> tuple:
+    from retry import RetryPolicy
+    from translator import SubtitleTranslator
+
+    service = FakeTranslationService(args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    # 退避时间按假服务的延迟缩放, 重试预算放开, 错误率只影响耗时
+    policy = RetryPolicy(base_delay=args.latency, budget=1 << 30)
+    translator = SubtitleTranslator(service, max_workers=args.workers, token_budget=3000, retry_policy=policy)
+    translator.translate_file(input_file, str(tmp / "translated.srt"))
+    return service.recorder.latencies, service.calls
+
+
+@scenario("merge")
+def _merge(input_file: str, tmp: Path, args) -> tuple:
+    from merge_subtitle import create_translated_srt
+    from srtkit import load_srt
+
+    track = load_srt(input_file)
+    translations = [f"译文 {text}" for text in track.texts()]
+    return _repeat(args, lambda: create_translated_srt(track, translations, str(tmp / "merged.srt")))
+
+
+@scenario("clean")
+def _clean(input_file: str, tmp: Path, args) -> tuple:
+    from remove_srt_symbol import remove_symbols
+    return _repeat(args, lambda: remove_symbols(input_file, str(tmp / "cleaned.srt")))
+
+
+@scenario("capitalize")
+def _capitalize(input_file: str, tmp: Path, args) -> tuple:
+    from capitalize import capitalize_file
+    return _repeat(args, lambda: capitalize_file(input_file, str(tmp / "capitalized.srt")))
+
+
+@scenario("dub")
+def _dub(input_file: str, tmp: Path, args) -> tuple:
+    from dubbing import render_track
+    from srtkit import load_srt
+
+    backend = FakeSpeechBackend(args.latency, latency_per_char=0, connect_latency=args.latency,
+                                jitter=args.jitter, error_rate=args.tts_error_rate)
+    render_track(backend, load_srt(input_file), str(tmp / "dub.wav"), workers=args.workers)
+    return backend.recorder.latencies, backend.calls
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """最近秩法的百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的单位是 KB, macOS 是字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(name: str, input_file: str, cues: int, args) -> dict:
+    """在当前进程中运行一个场景, 返回一条结果"""
+    result = {"scenario": name, "cues": cues}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        try:
+            # 各脚本的进度输出不混进 JSON
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                latencies, requests = _scenarios[name](input_file, Path(tmp), args)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            latencies, requests = [], 0
+        elapsed = time.perf_counter() - start
+
+    # 调用服务的场景按整体耗时算吞吐量, 其他场景只算重复的几轮, 不含准备数据的时间
+    busy = elapsed if requests else sum(latencies)
+    throughput = cues * (1 if requests else len(latencies)) / busy if busy else None
+    p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+    result.update({
+        "seconds": round(elapsed, 4),
+        "cues_per_sec": round(throughput, 1) if throughput and "error" not in result else None,
+        "requests": requests,
+        "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+        "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    })
+    return result
+
+
+def _child_args(args) -> List[str]:
+    return ["--repeat", str(args.repeat), "--workers", str(args.workers), "--latency", str(args.latency),
+            "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+            "--tts-error-rate", str(args.tts_error_rate)]
+
+
+def run_suite(args) -> dict:
+    names = args.scenarios.split(',') if args.scenarios else list(_scenarios)
+    unknown = [name for name in names if name not in _scenarios]
+    if unknown:
+        raise SystemExit(f"未知的场景: {', '.join(unknown)}, 可选: {', '.join(_scenarios)}")
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for cues in sizes:
+            input_file = str(Path(tmp) / f"input_{cues}.srt")
+            make_srt(input_file, cues)
+            for name in names:
+                if name in _service_scenarios and cues > args.max_service_cues:
+                    continue
+                command = [sys.executable, __file__, "--run-one", name, input_file, str(cues), *_child_args(args)]
+                child = subprocess.run(command, capture_output=True, text=True)
+                if child.returncode:
+                    error = (child.stderr.strip().splitlines() or ["子进程异常退出"])[-1]
+                    result = {"scenario": name, "cues": cues, "error": error}
+                else:
+                    result = json.loads(child.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(_format_result(result), file=sys.stderr)
+
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "tts_error_rate": args.tts_error_rate,
+            "workers": args.workers,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_repo_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format_result(result: dict) -> str:
+    label = f"{result['scenario']} x {result['cues']}"
+    if result.get("error"):
+        return f"  {label}: 失败 {result['error']}"
+    return (f"  {label}: {result['cues_per_sec']:.0f} 条/s, p50 {result['p50_ms']}ms, p95 {result['p95_ms']}ms, "
+            f"内存峰值 {result['peak_rss_mb']}MB")
+
+
+def compare(previous: dict, current: dict, threshold: float) -> int:
+    """打印吞吐量变化, 返回退化的场景数"""
+    before = {(r["scenario"], r["cues"]): r for r in previous["results"] if r.get("cues_per_sec")}
+    regressions = 0
+    print(f"对比 {previous['meta'].get('revision')} -> {current['meta'].get('revision')}:", file=sys.stderr)
+    for result in current["results"]:
+        old = before.get((result["scenario"], result["cues"]))
+        if not old or not result.get("cues_per_sec"):
+            continue
+        change = result["cues_per_sec"] / old["cues_per_sec"] - 1
+        regressed = change < -threshold
+        regressions += regressed
+        print(f"  {result['scenario']} x {result['cues']}: {old['cues_per_sec']:.0f} -> {result['cues_per_sec']:.0f} 条/s "
+              f"({change:+.1%}), 内存 {old['peak_rss_mb']} -> {result['peak_rss_mb']}MB"
+              f"{'  <- 退化' if regressed else ''}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="整条工具链的离线基准测试, 结果输出为 JSON")
+    parser.add_argument("--scenarios", default=None, help=f"逗号分隔的场景 (默认全部: {', '.join(_scenarios)})")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="逗号分隔的字幕条数")
+    parser.add_argument("--repeat", type=int, default=3, help="不调用服务的场景重复几轮 (默认: 3)")
+    parser.add_argument("--workers", type=int, default=8, help="翻译和配音的并发数 (默认: 8)")
+    parser.add_argument("--latency", type=float, default=0.02, help="假服务每次请求的延迟秒数 (默认: 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="假服务延迟的随机抖动上限, 秒 (默认: 0.01)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="假翻译服务每次请求出错的概率, 出错的分段会重试")
+    parser.add_argument("--tts-error-rate", type=float, default=0.0,
+                        help="假语音合成每次请求出错的概率, 合成没有重试, 出错时场景记为失败")
+    parser.add_argument("--max-service-cues", type=int, default=10000,
+                        help="调用假服务的场景 (translate, dub) 最多测到多少条字幕 (默认: 10000)")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件 (默认: 打印到标准输出)")
+    parser.add_argument("--compare", default=None, help="之前保存的结果 JSON, 对比吞吐量")
+    parser.add_argument("--threshold", type=float, default=0.1, help="吞吐量下降超过这个比例算退化 (默认: 0.1)")
+    parser.add_argument("--run-one", nargs=3, metavar=("SCENARIO", "INPUT", "CUES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        name, input_file, cues = args.run_one
+        print(json.dumps(run_one(name, input_file, int(cues), args), ensure_ascii=False))
+        return
+
+    report = run_suite(args)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(previous, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
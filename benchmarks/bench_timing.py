@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+时间轴调整的耗时: 平移, 帧率转换, 锚点校准 (只替换时间数组), 以及合并/拆分字幕,
+与逐条生成 SubtitleItem 再重建轨道的做法对比
+
+用法: python benchmarks/bench_timing.py [字幕条数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from srt_data import make_srt
+from srtkit import (SubtitleItem, SubtitleTrack, fps_factor, load_srt, merge_cues, resync, scale, shift,
+                    split_cues)
+
+
+def per_item_shift(track: SubtitleTrack, offset: int) -> SubtitleTrack:
+    return SubtitleTrack.from_items(
+        SubtitleItem(item.index, max(0, item.start + offset), max(0, item.end + offset), item.content)
+        for item in track)
+
+
+def measure(name: str, function, cue_count: int):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:>7.3f}s  {cue_count / elapsed / 1e6:>6.2f}M 条/s  输出 {len(result)} 条",
+          file=sys.stderr)
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = str(Path(tmp) / "input.srt")
+        make_srt(input_file, cue_count)
+        track = load_srt(input_file)
+
+    last = track.ends[-1]
+    anchors = [(0, 1200), (last // 3, last // 3 + 5000), (last // 3 * 2, last // 3 * 2 + 9000), (last, last + 12000)]
+    measure("逐条平移 (SubtitleItem)", lambda: per_item_shift(track, -1500), cue_count)
+    measure("平移", lambda: shift(track, -1500), cue_count)
+    measure("帧率转换 25 -> 23.976", lambda: scale(track, fps_factor(25, 23.976)), cue_count)
+    measure("锚点校准 (4 个锚点)", lambda: resync(track, anchors), cue_count)
+    # 生成的字幕每条 1.9 秒, 间隔 0.1 秒, 约 44 个字: 短于 2 秒的与下一条合并, 不超过 7 秒, 每 3 条并成 1 条;
+    # 每条都比 1 秒长, 全部拆成两条, 是拆分最慢的情况; 另外各测一次没有字幕要处理的情况
+    measure("合并短字幕 (全部合并)", lambda: merge_cues(track, min_duration=2000, max_gap=200, max_chars=200),
+            cue_count)
+    measure("合并短字幕 (都不用合并)", lambda: merge_cues(track, min_duration=1000), cue_count)
+    measure("拆分长字幕 (全部拆分)", lambda: split_cues(track, max_duration=1000), cue_count)
+    measure("拆分长字幕 (都不用拆)", lambda: split_cues(track, max_duration=7000), cue_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+对比 List[SubtitleItem] 与 SubtitleTrack 保存整个字幕文件时的内存占用
+
+用法: python benchmarks/bench_track.py [字幕条数]
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from bench_parse import legacy_parse
+from srt_data import make_srt
+from srtkit import load_srt, parse_srt
+
+
+def measure(name, func, file_path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(file_path)
+    elapsed = time.perf_counter() - start
+    # 只统计解析完成后仍然占用的内存, 即保存这份字幕数据的成本
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<32} 常驻 {current / 1024 / 1024:>8.1f} MB  峰值 {peak / 1024 / 1024:>8.1f} MB  "
+          f"耗时 {elapsed:.2f}s")
+    return result
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = str(Path(tmp) / "input.srt")
+        make_srt(file_path, cue_count)
+        print(f"{cue_count:,} 条字幕")
+        measure("旧实现 List[dataclass]", legacy_parse, file_path)
+        measure("List[SubtitleItem] (__slots__)", parse_srt, file_path)
+        track = measure("SubtitleTrack", load_srt, file_path)
+
+        start = time.perf_counter()
+        chunks = [track[i:i + 20] for i in range(0, len(track), 20)]
+        print(f"切分为 {len(chunks):,} 个分段视图耗时 {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
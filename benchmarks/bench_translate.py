@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+对比顺序翻译与并发翻译的耗时, 使用假翻译服务, 可离线运行
+
+用法: python benchmarks/bench_translate.py [字幕条数] [单次请求延迟秒数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fakes import FakeTranslationService
+from srt_data import make_srt
+from translator import SubtitleTranslator
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1800
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = str(Path(tmp) / "input.srt")
+        make_srt(input_file, cue_count)
+
+        baseline = None
+        for workers in (1, 2, 4, 8):
+            translator = SubtitleTranslator(FakeTranslationService(latency), chunk_size=20, max_workers=workers)
+            start = time.perf_counter()
+            translator.translate_file(input_file, str(Path(tmp) / f"output_{workers}.srt"))
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"workers={workers}: {elapsed:.2f}s, 加速 {baseline / elapsed:.1f}x", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
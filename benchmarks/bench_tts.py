@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+分段并发合成长台词的耗时, 逐句合成(如字幕转语音)时复用合成器对每段延迟的影响,
+以及修改一处台词后借助语音缓存重新合成的请求数, 使用假语音合成后端, 可离线运行
+
+用法: python benchmarks/bench_tts.py [台词分钟数]
+"""
+import random
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+from fakes import FakeSpeechBackend
+from audio_cache import AudioCache, CachedSpeechBackend
+from synthesis import split_text, synthesize_segments
+
+_words = ("the quick brown fox jumps over a lazy dog while subtitles scroll past "
+          "and every sentence needs a voice that sounds natural enough").split()
+
+
+def make_script(minutes: int, seed: int = 0) -> str:
+    """每分钟约 150 个单词, 每 5 句一段"""
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(minutes * 150 // 12):
+        sentence = ' '.join(rng.choice(_words) for _ in range(12))
+        sentences.append(sentence.capitalize() + '.')
+    return '\n\n'.join(' '.join(sentences[i:i + 5]) for i in range(0, len(sentences), 5))
+
+
+def main():
+    minutes = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    text = make_script(minutes)
+    segments = split_text(text)
+    print(f"{minutes} 分钟台词: {len(text)} 字符, {len(segments)} 段", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for workers in (1, 2, 4, 8):
+            output = str(Path(tmp) / f"output_{workers}.wav")
+            start = time.perf_counter()
+            synthesize_segments(FakeSpeechBackend(), segments, output, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            with wave.open(output, 'rb') as f:
+                duration = f.getnframes() / f.getframerate()
+            print(f"workers={workers}: {elapsed:.2f}s, 加速 {baseline / elapsed:.1f}x, 音频 {duration / 60:.1f} 分钟",
+                  file=sys.stderr)
+
+        # 逐句合成: 每段很短, 建立连接的开销占了大头
+        sentences = [sentence for segment in split_text(text, 200) for sentence in segment.split('. ')][:400]
+        for pooled in (False, True):
+            output = str(Path(tmp) / f"sentences_{pooled}.wav")
+            backend = FakeSpeechBackend(pooled=pooled)
+            start = time.perf_counter()
+            synthesize_segments(backend, sentences, output, workers=4)
+            elapsed = time.perf_counter() - start
+            label = "复用合成器" if pooled else "每次新建合成器"
+            print(f"逐句合成 {len(sentences)} 句, {label}: {elapsed:.2f}s, "
+                  f"平均每句 {elapsed * 4 / len(sentences) * 1000:.0f}ms", file=sys.stderr)
+
+
+        # 修改一处台词后重新合成, 只有变化的段需要请求服务
+        cache = AudioCache(str(Path(tmp) / "cache"))
+        edited = text.replace("fox", "cat", 1)
+        for label, script in (("首次合成", text), ("修改一处后重新合成", edited)):
+            backend = FakeSpeechBackend()
+            start = time.perf_counter()
+            synthesize_segments(CachedSpeechBackend(backend, cache), split_text(script),
+                                str(Path(tmp) / "cached.wav"), workers=4)
+            print(f"{label}: {time.perf_counter() - start:.2f}s, 请求 {backend.calls} 次, {cache.summary()}",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
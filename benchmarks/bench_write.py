@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+字幕写出的吞吐量: 原来 create_translated_srt 逐条生成 SubtitleItem, str() 后逐条 f.write 的写法,
+与 write_track 按批查表生成时间戳, 拼成一段再写 (srt, WebVTT, ASS, 双语 srt) 对比
+
+用法: python benchmarks/bench_write.py [字幕条数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from srt_data import make_srt
+from srtkit import SubtitleItem, SubtitleTrack, bilingual_texts, load_srt, write_track
+
+
+def per_item_write(track: SubtitleTrack, translations, output_path: str):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for subtitle, translation in zip(track, translations):
+            f.write(str(SubtitleItem(subtitle.index, subtitle.start, subtitle.end, translation)) + '\n')
+
+
+def measure(name: str, function, output_path: Path, cue_count: int):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    size = output_path.stat().st_size / 1e6
+    print(f"{name:<20} {elapsed:>7.3f}s  {cue_count / elapsed / 1e6:>5.2f}M 条/s  {size / elapsed:>6.1f}MB/s",
+          file=sys.stderr)
+
+
+def main():
+    cue_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        make_srt(str(tmp / "input.srt"), cue_count)
+        track = load_srt(str(tmp / "input.srt"))
+        translations = [f"这是第 {i + 1} 条字幕的译文" for i in range(cue_count)]
+        print(f"{cue_count} 条字幕:", file=sys.stderr)
+
+        measure("逐条写出 (原实现)", lambda: per_item_write(track, translations, str(tmp / "a.srt")),
+                tmp / "a.srt", cue_count)
+        measure("srt", lambda: write_track(track, str(tmp / "b.srt"), texts=translations), tmp / "b.srt", cue_count)
+        measure("WebVTT", lambda: write_track(track, str(tmp / "b.vtt"), texts=translations), tmp / "b.vtt",
+                cue_count)
+        measure("ASS", lambda: write_track(track, str(tmp / "b.ass"), texts=translations), tmp / "b.ass", cue_count)
+        measure("双语 srt", lambda: write_track(track, str(tmp / "c.srt"),
+                                              texts=bilingual_texts(track.texts(), translations)),
+                tmp / "c.srt", cue_count)
+        if (tmp / "a.srt").read_bytes() != (tmp / "b.srt").read_bytes():
+            print("输出与原实现不一致", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
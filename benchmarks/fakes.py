@@ -0,0 +1,201 @@
+"""
+离线基准测试用的假服务, 不需要 API key, 也不会产生费用
+"""
+import io
+import json
+import random
+import sys
+import threading
+import time
+import wave
+from collections import deque
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+_repo_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_repo_dir / "python" / "subtitles-translator-ai"))
+sys.path.insert(0, str(_repo_dir / "python" / "azure-tts-python"))
+
+from chunking import estimate_request_tokens  # noqa: E402
+from synthesis import SpeechBackend, SynthesisError, SynthesizerPool  # noqa: E402
+from sys_prompt import system_prompt_gemini  # noqa: E402
+from memory import Hints, items_header  # noqa: E402
+from translator import (OpenAITranslationService, RateLimitError, SubtitleItem, TranslationError,  # noqa: E402
+                        TranslationService)
+
+
+class LatencyRecorder:
+    """记录每次请求从发出到返回的耗时 (秒), 可以被多个线程同时调用"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def record(self, started: float):
+        with self._lock:
+            self.latencies.append(time.perf_counter() - started)
+
+
+class FakeTranslationService(TranslationService):
+    """
+    模拟 LLM 翻译: 每次请求延迟 latency 秒再加上 0~jitter 秒的随机抖动, 按输入原样返回 json 数组
+    drop_rate 模拟模型合并或漏掉字幕: 每条字幕以这个概率从返回体中消失
+    error_rate 模拟服务端错误: 每次请求以这个概率在等待之后抛出 TranslationError
+    每次请求的耗时记在 recorder.latencies 中
+    """
+
+    model_name = "fake/echo"
+    model = "fake-echo"
+
+    def __init__(self, latency: float = 0.05, drop_rate: float = 0.0, seed: int = 0, jitter: float = 0.0,
+                 error_rate: float = 0.0):
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.recorder = LatencyRecorder()
+        self.calls = 0
+        self.cues_sent = 0
+
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
+        started = time.perf_counter()
+        self.calls += 1
+        self.cues_sent += len(subtitle_items)
+        try:
+            time.sleep(self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0))
+            if self.error_rate and self.random.random() < self.error_rate:
+                raise TranslationError("fake: 500 Internal Server Error")
+            return json.dumps([
+                {"index": str(item.index), "original": item.content, "translated": f"译文 {item.content}"}
+                for item in subtitle_items if self.random.random() >= self.drop_rate
+            ], ensure_ascii=False)
+        finally:
+            self.recorder.record(started)
+
+    def build_request_body(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> dict:
+        """与 OpenAI 服务相同的请求参数 (提示 + 字幕数组), 用于 LocalBatchBackend 和 fake_batch_responder 的批量翻译"""
+        return OpenAITranslationService.build_request_body(self, subtitle_items, hints)
+
+    def stream_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> Iterator[str]:
+        """把同样的返回体切成 16 字符一段, 总延迟与 translate_chunk 相同, 首段在 latency / 10 后到达"""
+        latency, jitter, self.latency, self.jitter = self.latency, self.jitter, 0, 0
+        try:
+            response = self.translate_chunk(subtitle_items, hints)
+        finally:
+            self.latency, self.jitter = latency, jitter
+        pieces = [response[i:i + 16] for i in range(0, len(response), 16)]
+        time.sleep(latency / 10)
+        for piece in pieces:
+            yield piece
+            time.sleep(latency * 0.9 / len(pieces))
+
+
+class SimulatedClock:
+    """模拟时钟: sleep 只推进时间不真的等待, 传给 RateLimiter 的 clock 和 sleep"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+
+class QuotaTranslationService(FakeTranslationService):
+    """
+    模拟服务端配额: 按模拟时钟统计最近 60 秒的请求数和 token 数, 超过 rpm / tpm 时抛出 RateLimitError,
+    retry_after 为最早一个请求移出窗口的时间; 每次成功的请求让模拟时钟前进 latency 秒
+    """
+
+    def __init__(self, clock: SimulatedClock, rpm: float, tpm: float, latency: float = 0.5):
+        super().__init__(latency=0)
+        self.clock = clock
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_latency = latency
+        self.window = deque()
+        self.completed = []
+        self.rejected = 0
+
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
+        now = self.clock()
+        while self.window and self.window[0][0] <= now - 60:
+            self.window.popleft()
+        tokens = estimate_request_tokens([item.content for item in subtitle_items], system_prompt_gemini)
+        if len(self.window) + 1 > self.rpm or sum(t for _, t in self.window) + tokens > self.tpm:
+            self.rejected += 1
+            raise RateLimitError("429 Too Many Requests", self.window[0][0] + 60 - now if self.window else 1.0)
+        self.window.append((now, tokens))
+        self.clock.sleep(self.request_latency)
+        self.completed.append(self.clock())
+        return super().translate_chunk(subtitle_items, hints)
+
+
+class FakeSpeechBackend(SpeechBackend):
+    """
+    模拟语音合成: 每次请求延迟 latency + 字符数 * latency_per_char 秒, 再加上 0~jitter 秒的随机抖动,
+    返回 16kHz 16bit 单声道 WAV, 时长按每秒 15 个字符估算, rate 加快语速时按比例缩短, 内容是静音
+    新建合成器(建立连接)额外花 connect_latency 秒; pooled=False 时每次请求都新建, 模拟原来的做法
+    error_rate: 每次请求以这个概率抛出 SynthesisError, 合成没有重试, 整个任务会失败
+    """
+
+    framerate = 16000
+
+    def __init__(self, latency: float = 0.05, latency_per_char: float = 0.0002, connect_latency: float = 0.1,
+                 pooled: bool = True, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.latency_per_char = latency_per_char
+        self.connect_latency = connect_latency
+        self.pooled = pooled
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.recorder = LatencyRecorder()
+        self.pool = SynthesizerPool(self._connect)
+        self.calls = 0
+
+    def _connect(self):
+        time.sleep(self.connect_latency)
+        return object()
+
+    def warm(self, count: int):
+        if self.pooled:
+            self.pool.warm(count)
+
+    def synthesize(self, text: str, rate: int = 0) -> bytes:
+        started = time.perf_counter()
+        self.calls += 1
+        delay = self.latency + len(text) * self.latency_per_char
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if self.pooled:
+            with self.pool.acquire():
+                time.sleep(delay)
+        else:
+            self._connect()
+            time.sleep(delay)
+        self.recorder.record(started)
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise SynthesisError("fake: synthesis canceled")
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.framerate)
+            f.writeframes(bytes(2 * int(self.framerate * len(text) / 15 / (1 + rate / 100))))
+        return buffer.getvalue()
+
+
+def fake_batch_responder(body: dict) -> str:
+    """
+    给 LocalBatchBackend 用: 从批量请求的用户消息中取出 "序号. 原文", 返回与 FakeTranslationService 相同的译文
+    带翻译记忆时, 术语和相似字幕在 "字幕数组:" 之前, 只解析它后面的 json 数组
+    """
+    lines = json.loads(body["messages"][-1]["content"].rpartition(items_header)[2])
+    return json.dumps([
+        {"index": index, "original": text, "translated": f"译文 {text}"}
+        for index, text in (line.split('. ', 1) for line in lines)
+    ], ensure_ascii=False)
@@ -0,0 +1,19 @@
+"""
+生成基准测试用的 srt 文件
+"""
+import sys
+from pathlib import Path
+
+_repo_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_repo_dir))
+
+from srtkit import format_timestamp  # noqa: E402
+
+
+def make_srt(path: str, cue_count: int):
+    """生成一个有 cue_count 条字幕的 srt 文件, 每条 2 秒"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(cue_count):
+            start, end = i * 2000, i * 2000 + 1900
+            f.write(f"{i + 1}\n{format_timestamp(start)} --> {format_timestamp(end)}\n"
+                    f"This is subtitle line number {i + 1}, it says something.\n\n")
@@ -1,25 +1,51 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 from datetime import datetime
 from pathlib import Path
 
-if len(sys.argv) != 2:
-    print("使每行内容开头首字母大写, 用法: 输入文件.srt")
-    sys.exit(1)
+from srtkit import SubtitleError, TextRules, add_batch_arguments, expand_inputs, is_pattern, output_jobs, run_batch
 
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-input_file_path = sys.argv[1]
-output_file_path = f"{Path(input_file_path)}_cap_{timestamp}.srt"
+# 等同于 normalize.py --rule capitalize
+_rules = TextRules(["capitalize"])
 
-with open(input_file_path, 'r', encoding='utf-8') as f:
-    lines = f.readlines()
 
-for i in range(len(lines)):
-    if lines[i].strip() and lines[i][0].isalpha():
-        lines[i] = lines[i][0].upper() + lines[i][1:]
+def capitalize_file(input_file_path: str, output_file_path: str) -> int:
+    """处理一个文件, 只改字幕内容, 返回字幕条数"""
+    return _rules.apply_file(input_file_path, output_file_path)
 
-with open(output_file_path, 'w', encoding='utf-8') as f:
-    f.writelines(lines)
 
-print(f"处理完成: {input_file_path} -> {output_file_path}")
+def main():
+    parser = argparse.ArgumentParser(description="使每行内容开头首字母大写")
+    parser.add_argument("inputs", nargs="+", help="输入文件.srt, 批量模式下也可以是目录或通配符")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.output_dir:
+        try:
+            report = run_batch(output_jobs(expand_inputs(args.inputs), args.output_dir), capitalize_file,
+                               "capitalize", args.workers, args.force)
+        except SubtitleError as e:
+            print(f"字幕处理错误: {str(e)}")
+            sys.exit(1)
+        print(report.summary())
+        sys.exit(1 if report.failed else 0)
+
+    if len(args.inputs) != 1 or is_pattern(args.inputs[0]) or Path(args.inputs[0]).is_dir():
+        print("使每行内容开头首字母大写, 用法: 输入文件.srt, 处理多个文件时用 --output-dir 指定输出目录")
+        sys.exit(1)
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    input_file_path = args.inputs[0]
+    output_file_path = f"{Path(input_file_path)}_cap_{timestamp}.srt"
+    try:
+        capitalize_file(input_file_path, output_file_path)
+    except SubtitleError as e:
+        print(f"字幕处理错误: {str(e)}")
+        sys.exit(1)
+    print(f"处理完成: {input_file_path} -> {output_file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,19 @@
 #!/usr/bin/env python3
 
+import argparse
 import re
-from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import sys
 
+from srtkit import (Alignment, BatchJob, SubtitleError, SubtitleTrack, add_batch_arguments, add_output_arguments,
+                    align_translations, bilingual_texts, expand_inputs, format_timestamp, load_srt, read_text,
+                    run_batch, write_track)
 
-class SubtitleError(Exception):
-    """字幕处理相关的异常"""
-    pass
-
-
-@dataclass
-class SubtitleItem:
-    index: int
-    timestamp: str
-    content: str
-
-    def __str__(self):
-        return f"{self.index}\n{self.timestamp}\n{self.content}\n"
-
-
-def parse_srt(file_path: str) -> List[SubtitleItem]:
-    if not Path(file_path).exists():
-        raise SubtitleError(f"找不到字幕文件: {file_path}")
-
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        raise SubtitleError(f"无法读取字幕文件，请确保文件编码是UTF-8: {file_path}")
-
-    # 以2个或更多连续空行分割字幕块
-    # strip(): 去掉字符串首尾的空白字符(whitespace), 包括空格、换行符...
-    subtitle_blocks = re.split(r'\n\n+', content.strip())
-    if not subtitle_blocks:
-        raise SubtitleError("字幕文件为空")
-
-    subtitle_items = []
-    for block in subtitle_blocks:
-        # 以换行分割每个字幕块包含索引 时间戳 内容
-        lines = block.split('\n')
-        if len(lines) < 3:
-            raise SubtitleError(f"格式错误的字幕块: {block}")
-
-        index = int(re.sub(r'\D', '', lines[0].strip()))
-        timestamp = lines[1].strip()
-        content = '\n'.join(lines[2:])
-        subtitle_items.append(SubtitleItem(index, timestamp, content))
-
-    return subtitle_items
+# 置信度低于这个值的字幕列在对齐报告里, 需要人工校对
+_min_confidence = 0.5
 
 
 def parse_translations(file_path: str) -> List[str]:
@@ -60,11 +22,8 @@ def parse_translations(file_path: str) -> List[str]:
     """
     if not Path(file_path).exists():
         raise SubtitleError(f"找不到翻译文件: {file_path}")
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        raise SubtitleError(f"无法读取翻译文件，请确保文件编码是UTF-8: {file_path}")
+    # 译文可能是 GBK, Big5 等编码, 按识别出的编码读取
+    content = read_text(file_path)
 
     lines = re.split(r'\n', content.strip())
     if not lines:
@@ -74,42 +33,124 @@ def parse_translations(file_path: str) -> List[str]:
     return [t.strip() for t in lines if t.strip()]
 
 
-def create_translated_srt(subtitles: List[SubtitleItem], translations: List[str], output_path: str):
+def create_translated_srt(subtitles: SubtitleTrack, translations: List[str], output_path: str,
+                          output_format: str = "srt", bilingual: bool = False):
     """
     创建新的字幕文件，使用翻译内容替换原字幕内容
+    bilingual 为 True 时保留原文, 译文放在原文下面; output_format 可以是 srt, vtt, ass
+    """
+    texts = bilingual_texts(subtitles.texts(), translations) if bilingual else translations
+    write_track(subtitles, output_path, output_format, texts)
+
+
+def format_report(subtitles: SubtitleTrack, alignment: Alignment, min_confidence: float) -> List[str]:
+    """置信度低于 min_confidence 的字幕, 每条三行: 序号/时间/对齐方式, 原文, 译文"""
+    lines = []
+    for position in alignment.low_confidence(min_confidence):
+        item, cue = subtitles[position], alignment.cues[position]
+        source_lines = ', '.join(str(number + 1) for number in cue.lines) or '无'
+        lines.append(f"#{item.index} {item.timestamp} [{cue.kind} {cue.confidence:.2f}] 译文第 {source_lines} 行")
+        lines.append(f"    原文: {' '.join(item.content.split())}")
+        lines.append(f"    译文: {alignment.texts[position]}")
+    return lines
+
+
+def write_report(subtitles: SubtitleTrack, alignment: Alignment, report_path: str):
+    """每条字幕一行的对齐报告 (TSV): 序号, 开始, 结束, 对齐方式, 置信度, 译文行号, 原文, 译文"""
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("index\tstart\tend\tkind\tconfidence\tlines\tsource\ttranslation\n")
+        for item, cue, text in zip(subtitles, alignment.cues, alignment.texts):
+            source_lines = ','.join(str(number + 1) for number in cue.lines)
+            f.write(f"{item.index}\t{format_timestamp(item.start)}\t{format_timestamp(item.end)}\t{cue.kind}\t"
+                    f"{cue.confidence:.3f}\t{source_lines}\t{' '.join(item.content.split())}\t{text}\n")
+
+
+def merge_file(subtitle_file_path: str, translation_file_path: str, output_file: str, align: bool = False,
+               min_confidence: float = _min_confidence, report_path: Optional[str] = None,
+               show_cues: bool = True, output_format: str = "srt", bilingual: bool = False) -> int:
+    """
+    用译文替换一个字幕文件的内容, 返回字幕条数
+    align 为 True 时按长度, 标点, 时间轴把译文行对齐到字幕, 行数不一致也能合并,
+    低置信度的字幕逐条打印 (show_cues) 或连同其余字幕写入 report_path
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for subtitle, translation in zip(subtitles, translations):
-            new_subtitle = SubtitleItem(
-                subtitle.index, subtitle.timestamp, translation)
-            f.write(str(new_subtitle) + '\n')
+    subtitle_items = load_srt(subtitle_file_path)
+    translation_lines = parse_translations(translation_file_path)
+    if not align:
+        if len(subtitle_items) != len(translation_lines):
+            raise SubtitleError(f"字幕数量 ({len(subtitle_items)}) 与翻译行数 ({len(translation_lines)}) 不匹配, "
+                                f"可以加 --align 自动对齐")
+        create_translated_srt(subtitle_items, translation_lines, output_file, output_format, bilingual)
+        return len(subtitle_items)
+
+    alignment = align_translations(subtitle_items, translation_lines)
+    create_translated_srt(subtitle_items, alignment.texts, output_file, output_format, bilingual)
+    low = alignment.low_confidence(min_confidence)
+    print(f"{subtitle_file_path}: {alignment.summary()}, 置信度低于 {min_confidence} 的 {len(low)} 条需要校对")
+    if report_path:
+        write_report(subtitle_items, alignment, report_path)
+    elif show_cues:
+        for line in format_report(subtitle_items, alignment, min_confidence):
+            print(line)
+    return len(subtitle_items)
+
+
+def merge_batch(args):
+    """批量模式: 每个字幕文件配同名的 .txt 译文, 结果按字幕文件名写到输出目录"""
+    jobs = []
+    for subtitle_path in expand_inputs(args.inputs):
+        translation_dir = Path(args.translations) if args.translations else subtitle_path.parent
+        jobs.append(BatchJob((str(subtitle_path), str(translation_dir / f"{subtitle_path.stem}.txt")),
+                             str(Path(args.output_dir) / f"{subtitle_path.stem}.{args.output_format}")))
+    # 多个进程同时打印逐条的报告会交错在一起, 批量模式每个文件只打印一行汇总;
+    # 对齐模式和双语字幕的输出与逐行替换不同, 工具名也区分开, 切换模式后不会误跳过
+    process = partial(merge_file, align=args.align, min_confidence=args.min_confidence, show_cues=False,
+                      output_format=args.output_format, bilingual=args.bilingual)
+    tool = "merge_subtitle"
+    if args.align:
+        tool += " --align"
+    if args.bilingual:
+        tool += " --bilingual"
+    try:
+        report = run_batch(jobs, process, tool, args.workers, args.force)
+    except SubtitleError as e:
+        print(f"字幕处理错误: {str(e)}")
+        sys.exit(1)
+    print(report.summary())
+    sys.exit(1 if report.failed else 0)
 
 
 def main():
-    if len(sys.argv) < 3:
+    parser = argparse.ArgumentParser(description="用翻译文件逐行替换字幕内容")
+    parser.add_argument("inputs", nargs="+",
+                        help="<subtitle_file> <translation_file>; 批量模式下是字幕文件, 目录或通配符")
+    parser.add_argument("--translations", default=None,
+                        help="批量模式: 存放同名 .txt 译文的目录 (默认: 与字幕文件在同一目录)")
+    parser.add_argument("--align", action="store_true",
+                        help="译文行数与字幕条数不一致时 (模型合并, 拆分或漏掉了行), 按长度, 标点, 时间轴自动对齐")
+    parser.add_argument("--min-confidence", type=float, default=_min_confidence,
+                        help=f"对齐模式: 置信度低于这个值的字幕打印出来人工校对 (默认: {_min_confidence})")
+    parser.add_argument("--report", default=None, help="对齐模式: 每条字幕的对齐方式和置信度写到这个 TSV 文件, 不再打印")
+    add_output_arguments(parser)
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.output_dir:
+        merge_batch(args)
+
+    if len(args.inputs) != 2:
         print("请提供字幕和翻译文件的路径")
         print("用法: merge_subtitle.py <subtitle_file> <translation_file>")
+        print("批量: merge_subtitle.py <目录或通配符> --translations <译文目录> --output-dir <输出目录>")
         sys.exit(1)
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    subtitle_file_path = sys.argv[1]
-    translation_file_path = sys.argv[2]
-    output_file = f"ch{Path(subtitle_file_path).stem}_{timestamp}.srt"
+    subtitle_file_path, translation_file_path = args.inputs
+    output_file = f"ch{Path(subtitle_file_path).stem}_{timestamp}.{args.output_format}"
 
     try:
-        # 解析原始字幕和翻译
-        # subtitle_items: List[SubtitleItem]
-        subtitle_items = parse_srt(subtitle_file_path)
-        translation_lines = parse_translations(
-            translation_file_path)  # translation_lines: List[str]
-
-        # 检查数量是否匹配
-        if len(subtitle_items) != len(translation_lines):
-            print(f"错误：字幕数量 ({len(subtitle_items)}) 与翻译行数 ({len(translation_lines)}) 不匹配")
-            sys.exit(1)
-
-        # 创建新的字幕文件
-        create_translated_srt(subtitle_items, translation_lines, output_file)
+        # 解析字幕和翻译, 数量不匹配时抛出 SubtitleError
+        merge_file(subtitle_file_path, translation_file_path, output_file, args.align, args.min_confidence,
+                   args.report, output_format=args.output_format, bilingual=args.bilingual)
         print(f"成功创建翻译后的字幕文件：{output_file}")
 
     except SubtitleError as e:
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+按顺序对字幕内容应用一组清理规则, 一次读写完成, 序号和时间戳不变
+
+规则: capitalize 行首字母大写, strip-punctuation 去掉行尾标点, whitespace 合并多余空白,
+cjk-spacing 中文与英文/数字之间加空格, --replace 正则替换; 按命令行上的先后顺序执行
+
+用法:
+  normalize.py ep01.srt --rule whitespace --rule strip-punctuation --rule capitalize
+  normalize.py ep01.srt out.srt --replace '\\s*-\\s*$' '' --rule cjk-spacing
+  normalize.py season1/ --rule strip-punctuation --rule capitalize --output-dir out/
+"""
+import argparse
+import sys
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+from srtkit import (SubtitleError, TextRules, add_batch_arguments, add_rule_arguments, expand_inputs, is_pattern,
+                    output_jobs, run_batch)
+
+
+def normalize_file(input_file: str, output_file: str, rules: TextRules) -> int:
+    """处理一个文件, 返回字幕条数"""
+    return rules.apply_file(input_file, output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按顺序对字幕内容应用一组清理规则")
+    parser.add_argument("inputs", nargs="+",
+                        help="输入文件.srt [输出文件.srt]; 批量模式下是输入文件, 目录或通配符")
+    add_rule_arguments(parser)
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        rules = TextRules(args.rules)
+    except SubtitleError as e:
+        print(f"参数错误: {str(e)}")
+        sys.exit(1)
+    if not rules:
+        print("没有指定任何规则, 见 normalize.py --help")
+        sys.exit(1)
+
+    if args.output_dir:
+        try:
+            # 规则不同的输出不能互相跳过, 把规则写进工具名
+            report = run_batch(output_jobs(expand_inputs(args.inputs), args.output_dir),
+                               partial(normalize_file, rules=rules), f"normalize {rules.rules}", args.workers,
+                               args.force)
+        except SubtitleError as e:
+            print(f"字幕处理错误: {str(e)}")
+            sys.exit(1)
+        print(report.summary())
+        sys.exit(1 if report.failed else 0)
+
+    if len(args.inputs) > 2 or is_pattern(args.inputs[0]) or Path(args.inputs[0]).is_dir():
+        print("用法: normalize.py 输入文件.srt [输出文件.srt] --rule ..., 处理多个文件时用 --output-dir 指定输出目录")
+        sys.exit(1)
+
+    input_file = args.inputs[0]
+    if len(args.inputs) == 2:
+        output_file = args.inputs[1]
+    else:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_file = f"{Path(input_file).stem}_normalized_{timestamp}.srt"
+    try:
+        cues = normalize_file(input_file, output_file, rules)
+    except SubtitleError as e:
+        print(f"字幕处理错误: {str(e)}")
+        sys.exit(1)
+    print(f"处理完成: {input_file} -> {output_file}, {cues} 条字幕")
+
+
+if __name__ == "__main__":
+    main()
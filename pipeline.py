@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+一条命令跑完字幕处理流程: 调整时间轴 -> 翻译 -> 合并译文 -> 去标点 -> 首字母大写 -> 配音
+
+所有阶段都在内存中的同一条 SubtitleTrack 上进行, 每个文件只解析一次, 只写最终结果;
+翻译服务, 缓存和语音合成器在处理多个文件时共用, SDK 只在用到的阶段导入一次
+
+用法:
+  pipeline.py episodes/ --stages clean,capitalize
+  pipeline.py ep01.srt ep02.srt --stages translate,clean --service gemini
+  pipeline.py ep01.srt --stages merge,clean,synthesize --translations ep01.txt --language zh
+  pipeline.py ep01.srt --stages retime,translate --merge-shorter-than 800 --fps 25:23.976
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from merge_subtitle import parse_translations
+from retime import add_timing_arguments, apply_plan, join_negative_values, timing_plan
+from srtkit import (Rule, RunMetrics, SubtitleError, SubtitleTrack, TextRules, add_output_arguments,
+                    add_rule_arguments, align_translations, bilingual_texts, load_srt, save_srt, write_track)
+
+_repo_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(_repo_dir / "python" / "subtitles-translator-ai"))
+from translator import add_translation_arguments, provider_names, service_name  # noqa: E402
+
+_stage_names = ("retime", "translate", "merge", "clean", "capitalize", "normalize", "synthesize")
+_rule_stages = ("clean", "capitalize", "normalize")
+# 把原文换成译文的阶段, 双语字幕的原文取第一个这种阶段之前的文本
+_translation_stages = ("translate", "merge")
+
+# 阶段函数: (字幕轨道, 输入文件路径) -> 处理后的字幕轨道
+Stage = Callable[[SubtitleTrack, Path], SubtitleTrack]
+
+
+def _rules_stage(rules: TextRules) -> Stage:
+    def normalize(track: SubtitleTrack, input_file: Path) -> SubtitleTrack:
+        return track.with_texts(map(rules.apply, track.texts()))
+
+    return normalize
+
+
+def _retime_stage(args) -> Stage:
+    plan = timing_plan(args)
+
+    def retime(track: SubtitleTrack, input_file: Path) -> SubtitleTrack:
+        return apply_plan(track, plan)
+
+    return retime
+
+
+def _merge_stage(translations: str, align: bool) -> Stage:
+    def merge(track: SubtitleTrack, input_file: Path) -> SubtitleTrack:
+        # 目录中按输入文件名找同名的 .txt 译文
+        path = Path(translations)
+        if path.is_dir():
+            path = path / f"{input_file.stem}.txt"
+        lines = parse_translations(str(path))
+        if align:
+            alignment = align_translations(track, lines)
+            print(f"{input_file}: {alignment.summary()}")
+            return track.with_texts(alignment.texts)
+        if len(lines) != len(track):
+            raise SubtitleError(f"字幕数量 ({len(track)}) 与翻译行数 ({len(lines)}) 不匹配: {path}")
+        return track.with_texts(lines)
+
+    return merge
+
+
+def _translate_stage(args, metrics: RunMetrics) -> Tuple[Stage, Callable[[], None]]:
+    from memory import TranslationMemory
+    from translator import create_service, open_cache, translator_from_args, wrap_service
+
+    cache = open_cache(args)
+    memory = TranslationMemory.load(args.memory) if args.memory else None
+    service, limiter = wrap_service(create_service(args.service), args.workers, args.rpm, args.tpm, cache, metrics)
+    translator = translator_from_args(args, service, metrics, memory)
+
+    def translate(track: SubtitleTrack, input_file: Path) -> SubtitleTrack:
+        return translator.translate_track(track)
+
+    def report():
+        print(limiter.summary())
+        if cache:
+            print(cache.summary())
+            cache.close()
+        if memory:
+            print(memory.summary())
+
+    return translate, report
+
+
+def _synthesize_stage(args, output_dir: Path, metrics: RunMetrics) -> Tuple[Stage, Callable[[], None]]:
+    sys.path.insert(0, str(_repo_dir / "python" / "azure-tts-python"))
+    from audio_cache import AudioCache, CachedSpeechBackend
+    from dubbing import render_track
+    from tts import AzureTTS, voice_for
+
+    character, tone = voice_for(args.language)
+    tts = AzureTTS(character, tone)
+    cache = None if args.no_cache else AudioCache()
+    backend = CachedSpeechBackend(tts, cache, metrics) if cache else tts
+
+    def synthesize(track: SubtitleTrack, input_file: Path) -> SubtitleTrack:
+        output_file = output_dir / f"{input_file.stem}.wav"
+        print(render_track(backend, track, str(output_file), workers=args.workers, metrics=metrics).summary())
+        return track
+
+    def report():
+        if cache:
+            print(cache.summary())
+
+    return synthesize, report
+
+
+def _stage_rules(name: str, args) -> List[Rule]:
+    if name == "clean":
+        return ["strip-punctuation"]
+    if name == "capitalize":
+        return ["capitalize"]
+    if not args.rules:
+        raise SubtitleError("normalize 阶段需要 --rule 或 --replace 指定规则")
+    return args.rules
+
+
+def build_stages(args, output_dir: Path,
+                 metrics: RunMetrics) -> Tuple[List[Tuple[str, Stage]], List[Callable[[], None]]]:
+    """
+    按 --stages 的顺序创建各阶段, 只导入用到的阶段需要的模块
+    相邻的文本清理阶段 (clean, capitalize, normalize) 合成一个阶段, 规则按顺序编译在一起, 只遍历一次字幕
+    """
+    stages, reports = [], []
+    rule_names, rules = [], []
+    for name in args.stages + [None]:
+        if name in _rule_stages:
+            rule_names.append(name)
+            rules.extend(_stage_rules(name, args))
+            continue
+        if rules:
+            stages.append(('+'.join(rule_names), _rules_stage(TextRules(rules))))
+            rule_names, rules = [], []
+        if name is None:
+            break
+        if name == "retime":
+            stage = _retime_stage(args)
+        elif name == "translate":
+            stage, report = _translate_stage(args, metrics)
+            reports.append(report)
+        elif name == "merge":
+            if not args.translations:
+                raise SubtitleError("merge 阶段需要 --translations 指定译文文件或目录")
+            stage = _merge_stage(args.translations, args.align)
+        else:
+            stage, report = _synthesize_stage(args, output_dir, metrics)
+            reports.append(report)
+        stages.append((name, stage))
+    return stages, reports
+
+
+def collect_inputs(paths: List[str]) -> List[Path]:
+    """文件原样保留, 目录展开为其中的 .srt 文件"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.srt")))
+        else:
+            files.append(path)
+    return files
+
+
+def run_file(input_file: Path, stages: List[Tuple[str, Stage]], output_dir: Path, keep_intermediate: bool,
+             output_format: str = "srt", bilingual: bool = False) -> int:
+    """
+    处理一个文件, 返回字幕条数
+    bilingual 为 True 时, 第一个 translate/merge 阶段之前的文本作为原文, 与最终的译文一起写成双语字幕
+    """
+    track = load_srt(str(input_file))
+    original = None
+    text_changed = False
+    for position, (name, stage) in enumerate(stages, 1):
+        if original is None and name in _translation_stages:
+            original = track
+        track = stage(track, input_file)
+        if name != "synthesize":
+            text_changed = True
+            if keep_intermediate:
+                save_srt(track, str(output_dir / f"{input_file.stem}.{position}-{name}.srt"))
+    if text_changed:
+        texts = None
+        if bilingual:
+            if len(original) != len(track):
+                raise SubtitleError(f"翻译之后字幕条数变了 ({len(original)} -> {len(track)}), 无法输出双语字幕")
+            texts = bilingual_texts(original.texts(), track.texts())
+        write_track(track, str(output_dir / f"{input_file.stem}.processed.{output_format}"), output_format, texts)
+    return len(track)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在一个进程中按顺序执行字幕处理的各个阶段")
+    parser.add_argument("inputs", nargs="+", help="srt 字幕文件或包含 srt 文件的目录")
+    parser.add_argument("--stages", required=True,
+                        help=f"逗号分隔的阶段, 按给出的顺序执行, 可选: {', '.join(_stage_names)}")
+    parser.add_argument("--output-dir", default=".", help="输出目录 (默认: 当前目录)")
+    parser.add_argument("--keep-intermediate", action="store_true", help="每个阶段之后都保存一份中间结果")
+    parser.add_argument("--workers", type=int, default=4, help="翻译和配音的并发请求数 (默认: 4)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用翻译缓存和语音缓存")
+    parser.add_argument("--service", default="gemini", type=service_name,
+                        help=f"translate 阶段的翻译服务: {' 或 '.join(provider_names())} (默认: gemini)")
+    # translate 阶段的参数与 translator.py 相同
+    add_translation_arguments(parser)
+    parser.add_argument("--translations", default=None, help="merge 阶段的译文文件, 或按输入文件名存放 .txt 译文的目录")
+    parser.add_argument("--align", action="store_true", help="merge 阶段: 译文行数与字幕条数不一致时自动对齐")
+    parser.add_argument("--language", default="zh", choices=["zh", "us", "gb"], help="synthesize 阶段的配音语言")
+    add_timing_arguments(parser)
+    add_rule_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument("--metrics", default=None, help="把翻译和配音的每次请求记录写入这个 JSONL 文件")
+    args = parser.parse_args(join_negative_values(sys.argv[1:]))
+
+    args.stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in args.stages if name not in _stage_names]
+    if unknown or not args.stages:
+        print(f"未知的阶段: {', '.join(unknown)}, 可选: {', '.join(_stage_names)}")
+        sys.exit(1)
+    if args.bilingual and not any(name in _translation_stages for name in args.stages):
+        print("--bilingual 需要 translate 或 merge 阶段")
+        sys.exit(1)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("没有找到 srt 文件")
+        sys.exit(1)
+
+    metrics = RunMetrics(args.metrics)
+    try:
+        stages, reports = build_stages(args, output_dir, metrics)
+    except Exception as e:
+        print(f"初始化失败: {str(e)}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    total_cues = 0
+    failures = []
+    for input_file in inputs:
+        try:
+            total_cues += run_file(input_file, stages, output_dir, args.keep_intermediate, args.output_format,
+                                   args.bilingual)
+            print(f"完成: {input_file}")
+        except Exception as e:
+            # 一个文件失败不影响其余文件
+            failures.append(input_file)
+            print(f"处理失败: {input_file}: {str(e)}")
+    elapsed = time.perf_counter() - start
+
+    for report in reports:
+        report()
+    if reports:
+        print(metrics.summary())
+    metrics.close()
+    print(f"处理了 {len(inputs) - len(failures)}/{len(inputs)} 个文件, {total_cues} 条字幕, 耗时 {elapsed:.2f}s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
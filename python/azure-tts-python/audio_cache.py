@@ -0,0 +1,120 @@
+"""
+Content-addressed cache of synthesized audio.
+
+Each segment is stored as <cache dir>/<key[:2]>/<key>.wav, where the key is the hash of
+everything that determines the audio (for Azure: output format + generated SSML, which
+covers voice, tone, speed, role, style and text). Hits refresh the file's mtime, and the
+least recently used files are evicted once the cache grows past max_bytes.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from synthesis import SpeechBackend
+
+_default_cache_dir = Path.home() / ".cache" / "azure-tts-python" / "audio"
+_default_max_bytes = 1024 * 1024 * 1024
+
+
+def content_key(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = _default_max_bytes):
+        self.directory = Path(directory or _default_cache_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Keep the running total in memory so writes don't have to rescan the directory
+        self._total_bytes = sum(path.stat().st_size for path in self._files())
+        if self._total_bytes > max_bytes:
+            self._evict()
+
+    def _files(self):
+        return self.directory.glob("*/*.wav")
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.wav"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            # mtime is the LRU clock
+            os.utime(path)
+        except FileNotFoundError:
+            data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        # Write to a temporary name first so a concurrent reader never sees a partial file
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Rescan: overwritten entries make the running total drift upwards
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the cap so that not every write triggers a rescan
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._total_bytes = total
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"TTS cache: {self.hits} hits, {self.misses} misses, hit rate {rate:.1f}%"
+
+
+class CachedSpeechBackend(SpeechBackend):
+    """Serves segments from an AudioCache and only calls the wrapped backend for misses"""
+
+    def __init__(self, backend: SpeechBackend, cache: AudioCache, metrics=None):
+        self.backend = backend
+        self.cache = cache
+        # An srtkit RunMetrics that gets one `audio_cache` event per lookup
+        self.metrics = metrics
+
+    def cache_key(self, text: str, rate: int = 0) -> str:
+        return self.backend.cache_key(text, rate)
+
+    def warm(self, count: int):
+        # Synthesizers are created on demand instead: a fully cached run should not open any connections
+        pass
+
+    def synthesize(self, text: str, rate: int = 0) -> bytes:
+        key = self.backend.cache_key(text, rate)
+        data = self.cache.get(key)
+        if self.metrics:
+            self.metrics.record("audio_cache", hit=data is not None)
+        if data is None:
+            data = self.backend.synthesize(text, rate)
+            self.cache.put(key, data)
+        return data
@@ -0,0 +1,192 @@
+"""
+Subtitle-timed synthesis: render every cue of an SRT track and place each clip
+at its cue start time in one output WAV.
+
+Clips that run past the start of the next cue are re-synthesized with a faster
+prosody rate; whatever still does not fit is cut at the next cue so the track
+never drifts out of sync. The track is streamed to disk in windows of cues, so
+memory does not grow with the length of the video.
+"""
+import math
+import os
+import re
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from synthesis import SpeechBackend, SynthesisError, read_wav, synthesize_many
+
+# Never speed a cue up by more than this many percent; faster speech becomes hard to follow
+DEFAULT_MAX_SPEEDUP = 50
+# Cues synthesized and written per round; only this many clips (plus repeated texts) are held in memory
+DEFAULT_WINDOW = 256
+# Silence is written in pieces of at most this many frames
+_silence_frames = 1 << 16
+
+
+@dataclass
+class DubReport:
+    cues: int = 0
+    # Requests actually sent; identical cue texts are synthesized once
+    requests: int = 0
+    sped_up: int = 0
+    truncated: int = 0
+    duration_ms: int = 0
+
+    def summary(self) -> str:
+        return (f"Rendered {self.cues} cues ({self.duration_ms / 60000:.1f} min) with {self.requests} requests, "
+                f"{self.sped_up} sped up, {self.truncated} truncated")
+
+
+# SRT formatting tags (<i>, </b>, <font color="...">) and ASS override blocks ({\an8}, {\i1})
+_markup = re.compile(r'</?[A-Za-z][^>]*>|\{\\[^}]*\}')
+
+
+def _speech_text(text: str) -> str:
+    """The words to speak: markup is removed so it is neither read aloud nor sent as SSML"""
+    return ' '.join(_markup.sub(' ', text).split())
+
+
+class _TrackWriter:
+    """
+    Writes clips at frame offsets into an open wave writer, in start order.
+    Only the samples a later clip can still overlap are kept in memory; gaps are written as silence.
+    """
+
+    def __init__(self, output: wave.Wave_write, frame_size: int):
+        self.output = output
+        self.frame_size = frame_size
+        # Samples from frame `base` on that are not written yet
+        self.pending = bytearray()
+        self.base = 0
+
+    def _silence(self, frames: int):
+        if frames <= 0:
+            return
+        # Zero bytes are silence for 16-bit PCM
+        chunk = bytes(min(frames, _silence_frames) * self.frame_size)
+        while frames > 0:
+            self.output.writeframesraw(chunk[:min(frames, _silence_frames) * self.frame_size])
+            frames -= _silence_frames
+
+    def place(self, start: int, samples):
+        offset = (start - self.base) * self.frame_size
+        if offset >= len(self.pending):
+            self.output.writeframesraw(self.pending)
+            self._silence((offset - len(self.pending)) // self.frame_size)
+            self.pending = bytearray(samples)
+        else:
+            # Later clips start at or after `start`, so everything before it is final;
+            # an overlapping clip overwrites the tail of the previous one
+            self.output.writeframesraw(self.pending[:offset])
+            del self.pending[:offset]
+            self.pending[:len(samples)] = samples
+        self.base = start
+
+    def finish(self, total_frames: int) -> int:
+        """Flush the remaining samples, pad with silence up to total_frames and return the written length"""
+        self.output.writeframesraw(self.pending)
+        written = self.base + len(self.pending) // self.frame_size
+        self._silence(total_frames - written)
+        return max(written, total_frames)
+
+
+def render_track(backend: SpeechBackend, track, output_path: str, workers: int = 4,
+                 max_speedup: int = DEFAULT_MAX_SPEEDUP, metrics=None, window: int = DEFAULT_WINDOW) -> DubReport:
+    """
+    Synthesize every non-empty cue of `track` (an srtkit SubtitleTrack) and write one WAV
+    where each clip starts at its cue's start time and silence fills the gaps.
+    A cue's slot runs until the next cue starts (the last cue is unbounded).
+
+    Cues are rendered `window` at a time in start order and streamed to <output_path>.part,
+    which replaces output_path once the whole track is written. Memory holds the clips of one
+    window plus those whose text is repeated by a later cue, never the whole track
+    (a 2-hour film is ~350 MB of 24 kHz 16-bit mono PCM).
+    metrics: an srtkit RunMetrics that gets one `synthesis` event per request
+    """
+    report = DubReport(cues=len(track))
+    starts, ends = list(track.starts), list(track.ends)
+    texts = [_speech_text(text) for text in track.texts()]
+    slots: List[Optional[int]] = []
+    for position in range(len(starts) - 1):
+        next_start = starts[position + 1]
+        # Overlapping cues fall back to the cue's own duration
+        slots.append(next_start - starts[position] if next_start > starts[position]
+                     else ends[position] - starts[position])
+    slots.append(None)
+    if not any(texts):
+        raise SynthesisError("The subtitle file has no text to synthesize")
+
+    # Clips are written in start order; identical texts are synthesized once and dropped after their last cue
+    order = sorted(range(len(texts)), key=starts.__getitem__)
+    last_use = {texts[position]: rank for rank, position in enumerate(order)}
+    audio: Dict[tuple, bytes] = {}
+    writer = None
+    part_path = f"{output_path}.part"
+    try:
+        with wave.open(part_path, 'wb') as output:
+            for first in range(0, len(order), window):
+                positions = [position for position in order[first:first + window] if texts[position]]
+                if not positions:
+                    continue
+
+                # Round 1: each distinct text once at the configured speed
+                unique = sorted({texts[position] for position in positions} - {text for text, _ in audio})
+                audio.update(zip(((text, 0) for text in unique),
+                                 synthesize_many(backend, unique, workers, label="cue", metrics=metrics)))
+                report.requests += len(unique)
+
+                # Round 2: re-synthesize clips that overrun their slot, just fast enough to fit
+                rates = {}
+                for position in positions:
+                    slot = slots[position]
+                    if slot is None or slot <= 0:
+                        continue
+                    clip_format, samples = read_wav(audio[(texts[position], 0)])
+                    duration_ms = len(samples) * 1000 / (clip_format.framerate * clip_format.nchannels
+                                                         * clip_format.sampwidth)
+                    if duration_ms > slot:
+                        rates[position] = min(max_speedup, math.ceil((duration_ms / slot - 1) * 100))
+                retries = sorted({(texts[position], rate) for position, rate in rates.items()} - audio.keys())
+                if retries:
+                    print(f"{len(retries)} cue(s) overrun their slot, re-synthesizing faster")
+                    audio.update(zip(retries, synthesize_many(backend, [text for text, _ in retries], workers,
+                                                              rates=[rate for _, rate in retries], label="cue",
+                                                              metrics=metrics)))
+                    report.requests += len(retries)
+                report.sped_up += len(rates)
+
+                if writer is None:
+                    audio_format = read_wav(next(iter(audio.values())))[0]
+                    if audio_format.sampwidth == 1:
+                        raise SynthesisError("8-bit audio is not supported for subtitle rendering")
+                    frame_size = audio_format.nchannels * audio_format.sampwidth
+                    output.setnchannels(audio_format.nchannels)
+                    output.setsampwidth(audio_format.sampwidth)
+                    output.setframerate(audio_format.framerate)
+                    writer = _TrackWriter(output, frame_size)
+
+                for position in positions:
+                    clip_format, samples = read_wav(audio[(texts[position], rates.get(position, 0))])
+                    if clip_format != audio_format:
+                        raise SynthesisError(f"Cue {track.indices[position]} has a different audio format: "
+                                             f"{clip_format}")
+                    frames = len(samples) // frame_size
+                    slot = slots[position]
+                    if slot is not None and frames > slot * audio_format.framerate // 1000:
+                        frames = slot * audio_format.framerate // 1000
+                        report.truncated += 1
+                    writer.place(starts[position] * audio_format.framerate // 1000, samples[:frames * frame_size])
+
+                finished = first + window
+                for key in [key for key in audio if last_use[key[0]] < finished]:
+                    del audio[key]
+
+            total_frames = writer.finish(max(ends) * audio_format.framerate // 1000)
+    except BaseException:
+        Path(part_path).unlink(missing_ok=True)
+        raise
+    os.replace(part_path, output_path)
+    report.duration_ms = total_frames * 1000 // audio_format.framerate
+    return report
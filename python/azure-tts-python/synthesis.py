@@ -0,0 +1,308 @@
+"""
+Chunked synthesis for long scripts: split text into size-bounded segments at
+paragraph/sentence boundaries, synthesize them concurrently into in-memory WAV
+buffers, then write them out in order as a single file.
+
+Nothing in here depends on the Azure SDK, so any SpeechBackend can be plugged in.
+"""
+import hashlib
+import queue
+import re
+import struct
+import time
+import unicodedata
+import wave
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Callable, Generic, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+# Azure rejects requests that produce more than 10 minutes of audio;
+# 3000 characters is roughly 3-4 minutes of speech, well inside that limit.
+DEFAULT_MAX_CHARS = 3000
+DEFAULT_SILENCE_MS = 300
+
+_paragraph_break = re.compile(r'\n\s*\n')
+# Split after sentence-ending punctuation followed by whitespace, or right after CJK punctuation
+_sentence_break = re.compile(r'(?<=[.!?;])\s+|(?<=[。！？；])')
+_clause_break = re.compile(r'(?<=[,:，、：])\s*|\s+')
+# Zero-width joiner and variation selectors bind to their neighbours like combining marks
+_joining = frozenset('\u200d\ufe0e\ufe0f')
+
+
+class SynthesisError(Exception):
+    """A segment failed to synthesize"""
+    pass
+
+
+class SpeechBackend(ABC):
+    """Synthesizes one segment of text into WAV (RIFF) bytes"""
+
+    @abstractmethod
+    def synthesize(self, text: str, rate: int = 0) -> bytes:
+        """rate: extra prosody rate in percent on top of the configured speed, e.g. 20 speaks 20% faster"""
+        pass
+
+    def warm(self, count: int):
+        """Prepare `count` concurrent synthesizers ahead of a batch; optional"""
+        pass
+
+    def cache_key(self, text: str, rate: int = 0) -> str:
+        """Hash of everything that determines the audio; backends with more settings should include them"""
+        return hashlib.sha256(f"{type(self).__name__}\0{rate}\0{text}".encode('utf-8')).hexdigest()
+
+
+T = TypeVar("T")
+
+
+class SynthesizerPool(Generic[T]):
+    """
+    Keeps synthesizers (and their open connections) alive between requests.
+    acquire() lends out an idle one or creates a new one, so concurrent callers never share;
+    one that raised while borrowed is dropped instead of being returned to the pool.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._idle: "queue.SimpleQueue[T]" = queue.SimpleQueue()
+        self.created = 0
+
+    def warm(self, count: int):
+        """Create synthesizers up to `count` in parallel, so connection setup overlaps"""
+        missing = count - self._idle.qsize()
+        if missing <= 0:
+            return
+        with ThreadPoolExecutor(max_workers=missing) as executor:
+            for synthesizer in executor.map(lambda _: self._create(), range(missing)):
+                self._idle.put(synthesizer)
+
+    def _create(self) -> T:
+        self.created += 1
+        return self.factory()
+
+    @contextmanager
+    def acquire(self) -> Iterator[T]:
+        try:
+            synthesizer = self._idle.get_nowait()
+        except queue.Empty:
+            synthesizer = self._create()
+        yield synthesizer
+        self._idle.put(synthesizer)
+
+
+class WavFormat(NamedTuple):
+    nchannels: int
+    sampwidth: int
+    framerate: int
+
+
+def read_wav(data: bytes):
+    """Return (WavFormat, memoryview of the sample data) without copying the samples"""
+    view = memoryview(data)
+    if bytes(view[:4]) != b'RIFF' or bytes(view[8:12]) != b'WAVE':
+        raise SynthesisError("Audio is not a RIFF/WAVE buffer")
+    audio_format = None
+    position = 12
+    while position + 8 <= len(view):
+        chunk_id = bytes(view[position:position + 4])
+        size = int.from_bytes(view[position + 4:position + 8], 'little')
+        body = view[position + 8:position + 8 + size]
+        if chunk_id == b'data' and size in (0, 0xFFFFFFFF):
+            # Streamed WAV headers leave the data size unset: the samples run to the end of the buffer
+            body = view[position + 8:]
+        if chunk_id == b'fmt ':
+            _, nchannels, framerate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+            audio_format = WavFormat(nchannels, bits // 8, framerate)
+        elif chunk_id == b'data':
+            if audio_format is None:
+                raise SynthesisError("WAV data chunk appears before the fmt chunk")
+            return audio_format, body
+        position += 8 + size + (size & 1)
+    raise SynthesisError("WAV buffer has no data chunk")
+
+
+def _is_anchor(piece: str) -> bool:
+    # Roughly one piece in four, decided by its content alone
+    return zlib.crc32(piece.encode('utf-8')) % 4 == 0
+
+
+def _pack(pieces: Sequence[Tuple[str, str]], max_chars: int, anchored: bool = False) -> List[Tuple[str, str]]:
+    """
+    Greedily join (joiner, piece) pairs into strings no longer than max_chars; each piece is preceded by its own
+    joiner when it continues a string, and each result keeps the joiner of its first piece.
+    With anchored=True a segment also ends after every anchor piece, so an edit only moves the
+    boundaries up to the next anchor and the segments after it stay identical (and cached).
+    """
+    packed = []
+    current, current_joiner = "", ""
+    for joiner, piece in pieces:
+        if current and len(current) + len(joiner) + len(piece) > max_chars:
+            packed.append((current_joiner, current))
+            current, current_joiner = piece, joiner
+        elif current:
+            current = f"{current}{joiner}{piece}"
+        else:
+            current, current_joiner = piece, joiner
+        if anchored and _is_anchor(piece):
+            packed.append((current_joiner, current))
+            current = ""
+    if current:
+        packed.append((current_joiner, current))
+    return packed
+
+
+def _split_kept(pattern: re.Pattern, text: str) -> List[Tuple[str, str]]:
+    """
+    Split text at pattern into (joiner, piece) pairs: the joiner is " " where whitespace separated the piece from
+    the one before and "" where it did not (CJK punctuation), so packing puts back no space the text did not have
+    """
+    pieces, space, position = [], False, 0
+    bounds = [match.span() for match in pattern.finditer(text)] + [(len(text), len(text))]
+    for start, end in bounds:
+        piece = text[position:start]
+        stripped = piece.strip()
+        if stripped:
+            pieces.append((" " if space or piece[0].isspace() else "", stripped))
+            space = piece[-1].isspace()
+        elif piece:
+            space = True
+        # The separators themselves are whitespace or empty
+        space = space or start < end
+        position = end
+    return pieces
+
+
+def _hard_wrap(text: str, max_chars: int) -> List[str]:
+    """Cut a piece with no clause boundary into max_chars chunks, never between a character and its combining marks"""
+    chunks = []
+    while len(text) > max_chars:
+        cut = max_chars
+        while cut > 1 and (unicodedata.combining(text[cut]) or text[cut] in _joining or text[cut - 1] == '\u200d'):
+            cut -= 1
+        chunks.append(text[:cut])
+        text = text[cut:]
+    chunks.append(text)
+    return chunks
+
+
+def _split_long(text: str, max_chars: int) -> List[Tuple[str, str]]:
+    """Break a single over-long sentence at clause boundaries, then hard-wrap as a last resort"""
+    pieces = []
+    for joiner, clause in _pack(_split_kept(_clause_break, text), max_chars):
+        chunks = _hard_wrap(clause, max_chars)
+        pieces.append((joiner, chunks[0]))
+        pieces.extend(("", chunk) for chunk in chunks[1:])
+    return pieces
+
+
+def split_text(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> List[str]:
+    """
+    Split text into segments of at most max_chars characters.
+    Paragraphs are kept whole when they fit; otherwise they are split between sentences.
+    Short paragraphs are packed together so each request carries a useful amount of text;
+    boundaries are anchored on content so that editing one paragraph only changes nearby segments.
+    """
+    segments = []
+    for paragraph in _paragraph_break.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            segments.append(paragraph)
+            continue
+        sentences = []
+        for joiner, sentence in _split_kept(_sentence_break, paragraph):
+            if len(sentence) > max_chars:
+                pieces = _split_long(sentence, max_chars)
+                sentences.append((joiner, pieces[0][1]))
+                sentences.extend(pieces[1:])
+            else:
+                sentences.append((joiner, sentence))
+        segments.extend(segment for _, segment in _pack(sentences, max_chars, anchored=True))
+    return [segment for _, segment in _pack([("\n\n", segment) for segment in segments], max_chars, anchored=True)]
+
+
+def concat_wav(clips: Sequence[bytes], output_path: str, silence_ms: int = DEFAULT_SILENCE_MS):
+    """Write in-memory WAV clips with the same format to one file, inserting silence_ms of silence between them"""
+    decoded = [read_wav(clip) for clip in clips]
+    audio_format = decoded[0][0]
+    for position, (clip_format, _) in enumerate(decoded):
+        if clip_format != audio_format:
+            raise SynthesisError(f"Segment {position} has a different audio format: {clip_format}")
+    # 8-bit PCM is unsigned, so silence is 0x80 rather than 0
+    silence_byte = b'\x80' if audio_format.sampwidth == 1 else b'\x00'
+    frame_size = audio_format.nchannels * audio_format.sampwidth
+    silence = silence_byte * (audio_format.framerate * silence_ms // 1000 * frame_size)
+
+    with wave.open(str(output_path), 'wb') as output:
+        output.setnchannels(audio_format.nchannels)
+        output.setsampwidth(audio_format.sampwidth)
+        output.setframerate(audio_format.framerate)
+        # Declare the final length up front so the header never has to be patched
+        total = sum(len(samples) for _, samples in decoded) + len(silence) * (len(decoded) - 1)
+        output.setnframes(total // frame_size)
+        for position, (_, samples) in enumerate(decoded):
+            if position and silence:
+                output.writeframesraw(silence)
+            output.writeframesraw(samples)
+
+
+def _audio_ms(clip: bytes) -> int:
+    audio_format, samples = read_wav(clip)
+    return len(samples) * 1000 // (audio_format.framerate * audio_format.nchannels * audio_format.sampwidth)
+
+
+def _timed_synthesize(backend: SpeechBackend, text: str, rate: int, label: str, queued_at: float, metrics) -> bytes:
+    """Synthesize one text and record a `synthesis` event: queue wait, request latency, characters and audio size"""
+    started = time.perf_counter()
+    fields = {"status": "error"}
+    try:
+        clip = backend.synthesize(text, rate)
+        fields = {"status": "ok", "bytes": len(clip), "audio_ms": _audio_ms(clip)}
+        return clip
+    finally:
+        metrics.record("synthesis", label=label, chars=len(text), sped_up=bool(rate),
+                       queue_ms=round((started - queued_at) * 1000, 1),
+                       latency_ms=round((time.perf_counter() - started) * 1000, 1), **fields)
+
+
+def synthesize_many(backend: SpeechBackend, texts: Sequence[str], workers: int = 4,
+                    rates: Optional[Sequence[int]] = None, label: str = "segment", metrics=None) -> List[bytes]:
+    """
+    Synthesize texts concurrently (synthesis is network bound, so threads are enough)
+    and return their audio in the original order. rates[i] is the extra prosody rate for texts[i].
+    metrics: an srtkit RunMetrics that gets one `synthesis` event per request
+    """
+    if not texts:
+        return []
+    rates = rates or [0] * len(texts)
+    workers = max(1, min(workers, len(texts)))
+    backend.warm(workers)
+    clips: List[bytes] = [b''] * len(texts)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if metrics:
+            futures = {executor.submit(_timed_synthesize, backend, text, rate, label, time.perf_counter(),
+                                       metrics): position
+                       for position, (text, rate) in enumerate(zip(texts, rates))}
+        else:
+            futures = {executor.submit(backend.synthesize, text, rate): position
+                       for position, (text, rate) in enumerate(zip(texts, rates))}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                clips[futures[future]] = future.result()
+                print(f"Synthesized {label} {done}/{len(texts)}")
+        except BaseException:
+            # Fail fast: drop requests that have not started yet
+            for future in futures:
+                future.cancel()
+            raise
+    return clips
+
+
+def synthesize_segments(backend: SpeechBackend, segments: Sequence[str], output_path: str, workers: int = 4,
+                        silence_ms: int = DEFAULT_SILENCE_MS, metrics=None):
+    """Synthesize segments concurrently, keep the audio in memory and write output_path once, in order"""
+    if not segments:
+        raise SynthesisError("Nothing to synthesize")
+    concat_wav(synthesize_many(backend, segments, workers, metrics=metrics), output_path, silence_ms)
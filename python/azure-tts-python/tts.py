@@ -1,11 +1,30 @@
+import argparse
 import os
 import sys
 from datetime import datetime
+from xml.sax.saxutils import escape
 from pathlib import Path
-import azure.cognitiveservices.speech as speechsdk
 
+from audio_cache import AudioCache, CachedSpeechBackend, content_key
+from dubbing import DEFAULT_MAX_SPEEDUP, render_track
+from synthesis import (DEFAULT_MAX_CHARS, DEFAULT_SILENCE_MS, SpeechBackend, SynthesisError, SynthesizerPool,
+                       split_text, synthesize_segments)
 
-class AzureTTS:
+# srtkit is shared with the subtitle scripts at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from srtkit import RunMetrics, SubtitleError, load_srt, read_text  # noqa: E402
+
+
+def _speech_sdk():
+    """
+    Import the Azure Speech SDK when the first AzureTTS is created. It loads a large
+    native library, so printing usage or importing this module for its helpers stays fast.
+    """
+    import azure.cognitiveservices.speech as speechsdk
+    return speechsdk
+
+
+class AzureTTS(SpeechBackend):
     def __init__(self, character="en-US-BrianMultilingualNeural", tone=None, speed=None):
         """
         Initialize Azure TTS client using environment variables
@@ -17,13 +36,19 @@ class AzureTTS:
             print("Error: SPEECH_KEY and SPEECH_REGION environment variables must be set")
             sys.exit(1)
 
-        self.speech_config = speechsdk.SpeechConfig(
+        self.sdk = _speech_sdk()
+        self.speech_config = self.sdk.SpeechConfig(
             subscription=self.subscription_key,
             region=self.region
         )
 
         # other options: zh-CN-XiaochenMultilingualNeural, zh-CN-XiaoxiaoMultilingualNeural, en-US-AndrewMultilingualNeural
         self.speech_config.speech_synthesis_voice_name = character
+        # RIFF output so the in-memory audio of each request is a complete WAV buffer
+        self.output_format = self.sdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+        self.speech_config.set_speech_synthesis_output_format(self.output_format)
+        # Warm synthesizers reused across requests, each with its own pre-opened connection
+        self._pool = SynthesizerPool(self._create_synthesizer)
         self.voice_tone = tone
         self.voice_speed = speed
         self.voice_role = None
@@ -38,7 +63,8 @@ class AzureTTS:
         speak_attr_end = f""" </speak> """
         voice_attr_start = f""" <voice name="{self.speech_config.speech_synthesis_voice_name}"> """
         voice_attr_end = f""" </voice> """
-        content = f""" {text} """
+        # Cue text may contain &, < or >, which would otherwise make the SSML invalid
+        content = f""" {escape(text)} """
         express_as_start = ""
         express_as_end = ""
         lang_attr_start = ""
@@ -75,26 +101,60 @@ class AzureTTS:
                 f"{voice_attr_end}"
                 f"{speak_attr_end}")
 
+    def _create_synthesizer(self):
+        # audio_config=None keeps the audio in result.audio_data instead of playing or writing it
+        synthesizer = self.sdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+        # Open the connection now rather than on the first request; the synthesizer keeps it alive
+        connection = self.sdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        synthesizer.connection = connection
+        return synthesizer
+
+    def _speak(self, text, role=None, style=None, tone=None, speed=None):
+        with self._pool.acquire() as synthesizer:
+            if role or style or tone or speed:
+                ssml = self._create_ssml(text, role, style, tone, speed)
+                return synthesizer.speak_ssml_async(ssml).get()
+            return synthesizer.speak_text_async(text).get()
+
+    def warm(self, count):
+        self._pool.warm(count)
+
+    def _speed(self, rate):
+        if not rate:
+            return self.voice_speed
+        # Speed up relative to the configured speed; rates multiply, e.g. "10" then 15 -> 1.10 * 1.15 = "+27",
+        # rounded up so the cue still fits its slot
+        combined = (100 + int(self.voice_speed or 0)) * (100 + rate) - 100 * 100
+        return f"{-(-combined // 100):+d}"
+
+    def cache_key(self, text, rate=0):
+        """The generated SSML covers voice, tone, speed, role, style and text; the output format is added on top"""
+        ssml = self._create_ssml(text, self.voice_role, self.voice_style, self.voice_tone, self._speed(rate))
+        return content_key(str(self.output_format), ssml)
+
+    def synthesize(self, text, rate=0):
+        """Synthesize one segment with the configured voice settings into WAV bytes, raising SynthesisError on failure"""
+        speed = self._speed(rate)
+        result = self._speak(text, role=self.voice_role, style=self.voice_style,
+                             tone=self.voice_tone, speed=speed)
+        if result.reason != self.sdk.ResultReason.SynthesizingAudioCompleted:
+            details = result.cancellation_details
+            raise SynthesisError(f"Speech synthesis canceled: {details.reason} {details.error_details or ''}")
+        return result.audio_data
+
     def text_to_speech(self, text, output_path, role=None, style=None, tone=None, speed=None):
         """Convert text to speech and save to file"""
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=output_path)
-        synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=self.speech_config,
-            audio_config=audio_config
-        )
+        result = self._speak(text, role, style, tone, speed)
 
-        if role or style or tone or speed:
-            ssml = self._create_ssml(text, role, style, tone, speed)
-            result = synthesizer.speak_ssml_async(ssml).get()
-        else:
-            result = synthesizer.speak_text_async(text).get()
-
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        if result.reason == self.sdk.ResultReason.SynthesizingAudioCompleted:
+            with open(output_path, 'wb') as f:
+                f.write(result.audio_data)
             print(f"Audio saved to: {output_path}")
-        elif result.reason == speechsdk.ResultReason.Canceled:
+        elif result.reason == self.sdk.ResultReason.Canceled:
             cancellation_details = result.cancellation_details
             print(f"Speech synthesis canceled: {cancellation_details.reason}")
-            if cancellation_details.reason == speechsdk.CancellationReason.Error:
+            if cancellation_details.reason == self.sdk.CancellationReason.Error:
                 if cancellation_details.error_details:
                     print(
                         f"Error details: {cancellation_details.error_details}")
@@ -102,66 +162,123 @@ class AzureTTS:
                         "Did you set the speech resource key and region values correctly?")
             sys.exit(1)
 
-    def file_to_speech(self, input_file_path, output_file_path):
-        """Convert text file to speech file"""
+    def file_to_speech(self, input_file_path, output_file_path, workers=4, max_chars=DEFAULT_MAX_CHARS,
+                       silence_ms=DEFAULT_SILENCE_MS, backend=None, metrics=None):
+        """
+        Convert text file to speech file.
+        The text is split into segments of at most max_chars at paragraph/sentence boundaries,
+        synthesized by up to `workers` concurrent requests and stitched together with
+        silence_ms of silence between segments. Pass a SpeechBackend to synthesize without Azure,
+        and a RunMetrics to record every request.
+        """
         try:
             input_path = Path(input_file_path)
             if not input_path.is_file():
                 print(f"Error: Input file not found: {input_file_path}")
                 sys.exit(1)
 
-            with input_path.open('r', encoding='utf-8') as f:
-                text = f.read().strip()
+            # Transcripts are not always UTF-8; srtkit detects GBK, Big5, UTF-16 and Windows-1252
+            text = read_text(str(input_path)).strip()
 
             if not text:
                 print(f"Error: Input file is empty: {input_file_path}")
                 sys.exit(1)
 
-            self.text_to_speech(text, str(output_file_path), role=self.voice_role, style=self.voice_style,
-                                tone=self.voice_tone, speed=self.voice_speed)
+            segments = split_text(text, max_chars)
+            print(f"Synthesizing {len(segments)} segment(s) with {workers} worker(s)")
+            synthesize_segments(backend or self, segments, str(output_file_path), workers, silence_ms, metrics)
+            print(f"Audio saved to: {output_file_path}")
 
         except Exception as e:
             print(f"Error during file processing: {str(e)}")
             sys.exit(1)
 
+    def srt_to_speech(self, input_srt_path, output_file_path, workers=4, max_speedup=DEFAULT_MAX_SPEEDUP,
+                      backend=None, metrics=None):
+        """
+        Render an SRT (e.g. from merge_subtitle.py or translator.py) into one time-aligned WAV:
+        every cue is synthesized concurrently and placed at its start time, cues that overrun
+        the next cue are re-synthesized up to max_speedup percent faster.
+        """
+        try:
+            track = load_srt(input_srt_path)
+        except (OSError, SubtitleError) as e:
+            print(f"Error reading subtitle file: {str(e)}")
+            sys.exit(1)
+
+        try:
+            report = render_track(backend or self, track, str(output_file_path), workers=workers,
+                                  max_speedup=max_speedup, metrics=metrics)
+        except SynthesisError as e:
+            print(f"Error during synthesis: {str(e)}")
+            sys.exit(1)
+        print(report.summary())
+        print(f"Audio saved to: {output_file_path}")
+
+
+def voice_for(language):
+    """Map a language option (zh, us, gb) to (voice name, tone)"""
+    if language == "zh":
+        return "zh-CN-XiaoxiaoMultilingualNeural", None
+    if language == "us":
+        return "en-US-BrandonMultilingualNeural", None
+    if language == "gb":
+        return "en-US-BrandonMultilingualNeural", "en-GB"
+    raise ValueError(f"Unsupported language: {language}")
+
 
 def main():
     """Main function to handle command line arguments and execute conversion"""
-    if len(sys.argv) < 3:
-        print("请提供语言, 台词文件, 速度(可不填)")
-        print("语言可选值: zh, us, gb")
-        print("速度可选值: -100~100, 百分比")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="把台词文件转换成语音")
+    parser.add_argument("language", choices=["zh", "us", "gb"], help="语言可选值: zh, us, gb")
+    parser.add_argument("input_file", help="台词文件; .srt 字幕文件会按时间轴合成为一条配音音轨")
+    parser.add_argument("speed", nargs="?", type=int, default=None, help="速度可选值: -100~100, 百分比")
+    parser.add_argument("--workers", type=int, default=4, help="同时合成的段数 (默认: 4)")
+    parser.add_argument("--max-chars", type=int, default=DEFAULT_MAX_CHARS,
+                        help=f"每段最多字符数, 在段落/句子边界切分 (默认: {DEFAULT_MAX_CHARS})")
+    parser.add_argument("--silence-ms", type=int, default=DEFAULT_SILENCE_MS,
+                        help=f"段与段之间插入的静音毫秒数 (默认: {DEFAULT_SILENCE_MS})")
+    parser.add_argument("--cache-dir", default=None,
+                        help="语音缓存目录 (默认: ~/.cache/azure-tts-python/audio)")
+    parser.add_argument("--cache-size-mb", type=int, default=1024, help="语音缓存大小上限, 单位 MB (默认: 1024)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用语音缓存, 每段都重新合成")
+    parser.add_argument("--max-speedup", type=int, default=DEFAULT_MAX_SPEEDUP,
+                        help=f"字幕配音时, 超出时间的字幕最多加快的语速百分比 (默认: {DEFAULT_MAX_SPEEDUP})")
+    parser.add_argument("--metrics", default=None,
+                        help="把每次合成请求的耗时, 排队时间, 字符数, 音频大小和缓存命中写入这个 JSONL 文件")
+    args = parser.parse_args()
 
-    tone = None
     speed = None
-    character = None
-    if len(sys.argv) == 4:
-        if int(sys.argv[3]) < -100 or int(sys.argv[3]) > 100:
+    if args.speed is not None:
+        if args.speed < -100 or args.speed > 100:
             print("速度可选值: -100~100, 百分比")
             sys.exit(1)
-        speed = sys.argv[3]
+        speed = str(args.speed)
 
-    if sys.argv[1] not in ["zh", "us", "gb"]:
-        print("语言可选值: zh, us, gb")
-        sys.exit(1)
-
-    if sys.argv[1] == "zh":
-        character = "zh-CN-XiaoxiaoMultilingualNeural"
-    elif sys.argv[1] == "us":
-        character = "en-US-BrandonMultilingualNeural"
-    elif sys.argv[1] == "gb":
-        character = "en-US-BrandonMultilingualNeural"
-        tone = "en-GB"
+    character, tone = voice_for(args.language)
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     try:
         tts = AzureTTS(character, tone, speed)
 
-        input_file_path = sys.argv[2]
+        input_file_path = args.input_file
         output_file_path = f"{Path(input_file_path).stem}_{timestamp}.wav"
 
-        tts.file_to_speech(input_file_path, output_file_path)
+        # Unchanged segments of an edited script come from the cache, only the edited ones are synthesized
+        cache = None if args.no_cache else AudioCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+        metrics = RunMetrics(args.metrics)
+        backend = CachedSpeechBackend(tts, cache, metrics) if cache else tts
+
+        if Path(input_file_path).suffix.lower() == ".srt":
+            tts.srt_to_speech(input_file_path, output_file_path, workers=args.workers,
+                              max_speedup=args.max_speedup, backend=backend, metrics=metrics)
+        else:
+            tts.file_to_speech(input_file_path, output_file_path, workers=args.workers, max_chars=args.max_chars,
+                               silence_ms=args.silence_ms, backend=backend, metrics=metrics)
+        if cache:
+            print(cache.summary())
+        print(metrics.summary())
+        metrics.close()
 
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
@@ -0,0 +1,154 @@
+"""
+OpenAI Batch API 批量翻译: 把所有分段请求写进一个 JSONL 文件, 提交后轮询, 完成后下载结果
+批量接口价格是同步接口的一半, 适合一次翻译整季字幕, 代价是要等任务完成(最长 24 小时)
+"""
+import json
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+_endpoint = "/v1/chat/completions"
+# 这些状态下任务不会再有新结果, 已经完成的请求仍可从结果文件中取回; cancelling 之后还会变成 cancelled, 要继续等
+_finished = ("completed", "expired", "cancelled")
+_terminal_failures = ("failed",)
+
+
+class BatchError(Exception):
+    """批量任务失败"""
+    pass
+
+
+def build_batch_request(custom_id: str, body: dict) -> dict:
+    return {"custom_id": custom_id, "method": "POST", "url": _endpoint, "body": body}
+
+
+def write_batch_file(file_path: str, requests: Iterable[dict]):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+
+
+def parse_batch_results(lines: Iterable[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    解析结果文件, 返回 {custom_id: (返回内容, 错误信息)}, 两者有且只有一个不是 None
+    每行结构: {"custom_id": ..., "response": {"status_code": 200, "body": {...}}, "error": null}
+    """
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record["custom_id"]
+        response = record.get("response") or {}
+        if record.get("error"):
+            results[custom_id] = (None, json.dumps(record["error"], ensure_ascii=False))
+        elif response.get("status_code") != 200:
+            results[custom_id] = (None, f"HTTP {response.get('status_code')}: "
+                                        f"{json.dumps(response.get('body'), ensure_ascii=False)}")
+        else:
+            try:
+                results[custom_id] = (response["body"]["choices"][0]["message"]["content"], None)
+            except (KeyError, IndexError, TypeError) as e:
+                results[custom_id] = (None, f"无法解析返回体: {e}")
+    return results
+
+
+class BatchBackend(ABC):
+    """批量任务后端, 提交文件, 查询状态, 读取结果"""
+
+    @abstractmethod
+    def submit(self, batch_file: str) -> str:
+        """提交批量请求文件, 返回任务 id"""
+        pass
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """任务状态, 与 OpenAI 一致: validating, in_progress, finalizing, completed, expired, failed, cancelling, cancelled"""
+        pass
+
+    @abstractmethod
+    def result_lines(self, batch_id: str) -> List[str]:
+        """结果文件和错误文件的全部行"""
+        pass
+
+    def wait(self, batch_id: str, poll_interval: float = 30) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """
+        轮询直到任务结束; 过期 (expired) 和被取消 (cancelled) 的任务也会返回已经完成的那部分结果,
+        取消中 (cancelling) 的任务还会继续产出结果, 等它变成 cancelled 再取
+        """
+        last_status = None
+        while True:
+            status = self.status(batch_id)
+            if status in _finished:
+                if status != "completed":
+                    print(f"批量任务 {batch_id} 状态: {status}, 只取回已经完成的部分")
+                return parse_batch_results(self.result_lines(batch_id))
+            if status in _terminal_failures:
+                raise BatchError(f"批量任务 {batch_id} 状态: {status}")
+            if status != last_status:
+                print(f"批量任务 {batch_id} 状态: {status}")
+                last_status = status
+            time.sleep(poll_interval)
+
+
+class OpenAIBatchBackend(BatchBackend):
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, batch_file: str) -> str:
+        with open(batch_file, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=_endpoint, completion_window="24h")
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def result_lines(self, batch_id: str) -> List[str]:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(self.client.files.content(file_id).text.splitlines())
+        return lines
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    基于本地文件的替身, 不联网: 提交时把请求文件复制到 directory, 第一次查询状态时
+    用 responder(请求 body) 生成每个请求的返回内容, 写出与 OpenAI 格式相同的结果文件
+    """
+
+    def __init__(self, directory: str, responder: Callable[[dict], str]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.responder = responder
+
+    def submit(self, batch_file: str) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        shutil.copyfile(batch_file, self.directory / f"{batch_id}.input.jsonl")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        output = self.directory / f"{batch_id}.output.jsonl"
+        if not output.exists():
+            with open(self.directory / f"{batch_id}.input.jsonl", 'r', encoding='utf-8') as f_in, \
+                    open(output, 'w', encoding='utf-8') as f_out:
+                for line in f_in:
+                    request = json.loads(line)
+                    try:
+                        content = self.responder(request["body"])
+                        response = {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+                        error = None
+                    except Exception as e:
+                        response, error = None, {"message": str(e)}
+                    f_out.write(json.dumps({"custom_id": request["custom_id"], "response": response, "error": error},
+                                           ensure_ascii=False) + '\n')
+        return "completed"
+
+    def result_lines(self, batch_id: str) -> List[str]:
+        with open(self.directory / f"{batch_id}.output.jsonl", 'r', encoding='utf-8') as f:
+            return f.read().splitlines()
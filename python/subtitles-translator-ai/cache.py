@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+_default_cache_path = Path.home() / ".cache" / "subtitles-translator-ai" / "translations.sqlite3"
+_default_max_bytes = 256 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """合并多余空白, 使只差空格/换行的字幕共用一条缓存"""
+    return ' '.join(text.split())
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+class TranslationCache:
+    """
+    基于 SQLite 的单条字幕翻译缓存
+    key = sha256(模型名 + 系统提示词哈希 + 规范化后的原文 [+ 用到的术语译法]), 任一项变化都不会命中旧结果
+    超过 max_bytes 时按最近使用时间淘汰 (LRU)
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = _default_max_bytes):
+        path = path or str(_default_cache_path)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # 并发翻译时多个线程共用一个连接, 用锁串行化访问
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                translated TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON translations(last_used)")
+        self._conn.commit()
+        # 在内存中记录缓存总大小, 避免每次写入都全表 SUM
+        self._total_bytes = self._sum_size()
+
+    @staticmethod
+    def make_key(model: str, system_prompt_hash: str, text: str, context: str = "") -> str:
+        """context 是会影响译文的其他输入 (如这条字幕用到的术语译法), 为空时与只有原文的 key 相同"""
+        raw = f"{model}\0{system_prompt_hash}\0{normalize_text(text)}"
+        if context:
+            raw += f"\0{context}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # SQLite 单条语句的参数个数有限制, 分批查询
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, translated FROM translations WHERE key IN ({placeholders})", batch)
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE translations SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[str, str]]):
+        now = time.time()
+        rows = [(key, translated, len(translated.encode('utf-8')) + len(key), now)
+                for key, translated in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", rows)
+            self._total_bytes += sum(row[2] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _sum_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def _evict(self):
+        # INSERT OR REPLACE 覆盖旧记录时内存里的计数会偏大, 淘汰前重新统计一次
+        total = self._sum_size()
+        if total <= self.max_bytes:
+            self._total_bytes = total
+            return
+        # 从最久未使用的开始删除, 直到总大小回到上限的 90%, 避免每次写入都触发淘汰
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM translations ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM translations WHERE key = ?", doomed)
+        self._total_bytes = total - freed
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"翻译缓存: 命中 {self.hits}, 未命中 {self.misses}, 命中率 {rate:.1f}%"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,109 @@
+"""
+按 token 预算切分翻译分段, 不调用任何 API, 只做离线估算
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple
+
+# 中日韩字符大约一个字一个 token, 其余字符大约 4 个一个 token
+_cjk_pattern = re.compile('[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+# 以这些字符结尾的字幕视为句子结束, 优先在这里切分, 保证同一句话在同一个分段中
+_sentence_endings = ('.', '!', '?', '。', '！', '？', '…', '"', '”', '♪')
+# 用户消息中每条字幕的额外开销: 序号和 json 引号, 逗号
+_input_overhead = 4
+# 返回体中每条字幕的额外开销: {"index": "1", "original": "", "translated": ""}
+_output_overhead = 20
+
+
+def estimate_tokens(text: str) -> int:
+    cjk = len(_cjk_pattern.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def is_sentence_end(text: str) -> bool:
+    return text.rstrip().endswith(_sentence_endings)
+
+
+@dataclass
+class ChunkPlan:
+    # 每个分段在字幕轨道中的 [开始, 结束) 位置
+    ranges: List[Tuple[int, int]] = field(default_factory=list)
+    prompt_tokens: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    @property
+    def request_count(self) -> int:
+        return len(self.ranges)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens * self.request_count + self.input_tokens + self.output_tokens
+
+    def key(self) -> str:
+        """分段方式的标识, 用于确认断点日志与当前分段一致"""
+        return ','.join(str(hi - lo) for lo, hi in self.ranges)
+
+    def summary(self) -> str:
+        return (f"分段计划: {self.request_count} 次请求, 预计 token: "
+                f"系统提示词 {self.prompt_tokens} x {self.request_count}, "
+                f"字幕 {self.input_tokens}, 返回 {self.output_tokens}, 合计 {self.total_tokens}")
+
+
+def _cue_cost(text: str) -> Tuple[int, int]:
+    """单条字幕的 (输入 token, 输出 token), 输出包含原文和大致等长的译文"""
+    tokens = estimate_tokens(text)
+    return tokens + _input_overhead, tokens * 2 + _output_overhead
+
+
+def estimate_request_tokens(texts: Sequence[str], system_prompt: str) -> int:
+    """一次请求的预计 token 数: 系统提示词 + 字幕 + 预计返回, 与分段规划的估算方式一致"""
+    return estimate_tokens(system_prompt) + sum(sum(_cue_cost(text)) for text in texts)
+
+
+def plan_fixed_chunks(texts: Sequence[str], chunk_size: int, system_prompt: str) -> ChunkPlan:
+    """按固定条数切分, 与原来的切分方式一致, 只是附带 token 估算"""
+    plan = ChunkPlan(prompt_tokens=estimate_tokens(system_prompt))
+    for lo in range(0, len(texts), chunk_size):
+        plan.ranges.append((lo, min(lo + chunk_size, len(texts))))
+    for text in texts:
+        input_tokens, output_tokens = _cue_cost(text)
+        plan.input_tokens += input_tokens
+        plan.output_tokens += output_tokens
+    return plan
+
+
+def plan_token_chunks(texts: Sequence[str], token_budget: int, system_prompt: str,
+                      max_cues: int = 100) -> ChunkPlan:
+    """
+    贪心地把字幕装进分段, 每个分段的 系统提示词 + 字幕 + 预计返回 不超过 token_budget
+    装不下时, 如果当前分段后半部分有句子结尾, 就在最后一个句子结尾处切开, 剩下的字幕放进下一段
+    单条字幕就超预算时, 它自己单独成为一段
+    """
+    plan = ChunkPlan(prompt_tokens=estimate_tokens(system_prompt))
+    costs = [_cue_cost(text) for text in texts]
+    budget = token_budget - plan.prompt_tokens
+
+    lo = 0
+    while lo < len(texts):
+        used = 0
+        last_sentence_end = -1
+        hi = lo
+        while hi < len(texts) and hi - lo < max_cues:
+            cost = sum(costs[hi])
+            if used + cost > budget and hi > lo:
+                break
+            used += cost
+            if is_sentence_end(texts[hi]):
+                last_sentence_end = hi
+            hi += 1
+        # 分段被预算截断, 且后半段有句子结尾时, 退回到句子结尾处
+        if hi < len(texts) and last_sentence_end >= lo + (hi - lo) // 2:
+            hi = last_sentence_end + 1
+        plan.ranges.append((lo, hi))
+        lo = hi
+
+    for input_tokens, output_tokens in costs:
+        plan.input_tokens += input_tokens
+        plan.output_tokens += output_tokens
+    return plan
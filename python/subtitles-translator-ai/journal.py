@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+class JournalError(Exception):
+    """翻译日志与当前任务不匹配"""
+    pass
+
+
+def file_digest(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranslationJournal:
+    """
+    翻译断点日志, JSONL 格式, 每完成并校验一个分段就追加一行:
+        第一行: {"input": 输入文件哈希, "plan": 分段方式}
+        之后每行: {"chunk": 分段序号, "items": [[index, translated], ...]}
+    按分段序号记录, 所以并发翻译时分段乱序完成也没关系
+    """
+
+    def __init__(self, path: str, input_digest: str, plan_key: str):
+        self.path = Path(path)
+        self.header = {"input": input_digest, "plan": plan_key}
+        self._file = None
+
+    def load(self) -> Dict[int, List[Tuple[str, str]]]:
+        """读取已完成的分段, 日志不存在时返回空字典"""
+        if not self.path.exists():
+            return {}
+        done = {}
+        with self.path.open('r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        if not lines:
+            return {}
+        if json.loads(lines[0]) != self.header:
+            raise JournalError(f"翻译日志与当前输入文件或分段方式不一致: {self.path}")
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 进程在写最后一行时被中断, 这一行不完整, 该分段重新翻译即可
+                break
+            done[record["chunk"]] = [tuple(item) for item in record["items"]]
+        return done
+
+    def has_chunks(self) -> bool:
+        """日志里是否已有完成的分段, 不检查是否与当前任务一致"""
+        if not self.path.exists():
+            return False
+        with self.path.open('r', encoding='utf-8') as f:
+            f.readline()
+            return bool(f.readline().strip())
+
+    def open(self, done: Dict[int, List[Tuple[str, str]]]):
+        """
+        重写日志, 只保留 done 中已完成的分段, 然后等待追加新分段
+        重写而不是直接追加, 是为了去掉上次中断时可能残留的半行
+        """
+        self._file = self.path.open('w', encoding='utf-8')
+        self._write(self.header)
+        for chunk_number, items in sorted(done.items()):
+            self.record(chunk_number, items)
+
+    def record(self, chunk_number: int, items: List[Tuple[str, str]]):
+        self._write({"chunk": chunk_number, "items": [list(item) for item in items]})
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        # 每个分段都是花钱换来的, 立刻落盘
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,275 @@
+"""
+翻译记忆: 从以前合并好的双语字幕 (原文 srt + merge_subtitle.py 生成的译文 srt) 建立索引
+- 原文完全相同 (只差空白) 的字幕直接使用以前的译文, 不再请求模型
+- 字符 n-gram 倒排索引查找相似的字幕, 连同分段里出现的术语, 作为提示只放进这个分段的请求
+术语表来自 --glossary 文件 (每行 "术语<TAB>译法"), 以及记忆中多次原样保留在译文里的英文专有名词
+
+用法:
+  python memory.py build memory.json --pair ep01.en.srt ep01.zh.srt --pair ep02.en.srt ep02.zh.srt
+  python memory.py build memory.json --glossary terms.tsv
+  python memory.py lookup memory.json "Previously on Succession"
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from cache import normalize_text
+
+# srtkit 在项目根目录, 与根目录下的脚本共用
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from srtkit import SubtitleError, load_srt  # noqa: E402
+
+_gram_size = 3
+# 相似度 (Dice 系数) 低于这个值的字幕不作为参考
+_min_similarity = 0.6
+# 每个请求最多带几条术语和参考译文, 提示太长反而浪费 token
+_max_terms = 30
+_max_examples = 10
+# 出现在这么多条字幕中的 n-gram (如 " th") 区分度太低, 查找时跳过
+_common_gram_ratio = 0.05
+# 首字母大写的英文词组, 如 "Elon Musk", "New York"
+_proper_noun = re.compile(r"\b[A-Z][a-z]+(?:[ '-][A-Z][a-z]+)*\b")
+# 专有名词至少在这么多条字幕中原样保留在译文里, 才加入术语表
+_min_term_count = 2
+# 提示之后, 字幕 json 数组之前的标题行, 读取请求内容时从它后面开始解析字幕数组
+items_header = "字幕数组:\n"
+
+
+class Hints(NamedTuple):
+    """放进一个请求的提示: 术语 -> 译法, 相似原文 -> 以前的译文"""
+    terms: List[Tuple[str, str]]
+    examples: List[Tuple[str, str]]
+
+    def format(self) -> str:
+        lines = []
+        if self.terms:
+            lines.append("术语表, 原文中出现这些词时使用对应的译法:")
+            lines.extend(f"{term} => {translation}" for term, translation in self.terms)
+        if self.examples:
+            lines.append("以前翻译过的相似字幕, 用词保持一致:")
+            lines.extend(f"{source} => {target}" for source, target in self.examples)
+        return "\n".join(lines) + "\n\n" + items_header
+
+
+def _proper_nouns(text: str) -> Iterable[str]:
+    """首字母大写的词组, 句首的跳过, 那里的大写不能说明是专有名词 (如 "This", "We")"""
+    for match in _proper_noun.finditer(text):
+        before = text[:match.start()].rstrip(' "\'-')
+        if before and before[-1] not in '.!?':
+            yield match.group()
+
+
+def _grams(text: str) -> set:
+    padded = f" {text.lower()} "
+    return {padded[i:i + _gram_size] for i in range(len(padded) - _gram_size + 1)}
+
+
+class TranslationMemory:
+    """
+    exact: 规范化原文 -> {译文: 次数}, 同一原文有多种译法时取出现最多的
+    fuzzy: n-gram -> 原文编号列表, 按共同 n-gram 数取候选, 再算 Dice 系数
+    可以被多个翻译线程同时查询
+    """
+
+    def __init__(self):
+        self._targets: Dict[str, Counter] = {}
+        self._sources: List[str] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._glossary: Dict[str, str] = {}
+        self._term_pattern: Optional[re.Pattern] = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def __contains__(self, text: str) -> bool:
+        """是否有完全匹配, 不计入命中统计"""
+        return normalize_text(text) in self._targets
+
+    @classmethod
+    def load(cls, path: str) -> 'TranslationMemory':
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise SubtitleError(f"无法读取翻译记忆 {path}: {e}")
+        memory = cls()
+        for source, target, count in data.get("pairs", []):
+            memory.add_pair(source, target, count)
+        for term, translation in data.get("glossary", []):
+            memory.add_term(term, translation)
+        return memory
+
+    def save(self, path: str):
+        data = {
+            "pairs": [[source, target, count] for source in self._sources
+                      for target, count in self._targets[source].items()],
+            "glossary": sorted(self._glossary.items()),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+        os.replace(tmp_path, path)
+
+    def add_pair(self, source: str, target: str, count: int = 1):
+        source, target = normalize_text(source), target.strip()
+        if not source or not target:
+            return
+        if source not in self._targets:
+            self._targets[source] = Counter()
+            for gram in _grams(source):
+                self._postings[gram].append(len(self._sources))
+            self._sources.append(source)
+        self._targets[source][target] += count
+
+    def add_term(self, term: str, translation: str):
+        self._glossary[term.strip()] = translation.strip()
+        self._term_pattern = None
+
+    def add_srt_pair(self, source_srt: str, target_srt: str) -> int:
+        """按字幕序号配对原文和译文字幕文件, 返回加入的条数"""
+        targets = {item.index: item.content for item in load_srt(target_srt)}
+        added = 0
+        for item in load_srt(source_srt):
+            if item.index in targets:
+                self.add_pair(item.content, targets[item.index])
+                added += 1
+        return added
+
+    def extract_terms(self) -> int:
+        """把多次原样保留在译文里的英文专有名词加入术语表, 返回新增的条数"""
+        counts = Counter()
+        for source in self._sources:
+            target = self._targets[source].most_common(1)[0][0]
+            counts.update({term for term in _proper_nouns(source) if term in target})
+        added = 0
+        for term, count in counts.items():
+            if count >= _min_term_count and term not in self._glossary:
+                self._glossary[term] = term
+                added += 1
+        self._term_pattern = None
+        return added
+
+    def lookup(self, text: str) -> Optional[str]:
+        """原文完全相同的字幕以前的译文, 没有则返回 None"""
+        targets = self._targets.get(normalize_text(text))
+        with self._lock:
+            self.lookups += 1
+            if targets:
+                self.hits += 1
+        return targets.most_common(1)[0][0] if targets else None
+
+    def similar(self, text: str, limit: int = 1) -> List[Tuple[str, str, float]]:
+        """返回最相似的 limit 条 (原文, 译文, 相似度), 相似度低于阈值的不返回"""
+        text = normalize_text(text)
+        grams = _grams(text)
+        common = max(50, int(len(self._sources) * _common_gram_ratio))
+        shared = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings and len(postings) <= common:
+                shared.update(postings)
+        results = []
+        for position, _ in shared.most_common(limit * 10):
+            source = self._sources[position]
+            if source == text:
+                continue
+            other = _grams(source)
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score >= _min_similarity:
+                results.append((source, self._targets[source].most_common(1)[0][0], score))
+        results.sort(key=lambda result: -result[2])
+        return results[:limit]
+
+    def _terms(self) -> Optional[re.Pattern]:
+        if self._term_pattern is None and self._glossary:
+            # 长的术语排在前面, "New York City" 优先于 "New York"
+            terms = sorted(self._glossary, key=len, reverse=True)
+            self._term_pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, terms)) + r')\b')
+        return self._term_pattern
+
+    def hints_for(self, texts: Sequence[str]) -> Optional[Hints]:
+        """一个请求中的字幕用到的术语和相似字幕的译文, 都没有时返回 None"""
+        terms: Dict[str, str] = {}
+        pattern = self._terms()
+        if pattern:
+            for text in texts:
+                for term in pattern.findall(text):
+                    terms.setdefault(term, self._glossary[term])
+        examples: Dict[str, str] = {}
+        if self._sources:
+            for text in texts:
+                for source, target, _ in self.similar(text):
+                    examples.setdefault(source, target)
+                if len(examples) >= _max_examples:
+                    break
+        if not terms and not examples:
+            return None
+        return Hints(list(terms.items())[:_max_terms], list(examples.items())[:_max_examples])
+
+    def summary(self) -> str:
+        rate = self.hits / self.lookups * 100 if self.lookups else 0
+        return (f"翻译记忆: {len(self._sources)} 条原文, {len(self._glossary)} 条术语; "
+                f"查询 {self.lookups} 条, 完全匹配 {self.hits} 条 ({rate:.1f}%), 这些字幕没有请求模型")
+
+
+def read_glossary(path: str) -> Iterable[Tuple[str, str]]:
+    """每行 "术语<TAB>译法", # 开头的行是注释"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            term, _, translation = line.partition('\t')
+            if term.strip() and translation.strip():
+                yield term, translation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="建立和查询翻译记忆")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="把双语字幕和术语表加入翻译记忆文件, 文件已存在时追加")
+    build.add_argument("memory", help="翻译记忆文件 (.json)")
+    build.add_argument("--pair", nargs=2, action="append", default=[], metavar=("SOURCE_SRT", "TARGET_SRT"),
+                       help="原文字幕和 merge_subtitle.py 合并出的译文字幕, 可以重复")
+    build.add_argument("--glossary", action="append", default=[], help="术语表文件, 每行 术语<TAB>译法, 可以重复")
+    lookup = commands.add_parser("lookup", help="查询一条字幕的完全匹配, 相似字幕和术语")
+    lookup.add_argument("memory", help="翻译记忆文件 (.json)")
+    lookup.add_argument("text", help="字幕原文")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "lookup":
+            memory = TranslationMemory.load(args.memory)
+            print(f"完全匹配: {memory.lookup(args.text)}")
+            for source, target, score in memory.similar(args.text, limit=5):
+                print(f"相似 {score:.2f}: {source} => {target}")
+            hints = memory.hints_for([args.text])
+            for term, translation in hints.terms if hints else []:
+                print(f"术语: {term} => {translation}")
+            return
+
+        memory = TranslationMemory.load(args.memory) if Path(args.memory).exists() else TranslationMemory()
+        for source_srt, target_srt in args.pair:
+            print(f"{source_srt}: 加入 {memory.add_srt_pair(source_srt, target_srt)} 条")
+        for path in args.glossary:
+            for term, translation in read_glossary(path):
+                memory.add_term(term, translation)
+        print(f"提取专有名词 {memory.extract_terms()} 条")
+        memory.save(args.memory)
+        print(memory.summary().split(';')[0])
+    except (OSError, SubtitleError) as e:
+        print(f"错误: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
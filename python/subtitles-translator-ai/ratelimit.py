@@ -0,0 +1,159 @@
+"""
+客户端限流: 按服务商/模型共享的令牌桶, 同时限制每分钟请求数(RPM)和每分钟 token 数(TPM)
+收到 429 时降低速率和并发数并暂停 retry-after 秒, 之后逐步恢复;
+恢复到上次被限流的速率附近时放慢增速, 让吞吐量稳定在配额下方, 而不是在空闲和被限流之间来回摆动
+"""
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+
+class RateLimiter:
+    """
+    acquire(tokens) 阻塞到可以发出请求为止, 请求结束后必须调用 release(status, retry_after)
+    clock 和 sleep 可以替换成模拟时钟, 不用真的等待就能验证限流效果
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, headroom: float = 0.9, burst_seconds: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        # 每个桶: [每秒补充量, 容量, 当前余量], 按配额的 headroom 倍计算, 留出余量给估算误差
+        self._buckets = []
+        for per_minute in (requests_per_minute, tokens_per_minute):
+            if per_minute:
+                rate = per_minute * headroom / 60
+                capacity = max(1.0, rate * burst_seconds)
+                self._buckets.append([rate, capacity, capacity])
+            else:
+                self._buckets.append(None)
+        self._updated = clock()
+        # 速率倍数, 被限流时降到 0.7 倍, 成功后逐步恢复到 1
+        self.scale = 1.0
+        # 估计的安全速率倍数, 每次被限流都降到更低, 低于它时快速恢复, 超过之后缓慢试探
+        self._ceiling = 1.0
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._backoff = 1.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated)
+        self._updated = now
+        for bucket in self._buckets:
+            if bucket:
+                bucket[2] = min(bucket[1], bucket[2] + elapsed * bucket[0] * self.scale)
+
+    def _delay(self, now: float, costs) -> float:
+        """还要等多久才能发出请求; 单个请求超过桶容量时, 桶满即可发出, 余量会变成负数"""
+        delay = self._paused_until - now
+        for bucket, cost in zip(self._buckets, costs):
+            if bucket:
+                need = min(cost, bucket[1])
+                if bucket[2] < need:
+                    delay = max(delay, (need - bucket[2]) / (bucket[0] * self.scale))
+        # 浮点误差会留下极小的差额, 不足 1 毫秒的等待直接忽略, 否则可能无限地等待 1e-15 秒
+        return delay if delay > 1e-3 else 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """占用一个请求名额和 tokens 个 token, 返回等待的秒数"""
+        costs = (1, tokens)
+        waited = 0.0
+        while True:
+            with self._cond:
+                now = self.clock()
+                self._refill(now)
+                delay = self._delay(now, costs)
+                if not delay:
+                    if self.concurrency is not None and self._in_flight >= self.concurrency:
+                        # 并发已满, 等其他请求 release
+                        self._cond.wait()
+                        continue
+                    for bucket, cost in zip(self._buckets, costs):
+                        if bucket:
+                            bucket[2] -= cost
+                    self._in_flight += 1
+                    self.requests += 1
+                    self.waited += waited
+                    return waited
+            self.sleep(delay)
+            waited += delay
+
+    def release(self, status: str = "ok", retry_after: Optional[float] = None):
+        """status: "ok" 成功, "throttled" 被限流(429), "error" 其他错误(不影响速率)"""
+        with self._cond:
+            self._in_flight -= 1
+            if status == "throttled":
+                self._on_throttled(retry_after)
+            elif status == "ok":
+                self._on_success()
+            self._cond.notify_all()
+
+    def _on_throttled(self, retry_after: Optional[float]):
+        self.throttled += 1
+        self._successes = 0
+        self._ceiling = min(self._ceiling, self.scale) * 0.9
+        self.scale = max(0.05, self.scale * 0.7)
+        if self.concurrency is not None:
+            self.concurrency = max(1, self.concurrency // 2)
+        if retry_after is None:
+            retry_after = self._backoff
+            self._backoff = min(60.0, self._backoff * 2)
+        now = self.clock()
+        self._refill(now)
+        self._paused_until = max(self._paused_until, now + retry_after)
+        # 清空余量, 暂停结束后按降低的速率重新积累, 不会一下子涌出一批请求
+        for bucket in self._buckets:
+            if bucket:
+                bucket[2] = min(bucket[2], 0.0)
+
+    def _on_success(self):
+        self._successes += 1
+        self._backoff = 1.0
+        if self.scale < self._ceiling:
+            self.scale = min(self._ceiling, self.scale + 0.05)
+        else:
+            # 配额可能变大了, 缓慢试探, 每 100 次成功提高约 5%
+            self.scale = min(1.0, self.scale + 0.0005)
+            self._ceiling = self.scale
+        if self.concurrency is not None and self.concurrency < self.max_concurrency and self._successes % 4 == 0:
+            self.concurrency += 1
+
+    def summary(self) -> str:
+        return f"限流: 请求 {self.requests} 次, 被限流(429) {self.throttled} 次, 累计等待 {self.waited:.1f} 秒"
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key: str, **kwargs) -> RateLimiter:
+    """同一个服务商/模型(如 "openai/gpt-4")共用一个限流器, 参数以第一次创建时为准"""
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(**kwargs)
+        return _limiters[key]
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """从响应头读取需要等待的秒数, 支持 retry-after-ms 和以秒为单位的 retry-after"""
+    if not headers:
+        return None
+    for name, unit in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * unit)
+        except ValueError:
+            # HTTP 日期格式的 retry-after 不处理, 交给指数退避
+            pass
+    return None
@@ -0,0 +1,54 @@
+"""
+分段部分失败时的重试策略: 只重发缺失或索引不匹配的字幕, 拆成更小的子分段并带上相邻字幕作为上下文
+"""
+import random
+import threading
+from dataclasses import dataclass
+from typing import List, Sequence
+
+
+class RetryBudget:
+    """整个文件共用的重试次数上限, 避免模型状态很差时无休止地重试花钱, 并发翻译时多个线程共享"""
+
+    def __init__(self, total: int):
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+@dataclass
+class RetryPolicy:
+    # 每个分段最多重试几轮
+    max_attempts: int = 3
+    # 整个文件最多重试几轮, 所有分段共用
+    budget: int = 100
+    # 指数退避: 第 n 轮等待 base_delay * 2^(n-1) 秒, 不超过 max_delay, 再乘以 0.5~1 的随机系数
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    # 重试时每个子分段最多包含几条需要重翻的字幕
+    sub_chunk_size: int = 5
+    # 子分段前后各带几条相邻字幕, 让模型看到上下文
+    context: int = 2
+
+    def delay(self, attempt: int) -> float:
+        # 随机系数让并发的多个分段错开重试时间, 不会同时打到服务端
+        return min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1)
+
+    def sub_chunks(self, chunk: Sequence, missing: List[int]) -> List[list]:
+        """
+        把需要重翻的位置按连续段分组, 每组最多 sub_chunk_size 条, 再向前后扩展 context 条相邻字幕
+        相邻字幕的译文如果已经有了, 会保留第一次的结果
+        """
+        groups = []
+        for position in missing:
+            if groups and position == groups[-1][-1] + 1 and len(groups[-1]) < self.sub_chunk_size:
+                groups[-1].append(position)
+            else:
+                groups.append([position])
+        return [list(chunk[max(0, group[0] - self.context):group[-1] + 1 + self.context]) for group in groups]
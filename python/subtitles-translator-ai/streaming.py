@@ -0,0 +1,94 @@
+"""
+流式返回的增量解析: 模型一边生成, 一边从 json 数组中取出已经完整的对象
+"""
+import json
+from typing import List
+
+
+class StreamFormatError(ValueError):
+    """流式返回的内容不是预期的 json 数组"""
+    pass
+
+
+class JsonArrayStream:
+    """
+    逐段喂入文本, 每当数组中的一个顶层对象闭合就解析出来
+    数组前面的内容(如 ```json)会被跳过, 数组结束后的内容(如 ```)会被忽略
+    数组中出现对象以外的内容时抛出 StreamFormatError, 调用方可以马上取消请求;
+    同一段文本中出错位置之前已经完整的对象照常返回, 错误记在 error 中, 下一次 feed() 或 close() 时抛出
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self._current: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.error = None
+
+    def feed(self, text: str) -> List[dict]:
+        if self.error:
+            raise self.error
+        objects = []
+        try:
+            self._feed(text, objects)
+        except StreamFormatError as e:
+            if not objects:
+                raise
+            self.error = e
+        return objects
+
+    def _feed(self, text: str, objects: List[dict]):
+        for ch in text:
+            if self.finished:
+                break
+            if not self.started:
+                if ch == '[':
+                    self.started = True
+                elif ch == '{':
+                    raise StreamFormatError("返回内容不是 json 数组")
+                continue
+            if self._depth == 0:
+                if ch == '{':
+                    self._depth = 1
+                    self._current = [ch]
+                elif ch == ']':
+                    self.finished = True
+                elif ch not in ' \t\r\n,':
+                    raise StreamFormatError(f"json 数组中出现意外的字符: {ch!r}")
+                continue
+
+            self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append(self._parse_object(''.join(self._current)))
+
+    def close(self):
+        """数据全部喂完后调用, 数组没有正常结束时抛出 StreamFormatError"""
+        if self.error:
+            raise self.error
+        if not self.finished:
+            raise StreamFormatError("返回内容不完整, json 数组没有结束")
+
+    @staticmethod
+    def _parse_object(text: str) -> dict:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise StreamFormatError(f"无法解析的 json 对象: {text}\n{e}")
+        if not isinstance(obj, dict):
+            raise StreamFormatError(f"数组元素不是对象: {text}")
+        return obj
@@ -1,119 +1,167 @@
-import re
 import os
 import sys
+import time
+import argparse
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import List
-from openai import OpenAI
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import json
 from pathlib import Path
 from datetime import datetime
 from sys_prompt import system_prompt_gemini
+from cache import TranslationCache, prompt_hash
+from journal import JournalError, TranslationJournal, file_digest
+from memory import Hints, TranslationMemory
+from chunking import ChunkPlan, estimate_request_tokens, estimate_tokens, plan_fixed_chunks, plan_token_chunks
+from ratelimit import RateLimiter, get_limiter, parse_retry_after
+from retry import RetryBudget, RetryPolicy
+from streaming import JsonArrayStream, StreamFormatError
+from batch import BatchBackend, BatchError, OpenAIBatchBackend, build_batch_request, write_batch_file
+
+# srtkit 在项目根目录, 与根目录下的脚本共用
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from srtkit import (OrderedSrtWriter, RunMetrics, SubtitleError, SubtitleItem, SubtitleTrack, load_srt,  # noqa: E402
+                    parse_srt)
 
 _openai_model = "gpt-40"
 _gemini_model = "gemini-2.0-flash-exp"
 _chunk_size = 20
-
-class SubtitleError(Exception):
-    """字幕处理相关的异常"""
-    pass
-
+_max_workers = 4
+_token_budget = 3000
 
 class TranslationError(Exception):
     """翻译相关的异常"""
     pass
 
 
-@dataclass
-class SubtitleItem:
-    index: int
-    timestamp: str
-    content: str
+class ServiceError(TranslationError):
+    """
+    翻译服务的请求本身失败了 (不是返回体有问题)
+    transient 为 False 的 (密钥错误, 没有权限, 模型不存在, 请求格式错误) 重试也不会成功, 不参与重试
+    """
+
+    def __init__(self, message: str, transient: bool = True):
+        super().__init__(message)
+        self.transient = transient
+
+
+class RateLimitError(ServiceError):
+    """服务端返回 429, retry_after 为响应头建议等待的秒数"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# 4xx 中只有这几种过一会儿重试可能成功
+_transient_statuses = {408, 409, 425}
+
 
-    def __str__(self):
-        return f"{self.index}\n{self.timestamp}\n{self.content}\n"
+def _service_error(provider: str, e: Exception) -> ServiceError:
+    """把 SDK 的异常包装成 ServiceError, 429 单独区分出来交给限流器处理"""
+    message = f"{provider}翻译失败: {str(e)}"
+    # openai 的 APIStatusError 有 status_code, google.api_core 的 GoogleAPICallError 有 code (HTTP 状态码)
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    if status == 429:
+        response = getattr(e, "response", None)
+        return RateLimitError(message, parse_retry_after(getattr(response, "headers", None)))
+    # 没有状态码的 (连接断开, 超时) 和 5xx 可以重试, 其余 4xx 是请求或账号的问题
+    transient = not isinstance(status, int) or status >= 500 or status in _transient_statuses
+    return ServiceError(message, transient)
 
 
 def parse_file(file_path: str) -> List[SubtitleItem]:
-    if not Path(file_path).exists():
-        raise SubtitleError(f"找不到字幕文件: {file_path}")
+    return parse_srt(file_path)
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        raise SubtitleError(f"无法读取字幕文件，请确保文件编码是UTF-8: {file_path}")
-
-    # 2个或更多连续空行分割字幕块
-    subtitle_blocks = re.split(r'\n\n+', content.strip())
-    if not subtitle_blocks:
-        raise SubtitleError("字幕文件为空")
-
-    subtitle_items = []
-    for block in subtitle_blocks:
-        # 分割每个字幕块包含索引、时间戳和内容
-        lines = block.split('\n')
-        if len(lines) < 3:
-            raise SubtitleError(f"格式错误的字幕块: {block}")
-
-        index = int(re.sub(r'\D', '', lines[0].strip()))
-        timestamp = lines[1]
-        content = '\n'.join(lines[2:])
-        subtitle_items.append(SubtitleItem(index, timestamp, content))
-
-    return subtitle_items
-
-def _format_subtitle_items(items: List[SubtitleItem]) -> str:
+
+def _format_subtitle_items(items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
     formatted_items = [
         f"{item.index}. {item.content.strip()}"
         for item in items
     ]
-    return json.dumps(formatted_items, ensure_ascii=False)
+    # 翻译记忆的术语和相似字幕放在字幕数组前面, 只包含与这个分段有关的条目
+    prefix = hints.format() if hints else ""
+    return prefix + json.dumps(formatted_items, ensure_ascii=False)
 
 
 # ABC (Abstract Base Class), 是 Python 标准库中的 abc 模块提供的一个类
 class TranslationService(ABC):
+    # 模型名, 用作翻译缓存 key 的一部分
+    model_name = ""
+
     @abstractmethod
-    def translate_chunk(self, subtitle_items: List[SubtitleItem]) -> str:
-        """翻译一组字幕"""
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
+        """翻译一组字幕, hints 是翻译记忆给出的术语和相似字幕, 放进这次请求的提示词"""
         pass
 
+    def stream_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> Iterator[str]:
+        """
+        流式翻译一组字幕, 逐段产出模型生成的文本
+        调用方提前关闭生成器即取消请求; 不支持流式的服务一次性产出完整返回体
+        """
+        yield self.translate_chunk(subtitle_items, hints)
+
 
 class OpenAITranslationService(TranslationService):
     """OpenAI翻译服务实现"""
 
     def __init__(self, api_key: str, model: str = _openai_model):
+        # SDK 在创建服务时才导入, 只用 Gemini 或只打印用法时不用加载 openai
+        from openai import OpenAI
         self.client = OpenAI(api_key=api_key)
         self.model = model
+        self.model_name = f"openai/{model}"
 
-    def translate_chunk(self, subtitle_items: List[SubtitleItem]) -> str:
+    def build_request_body(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> dict:
+        """chat.completions 的请求参数, 同步请求和批量请求共用"""
         system_prompt = system_prompt_gemini
-        user_prompt = _format_subtitle_items(subtitle_items)
-
+        user_prompt = _format_subtitle_items(subtitle_items, hints)
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+        }
+
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
+            response = self.client.chat.completions.create(**self.build_request_body(subtitle_items, hints))
             return response.choices[0].message.content
         except Exception as e:
-            raise TranslationError(f"OpenAI翻译失败: {str(e)}")
+            raise _service_error("OpenAI", e)
+
+    def stream_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> Iterator[str]:
+        try:
+            stream = self.client.chat.completions.create(**self.build_request_body(subtitle_items, hints),
+                                                         stream=True)
+        except Exception as e:
+            raise _service_error("OpenAI", e)
+        try:
+            for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        except Exception as e:
+            raise _service_error("OpenAI", e)
+        finally:
+            # 提前退出时关闭连接, 服务端随之停止生成
+            stream.close()
 
 
 class GeminiTranslationService(TranslationService):
     """Google Gemini翻译服务实现"""
 
     def __init__(self, api_key: str, model: str = _gemini_model):
+        # google.generativeai 会加载 gRPC/protobuf, 导入很慢, 只在选中 Gemini 时导入
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model)
+        self.model_name = f"gemini/{model}"
 
-    def translate_chunk(self, subtitle_items: List[SubtitleItem]) -> str:
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
         system_prompt = system_prompt_gemini
-        user_prompt = _format_subtitle_items(subtitle_items)
+        user_prompt = _format_subtitle_items(subtitle_items, hints)
 
         try:
             response = self.model.generate_content(
@@ -124,7 +172,17 @@ class GeminiTranslationService(TranslationService):
             )
             return response.text
         except Exception as e:
-            raise TranslationError(f"Gemini翻译失败: {str(e)}")
+            raise _service_error("Gemini", e)
+
+    def stream_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> Iterator[str]:
+        system_prompt = system_prompt_gemini
+        user_prompt = _format_subtitle_items(subtitle_items, hints)
+
+        try:
+            for chunk in self.model.generate_content([system_prompt, user_prompt], stream=True):
+                yield chunk.text
+        except Exception as e:
+            raise _service_error("Gemini", e)
 
 
 def clean_response(response: str) -> str:
@@ -143,103 +201,747 @@ def clean_response(response: str) -> str:
 
     return cleaned
 
+
+def parse_translation_response(cleaned_response: str) -> List[Tuple[str, str]]:
+    """解析 clean_response 之后的返回体, 返回 [(index, translated), ...]"""
+    try:
+        # 每个 translated_item 应该有的结构:
+        # {
+        #     "index": "136",
+        #     "original": "ought to stand up as to what they represent, what they stand for.",
+        #     "translated": "应该坚持他们所代表的，他们所坚持的。"
+        #   }
+        translation_list = json.loads(cleaned_response)
+        # 提取出元组列表 [(index, translated), ...]
+        return [(t["index"], t["translated"]) for t in translation_list]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        raise TranslationError(
+            f"解析响应失败, 请检查响应格式是否正确:\n{cleaned_response}\n" + str(e))
+
+
+def match_translations(subtitle_items: Sequence[SubtitleItem], response: str) -> Dict[int, str]:
+    """
+    按序号逐条校验返回体, 返回 {字幕序号: 译文}, 只包含请求中存在的序号
+    缺失, 多余或序号对不上的条目直接忽略, 由调用方决定哪些字幕需要重翻
+    整个返回体无法解析时抛出 TranslationError
+    """
+    translation_list = parse_translation_response(clean_response(response))
+    wanted = {int(item.index) for item in subtitle_items}
+    matched = {}
+    for index, translation in translation_list:
+        try:
+            index = int(index)
+        except (TypeError, ValueError):
+            continue
+        if index in wanted and index not in matched and isinstance(translation, str):
+            matched[index] = translation
+    return matched
+
+
+class CachedTranslationService(TranslationService):
+    """
+    在真实翻译服务前加一层磁盘缓存, 以单条字幕为单位:
+    命中的字幕直接取缓存, 只把未命中的字幕发给模型, 最后按原顺序拼回同样格式的 json 返回体
+    模型返回中校验通过的字幕照常缓存, 有问题的字幕不出现在返回体中, 由 SubtitleTranslator 重翻
+    """
+
+    def __init__(self, service: TranslationService, cache: TranslationCache, system_prompt: str = system_prompt_gemini,
+                 metrics: Optional[RunMetrics] = None):
+        self.service = service
+        self.cache = cache
+        self.model_name = service.model_name
+        self.prompt_hash = prompt_hash(system_prompt)
+        self.metrics = metrics
+
+    def _record(self, total: int, missing: int):
+        if self.metrics:
+            self.metrics.record("translation_cache", hits=total - missing, misses=missing)
+
+    def _keys(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints]) -> List[str]:
+        """
+        每条字幕的缓存 key, 字幕里出现了术语表中的词时, 把这些术语的译法也算进 key:
+        术语表加了或改了译法之后, 以前没按术语翻的缓存不会再被用到; 相似字幕的参考译文只是建议, 不算进 key
+        """
+        terms = sorted(hints.terms) if hints else []
+        keys = []
+        for item in subtitle_items:
+            used = '\0'.join(f"{term}=>{translation}" for term, translation in terms if term in item.content)
+            keys.append(self.cache.make_key(self.model_name, self.prompt_hash, item.content, used))
+        return keys
+
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
+        keys = self._keys(subtitle_items, hints)
+        cached = self.cache.get_many(keys)
+        missing = [(item, key) for item, key in zip(subtitle_items, keys) if key not in cached]
+        self._record(len(keys), len(missing))
+
+        if missing:
+            response = self.service.translate_chunk([item for item, _ in missing], hints)
+            try:
+                matched = match_translations([item for item, _ in missing], response)
+            except TranslationError:
+                # 返回体无法解析就原样交给调用方, 由 SubtitleTranslator 统一处理
+                return response
+            fresh = {key: matched[int(item.index)] for item, key in missing if int(item.index) in matched}
+            self.cache.put_many(fresh.items())
+            cached.update(fresh)
+
+        return json.dumps([
+            {"index": str(item.index), "original": item.content, "translated": cached[key]}
+            for item, key in zip(subtitle_items, keys) if key in cached
+        ], ensure_ascii=False)
+
+    def stream_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> Iterator[str]:
+        """命中缓存的字幕先一次性产出, 再转发模型对未命中字幕的流式返回, 顺序与原字幕不一定一致"""
+        keys = self._keys(subtitle_items, hints)
+        cached = self.cache.get_many(keys)
+        missing = {int(item.index): (item, key) for item, key in zip(subtitle_items, keys) if key not in cached}
+        self._record(len(keys), len(missing))
+
+        yield '[' + ''.join(
+            json.dumps({"index": str(item.index), "original": item.content, "translated": cached[key]},
+                       ensure_ascii=False) + ','
+            for item, key in zip(subtitle_items, keys) if key in cached)
+        if missing:
+            parser = JsonArrayStream()
+            fresh = {}
+            pieces = self.service.stream_chunk([item for item, _ in missing.values()], hints)
+            try:
+                for piece in pieces:
+                    for obj in parser.feed(piece):
+                        # 格式有问题的对象不缓存, 照样转发, 由 SubtitleTranslator 校验后取消请求
+                        index, translation = obj.get("index"), obj.get("translated")
+                        if str(index).isdigit() and int(index) in missing and isinstance(translation, str):
+                            fresh[missing[int(index)][1]] = translation
+                        yield json.dumps(obj, ensure_ascii=False) + ','
+                    if parser.error:
+                        raise parser.error
+                    if parser.finished:
+                        break
+                parser.close()
+            finally:
+                pieces.close()
+                # 提前取消时, 已经收到的译文也缓存下来
+                self.cache.put_many(fresh.items())
+        yield ']'
+
+
+class RateLimitedTranslationService(TranslationService):
+    """
+    每次请求前向同一服务商/模型共享的限流器申请名额, 预计 token 数与分段规划的估算方式一致
+    遇到 429 时通知限流器降速, 等待后重发, 连续 max_throttle_retries 次仍被限流才报错
+    传入 metrics 时每次发给服务商的请求记录一个 request 事件: 限流等待, 请求耗时, 预计的输入/输出 token 数
+    """
+
+    def __init__(self, service: TranslationService, limiter: RateLimiter, system_prompt: str = system_prompt_gemini,
+                 max_throttle_retries: int = 5, metrics: Optional[RunMetrics] = None):
+        self.service = service
+        self.limiter = limiter
+        self.model_name = service.model_name
+        self.system_prompt = system_prompt
+        self.max_throttle_retries = max_throttle_retries
+        self.metrics = metrics
+
+    def _tokens(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints]) -> int:
+        tokens = estimate_request_tokens([item.content for item in subtitle_items], self.system_prompt)
+        return tokens + (estimate_tokens(hints.format()) if hints else 0)
+
+    def _record(self, subtitle_items: List[SubtitleItem], tokens: int, waited: float, started: float, status: str,
+                response_tokens: int = 0, **fields):
+        if self.metrics:
+            self.metrics.record("request", model=self.model_name, status=status, cues=len(subtitle_items),
+                                wait_ms=round(waited * 1000, 1),
+                                latency_ms=round((time.perf_counter() - started) * 1000, 1),
+                                prompt_tokens=tokens, response_tokens=response_tokens, **fields)
+
+    def translate_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> str:
+        tokens = self._tokens(subtitle_items, hints)
+        for _ in range(self.max_throttle_retries + 1):
+            waited = self.limiter.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                response = self.service.translate_chunk(subtitle_items, hints)
+            except RateLimitError as e:
+                self.limiter.release("throttled", e.retry_after)
+                self._record(subtitle_items, tokens, waited, started, "throttled")
+                error = e
+                continue
+            except BaseException:
+                self.limiter.release("error")
+                self._record(subtitle_items, tokens, waited, started, "error")
+                raise
+            self.limiter.release()
+            self._record(subtitle_items, tokens, waited, started, "ok", estimate_tokens(response or ""))
+            return response
+        raise error
+
+    def stream_chunk(self, subtitle_items: List[SubtitleItem], hints: Optional[Hints] = None) -> Iterator[str]:
+        tokens = self._tokens(subtitle_items, hints)
+        for _ in range(self.max_throttle_retries + 1):
+            waited = self.limiter.acquire(tokens)
+            started = time.perf_counter()
+            pieces = self.service.stream_chunk(subtitle_items, hints)
+            # 429 在第一段到达之前就会返回, 这时可以安全地重发
+            try:
+                first = next(pieces, None)
+            except RateLimitError as e:
+                self.limiter.release("throttled", e.retry_after)
+                self._record(subtitle_items, tokens, waited, started, "throttled")
+                error = e
+                continue
+            except BaseException:
+                self.limiter.release("error")
+                self._record(subtitle_items, tokens, waited, started, "error")
+                raise
+            first_piece_ms = round((time.perf_counter() - started) * 1000, 1)
+            status = "error"
+            response_tokens = 0
+            try:
+                if first is not None:
+                    response_tokens += estimate_tokens(first)
+                    yield first
+                    for piece in pieces:
+                        response_tokens += estimate_tokens(piece)
+                        yield piece
+                status = "ok"
+            finally:
+                pieces.close()
+                self.limiter.release(status)
+                # 提前取消 (格式错误) 也算 error, 已收到的部分照样计入输出 token
+                self._record(subtitle_items, tokens, waited, started, status, response_tokens,
+                             first_piece_ms=first_piece_ms)
+            return
+        raise error
+
+
 class SubtitleTranslator:
     """字幕翻译器，支持多种翻译服务"""
 
-    def __init__(self, translation_service: TranslationService, chunk_size: int = 10):
+    def __init__(self, translation_service: TranslationService, chunk_size: int = 10, max_workers: int = 1,
+                 token_budget: Optional[int] = None, retry_policy: Optional[RetryPolicy] = None,
+                 stream: bool = False, metrics: Optional[RunMetrics] = None,
+                 memory: Optional[TranslationMemory] = None):
         self.translation_service = translation_service
+        # 翻译记忆: 完全匹配的字幕不再请求, 其余字幕的请求带上相关术语和相似字幕的译文
+        self.memory = memory
+        # 每个分段记录一个 chunk 事件: 排队时间, 总耗时, 重试轮数
+        self.metrics = metrics
+        # 流式接收返回体, 逐条校验并立即写出, 格式出错时提前取消请求
+        self.stream = stream
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._retry_budget = RetryBudget(self.retry_policy.budget)
         self.chunk_size = chunk_size
+        # 设置后按 token 预算切分分段, chunk_size 不再起作用
+        self.token_budget = token_budget
+        # 同时在途的翻译请求数, 1 表示逐段顺序翻译
+        self.max_workers = max(1, max_workers)
 
     def translate_subtitle_entry_chunk(self, subtitle_items: List[SubtitleItem]) -> str:
-        return self.translation_service.translate_chunk(subtitle_items)
+        return self.translation_service.translate_chunk(subtitle_items, self._hints(subtitle_items))
+
+    def _hints(self, subtitle_items: List[SubtitleItem]) -> Optional[Hints]:
+        return self.memory.hints_for([item.content for item in subtitle_items]) if self.memory else None
+
+    def _unmatched(self, chunk: List[SubtitleItem]) -> List[SubtitleItem]:
+        """翻译记忆中没有完全匹配的字幕, 也就是真正需要请求模型的字幕"""
+        if not self.memory:
+            return chunk
+        return [item for item in chunk if item.content not in self.memory]
+
+    def translate_chunk_items(self, chunk: Sequence[SubtitleItem], first_response: Optional[str] = None,
+                              on_cue: Optional[Callable[[int, str], None]] = None,
+                              queued_at: Optional[float] = None) -> List[SubtitleItem]:
+        """
+        翻译一个分段, 按序号逐条校验返回体, 返回翻译后的字幕块
+        校验通过的字幕保留, 只把缺失或序号对不上的字幕拆成小分段(带相邻字幕作上下文)重发,
+        每轮之间指数退避, 超过 retry_policy 的重试次数或整个文件的重试预算后报错
+        first_response 不为空时, 第一轮直接使用它(如批量任务的结果), 不再发请求
+        on_cue(分段内位置, 译文) 在每条字幕通过校验时立即调用
+        queued_at: 分段提交给线程池的时间 (time.perf_counter), 用于记录排队时间
+        """
+        started = time.perf_counter()
+        # chunk 可能是 SubtitleTrack 的视图, 真正发请求时才生成 SubtitleItem
+        chunk = list(chunk)
+        positions = {int(item.index): position for position, item in enumerate(chunk)}
+        translations: Dict[int, str] = {}
+
+        def accept(index: int, translation: str):
+            # 作为上下文重发的相邻字幕, 保留第一次的译文
+            if index not in translations:
+                translations[index] = translation
+                if on_cue:
+                    on_cue(positions[index], translation)
+
+        # 原文与翻译记忆完全相同的字幕直接采用以前的译文, 其余的才发请求
+        requests = [chunk]
+        if self.memory:
+            for item in chunk:
+                translation = self.memory.lookup(item.content)
+                if translation is not None:
+                    accept(int(item.index), translation)
+            unmatched = [item for item in chunk if int(item.index) not in translations]
+            requests = [unmatched] if unmatched else []
+            if self.metrics:
+                self.metrics.record("memory", cues=len(chunk), hits=len(chunk) - len(unmatched))
+
+        # 方法1. 手动处理, 可直接保存 translate_subtitle_entry_chunk 的返回体到文件
+        # 方法2. 自动处理, 即下面的代码
+        attempt = 0
+        last_problem = ""
+        while True:
+            for request_items in requests:
+                try:
+                    matched = self._request_translations(request_items, accept, first_response)
+                    if matched < len(request_items):
+                        last_problem = "返回体缺少字幕或索引不匹配"
+                except ServiceError as e:
+                    if not e.transient:
+                        # 重试也不会成功, 不消耗重试次数和整个文件的重试预算, 直接失败
+                        self._record_chunk(chunk, attempt, started, queued_at, "error")
+                        raise
+                    last_problem = str(e)
+                except TranslationError as e:
+                    last_problem = str(e)
+                first_response = None
+
+            missing = [position for position, item in enumerate(chunk) if int(item.index) not in translations]
+            if not missing:
+                break
+            attempt += 1
+            if attempt > self.retry_policy.max_attempts:
+                reason = f"重试 {attempt - 1} 次后"
+            elif not self._retry_budget.take():
+                reason = "整个文件的重试预算已用完, "
+            else:
+                reason = None
+            if reason:
+                self._record_chunk(chunk, attempt - 1, started, queued_at, "error")
+                raise TranslationError(
+                    f"翻译错误: {reason}仍有 {len(missing)} 条字幕没有译文, "
+                    f"序号: {[chunk[position].index for position in missing]}\n{last_problem}")
+            print(f"{len(missing)} 条字幕缺失或索引不匹配, 第 {attempt} 次重试 (序号 {chunk[missing[0]].index} 起)")
+            time.sleep(self.retry_policy.delay(attempt))
+            requests = self.retry_policy.sub_chunks(chunk, missing)
+
+        self._record_chunk(chunk, attempt, started, queued_at, "ok")
+        return [SubtitleItem(index=item.index, start=item.start, end=item.end, content=translations[int(item.index)])
+                for item in chunk]
+
+    def _record_chunk(self, chunk: List[SubtitleItem], retries: int, started: float, queued_at: Optional[float],
+                      status: str):
+        if not self.metrics:
+            return
+        fields = {"first_cue_id": chunk[0].index, "cues": len(chunk), "retries": retries, "status": status,
+                  "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        if queued_at is not None:
+            fields["queue_ms"] = round((started - queued_at) * 1000, 1)
+        self.metrics.record("chunk", **fields)
+
+    def _request_translations(self, request_items: List[SubtitleItem], accept: Callable[[int, str], None],
+                              response: Optional[str] = None) -> int:
+        """
+        发出一次请求(或使用已有的 response), 每条校验通过的字幕调用 accept, 返回通过的条数
+        流式模式下边接收边校验, 出现格式错误或未请求的序号时立即取消请求, 已通过的字幕仍然有效
+        """
+        if response is None and self.stream:
+            return self._stream_translations(request_items, accept)
+        if response is None:
+            response = self.translate_subtitle_entry_chunk(request_items)
+        try:
+            matched = match_translations(request_items, response)
+        except TranslationError as e:
+            raise TranslationError(f"{e}\n返回体:\n{clean_response(response)}")
+        for index, translation in matched.items():
+            accept(index, translation)
+        if len(matched) < len(request_items):
+            raise TranslationError(f"返回体缺少字幕或索引不匹配, 返回体:\n{clean_response(response)}")
+        return len(matched)
+
+    def _stream_translations(self, request_items: List[SubtitleItem], accept: Callable[[int, str], None]) -> int:
+        wanted = {int(item.index) for item in request_items}
+        seen = set()
+        parser = JsonArrayStream()
+        pieces = self.translation_service.stream_chunk(request_items, self._hints(request_items))
+        try:
+            for piece in pieces:
+                for obj in parser.feed(piece):
+                    try:
+                        index, translation = int(obj["index"]), obj["translated"]
+                    except (KeyError, TypeError, ValueError):
+                        raise StreamFormatError(f"缺少 index 或 translated: {obj}")
+                    if index not in wanted or index in seen or not isinstance(translation, str):
+                        raise StreamFormatError(f"返回了未请求或重复的序号: {obj}")
+                    seen.add(index)
+                    accept(index, translation)
+                if parser.error:
+                    raise parser.error
+                if parser.finished:
+                    break
+            parser.close()
+        except StreamFormatError as e:
+            raise TranslationError(f"流式返回格式错误, 已取消请求: {e}")
+        finally:
+            pieces.close()
+        if len(seen) < len(request_items):
+            raise TranslationError(f"返回体缺少字幕, 期望 {len(request_items)} 条, 实际 {len(seen)} 条")
+        return len(seen)
+
+    def _translate_chunks_sequentially(self, pending: List[Tuple[int, SubtitleTrack]],
+                                       on_done: Callable[[int, List[SubtitleItem]], None],
+                                       on_cue: Optional[Callable[[int, int, str], None]] = None):
+        for chunk_number, chunk in pending:
+            on_done(chunk_number, self.translate_chunk_items(chunk, on_cue=_bind_chunk(on_cue, chunk_number)))
+
+    def _translate_chunks_concurrently(self, pending: List[Tuple[int, SubtitleTrack]],
+                                       on_done: Callable[[int, List[SubtitleItem]], None],
+                                       on_cue: Optional[Callable[[int, int, str], None]] = None):
+        """
+        用线程池同时翻译多个分段, 翻译请求主要是在等网络 IO, 所以线程就够了
+        on_done 只在当前线程调用, 由它按分段序号保存结果, 保证输出顺序与原字幕一致
+        on_cue(分段序号, 分段内位置, 译文) 在工作线程中调用, 需要自己保证线程安全
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.translate_chunk_items, chunk, on_cue=_bind_chunk(on_cue, chunk_number),
+                                       queued_at=time.perf_counter()): chunk_number
+                       for chunk_number, chunk in pending}
+            handled = set()
+            try:
+                # as_completed: 哪个分段先完成就先处理哪个
+                for future in as_completed(futures):
+                    handled.add(future)
+                    on_done(futures[future], future.result())
+            except BaseException:
+                # 任意一个分段失败(或 Ctrl+C), 取消所有还没开始的分段;
+                # 已经发出的请求无法中断, 等它们返回, 成功的分段照样交给 on_done (写入翻译日志), 再把异常抛出去
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if future in handled or future.cancelled():
+                        continue
+                    try:
+                        items = future.result()
+                    except Exception:
+                        continue
+                    on_done(futures[future], items)
+                raise
+
+    def _translate_chunks_in_batch(self, pending: List[Tuple[int, SubtitleTrack]],
+                                   on_done: Callable[[int, List[SubtitleItem]], None],
+                                   backend: BatchBackend, batch_file: str, batch_id: Optional[str],
+                                   poll_interval: float):
+        """
+        所有分段写进一个批量请求文件一次提交, 任务完成后逐个分段用同步模式相同的逻辑校验
+        校验通过的分段照常写入翻译日志, 失败的分段汇总报错, 之后可用 --resume 补翻
+        """
+        if not hasattr(self.translation_service, "build_request_body"):
+            raise TranslationError("批量翻译只支持 openai 服务")
+        # 完全被翻译记忆覆盖的分段不进批量请求, 其余分段只请求记忆中没有的字幕
+        requests = [(n, self._unmatched(list(chunk))) for n, chunk in pending]
+        if not batch_id:
+            write_batch_file(batch_file, (
+                build_batch_request(f"chunk-{n}", self.translation_service.build_request_body(
+                    items, self._hints(items)))
+                for n, items in requests if items))
+            batch_id = backend.submit(batch_file)
+            print(f"已提交批量任务: {batch_id}, 中断后可用 --batch-id {batch_id} 继续等待结果")
 
-    def translate_file(self, input_file: str, output_file: str):
-        """拆解字幕文件, 分段转给 AI 分段翻译, 再合并成新的字幕文件"""
-        subtitle_items = parse_file(input_file)  #  subtitle_items: List[SubtitleItem]
+        try:
+            results = backend.wait(batch_id, poll_interval)
+        except BatchError as e:
+            raise TranslationError(str(e))
+
+        failures = []
+        for (chunk_number, chunk), (_, items) in zip(pending, requests):
+            if not items:
+                on_done(chunk_number, self.translate_chunk_items(chunk))
+                continue
+            response, error = results.get(f"chunk-{chunk_number}", (None, "结果文件中没有该分段"))
+            try:
+                if error:
+                    raise TranslationError(error)
+                # 个别字幕有问题时, 用同步请求补翻这几条
+                on_done(chunk_number, self.translate_chunk_items(chunk, first_response=response))
+            except TranslationError as e:
+                failures.append(f"分段 {chunk_number}: {e}")
+        if failures:
+            raise TranslationError(f"批量任务中 {len(failures)}/{len(pending)} 个分段失败:\n" + "\n".join(failures))
+
+    def plan(self, track: SubtitleTrack) -> ChunkPlan:
+        """计算分段方式和预计 token 用量, 不发出任何请求"""
+        texts = list(track.texts())
+        if self.token_budget:
+            return plan_token_chunks(texts, self.token_budget, system_prompt_gemini)
+        return plan_fixed_chunks(texts, self.chunk_size, system_prompt_gemini)
+
+    def translate_track(self, track: SubtitleTrack) -> SubtitleTrack:
+        """在内存中翻译整条字幕轨道, 不写翻译日志和输出文件, 供 pipeline.py 这类调用方组合使用"""
+        self._retry_budget = RetryBudget(self.retry_policy.budget)
+        plan = self.plan(track)
+        chunks = [track[lo:hi] for lo, hi in plan.ranges]
+        results: Dict[int, List[SubtitleItem]] = {}
+
+        def on_done(chunk_number: int, items: List[SubtitleItem]):
+            results[chunk_number] = items
+
+        pending = list(enumerate(chunks))
+        if self.max_workers > 1 and len(pending) > 1:
+            self._translate_chunks_concurrently(pending, on_done)
+        else:
+            self._translate_chunks_sequentially(pending, on_done)
+        return track.with_texts(item.content for n in range(len(chunks)) for item in results[n])
+
+    def translate_file(self, input_file: str, output_file: str, resume: bool = False,
+                       batch_backend: Optional[BatchBackend] = None, batch_id: Optional[str] = None,
+                       batch_poll_interval: float = 30):
+        """
+        拆解字幕文件, 分段转给 AI 分段翻译, 再合并成新的字幕文件
+        每完成一个分段都会写入输出文件旁边的翻译日志, resume=True 时跳过日志里已完成的分段
+        译文先按字幕顺序写入 <输出文件>.part, 前面的字幕都齐了就立即写出, 全部完成后改名为输出文件
+        传入 batch_backend 时, 剩余分段通过批量接口一次提交, batch_id 用于继续等待已提交的任务
+        """
+        track = load_srt(input_file)
+        self._retry_budget = RetryBudget(self.retry_policy.budget)
+
+        # 切片是共用底层数组的视图, 不复制数据
+        plan = self.plan(track)
+        print(plan.summary())
+        chunks = [track[lo:hi] for lo, hi in plan.ranges]
+
+        journal = TranslationJournal(journal_path(input_file, output_file), file_digest(input_file), plan.key())
+        results: Dict[int, List[SubtitleItem]] = {}
+        if resume:
+            try:
+                for chunk_number, translations in journal.load().items():
+                    results[chunk_number] = _rebuild_chunk(chunks[chunk_number], translations)
+            except (JournalError, IndexError, KeyError, ValueError) as e:
+                raise TranslationError(f"无法从翻译日志恢复, 请去掉 --resume 重新翻译: {e}")
+            if results:
+                print(f"从翻译日志恢复了 {len(results)}/{len(chunks)} 个分段")
+        elif journal.has_chunks():
+            # 不带 --resume 重新运行会重写日志, 已完成的分段就没了
+            raise TranslationError(f"已有上次未完成的翻译日志 {journal.path}, 加上 --resume 继续翻译, "
+                                   f"或删除这个文件后重新翻译")
+        journal.open({n: [(item.index, item.content) for item in items] for n, items in results.items()})
+        writer = OrderedSrtWriter(output_file, track)
+        for chunk_number, items in results.items():
+            writer.put_many(plan.ranges[chunk_number][0], (item.content for item in items))
+
+        def on_done(chunk_number: int, items: List[SubtitleItem]):
+            results[chunk_number] = items
+            writer.put_many(plan.ranges[chunk_number][0], (item.content for item in items))
+            journal.record(chunk_number, [(item.index, item.content) for item in items])
+            print(f"翻译进度: {len(results)}/{len(chunks)}")
+
+        def on_cue(chunk_number: int, position: int, translation: str):
+            writer.put(plan.ranges[chunk_number][0] + position, translation)
+
+        pending = [(n, chunk) for n, chunk in enumerate(chunks) if n not in results]
+        try:
+            if batch_backend and pending:
+                self._translate_chunks_in_batch(pending, on_done, batch_backend,
+                                                batch_path(input_file, output_file), batch_id, batch_poll_interval)
+            elif self.max_workers > 1 and len(pending) > 1:
+                self._translate_chunks_concurrently(pending, on_done, on_cue)
+            else:
+                self._translate_chunks_sequentially(pending, on_done, on_cue)
+        except BaseException:
+            writer.close()
+            journal.close()
+            print(f"翻译中断, 已完成的分段保存在 {journal.path}, 加上 --resume 重新运行可继续翻译")
+            raise
+
+        writer.commit()
+        journal.remove()
+        if batch_backend:
+            Path(batch_path(input_file, output_file)).unlink(missing_ok=True)
+        print(f"\n翻译完成! 已保存到: {output_file}")
 
-        # + self.chunk_size - 1 向上取整, 用于下面显示进度, 如: 1/7, 2/7, 3/7...
-        # ‘//’ 在 Python 中是整除运算符（floor division operator）, 它会执行除法并向下取整（floor）到最接近的整数
-        # 例如：print(25/10)    # 输出: 2.5, 向上取整(2.5) = 3
-        # 等价于: (25 + 10 - 1) // 10 = 34 // 10 = 3, 这也是为什么总要 -1
-        total_chunks = (len(subtitle_items) + self.chunk_size - 1) // self.chunk_size
-        translated_items = []
 
-        for i in range(0, len(subtitle_items), self.chunk_size):
-            chunk = subtitle_items[i:i + self.chunk_size]
-            current_chunk = i // self.chunk_size + 1
-            print(f"翻译进度: {current_chunk}/{total_chunks}")
+def journal_path(input_file: str, output_file: str) -> str:
+    """翻译日志放在输出文件旁边, 文件名只取决于输入文件, 这样带时间戳的输出文件名变了也能续上"""
+    return str(Path(output_file).parent / f"{Path(input_file).stem}.journal.jsonl")
 
-            # 方法1. 手动处理, 可将下面的代码注释掉, 直接保存返回体到文件
-            # translated_items.append(
-            #     self.translate_subtitle_entry_chunk(chunk))
 
-            # -----------方法2. 自动处理, 若使用方法1, 则需要将下面代码注释掉-----------
-            cleaned_response = clean_response(self.translate_subtitle_entry_chunk(chunk))
+def batch_path(input_file: str, output_file: str) -> str:
+    return str(Path(output_file).parent / f"{Path(input_file).stem}.batch.jsonl")
 
-            try:
-                # 每个 translated_item 应该有的结构:
-                # {
-                #     "index": "136",
-                #     "original": "ought to stand up as to what they represent, what they stand for.",
-                #     "translated": "应该坚持他们所代表的，他们所坚持的。"
-                #   }
-                translation_list = json.loads(cleaned_response)
-                # 提取出元组列表 [(index, translated), ...]
-                translation_list = [(t["index"], t["translated"]) for t in translation_list]
-            except (json.JSONDecodeError, KeyError) as e:
-                raise TranslationError(
-                    f"解析响应失败, 请检查响应格式是否正确:\n{cleaned_response}\n" + str(e))
-
-            # 重新构建字幕块
-            for original_entry, (index, translation) in zip(chunk, translation_list):
-                if int(index) != int(original_entry.index):
-                    raise TranslationError(
-                        f"翻译错误: 索引不匹配, 期望: {original_entry.index}, 实际: {index}, 返回体:\n{cleaned_response}")
-                item = SubtitleItem(
-                    index=index,
-                    timestamp=original_entry.timestamp,
-                    content=translation
-                )
-                translated_items.append(item)
-        # -------------------方法2. 自动处理, 若使用方法1, 则需要将上面代码注释掉-------------------
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for entry in translated_items:
-                f.write(str(entry) + '\n')
-        print(f"\n翻译完成! 已保存到: {output_file}")
 
+def _bind_chunk(on_cue: Optional[Callable[[int, int, str], None]],
+                chunk_number: int) -> Optional[Callable[[int, str], None]]:
+    return partial(on_cue, chunk_number) if on_cue else None
 
-def main():
-    if len(sys.argv) < 3:
-        print("用法: <input.srt> <service>")
-        print("service 可选值: openai 或 gemini")
-        sys.exit(1)
 
-    input_file = sys.argv[1]
-    service_type = sys.argv[2].lower()
+def _rebuild_chunk(chunk: SubtitleTrack, translations: List[Tuple[str, str]]) -> List[SubtitleItem]:
+    """用日志中的 [(index, translated), ...] 和原分段的时间戳重建翻译后的字幕块"""
+    if len(chunk) != len(translations):
+        raise ValueError(f"分段长度不一致: {len(chunk)} != {len(translations)}")
+    return [SubtitleItem(index=original.index, start=original.start, end=original.end, content=translation)
+            for original, (index, translation) in zip(chunk, translations)]
+
+
+# 翻译服务注册表: 名称 -> 创建函数, 创建函数里才导入对应的 SDK, 只有选中的服务会被加载
+_providers: Dict[str, Callable[[], TranslationService]] = {}
+
+
+def register_provider(name: str):
+    """注册翻译服务的创建函数, 用作装饰器"""
+    def register(factory: Callable[[], TranslationService]) -> Callable[[], TranslationService]:
+        _providers[name] = factory
+        return factory
+
+    return register
+
+
+@register_provider("openai")
+def _create_openai() -> TranslationService:
+    return OpenAITranslationService(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model="gpt-4"
+    )
+
+
+@register_provider("gemini")
+def _create_gemini() -> TranslationService:
+    return GeminiTranslationService(
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        model="gemini-pro"
+    )
+
+
+def provider_names() -> List[str]:
+    return list(_providers)
+
+
+def create_service(service_type: str) -> TranslationService:
+    """按名称创建翻译服务, API key 从环境变量读取"""
+    factory = _providers.get(service_type)
+    if factory is None:
+        raise TranslationError(f"不支持的翻译服务: {service_type}, 可选: {', '.join(_providers)}")
+    return factory()
+
+
+def wrap_service(service: TranslationService, workers: int, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 cache: Optional[TranslationCache] = None,
+                 metrics: Optional[RunMetrics] = None) -> Tuple[TranslationService, RateLimiter]:
+    """加上限流和缓存层; 限流放在缓存里面, 命中缓存的字幕不占用配额"""
+    limiter = get_limiter(service.model_name, requests_per_minute=rpm, tokens_per_minute=tpm, max_concurrency=workers)
+    service = RateLimitedTranslationService(service, limiter, metrics=metrics)
+    if cache:
+        service = CachedTranslationService(service, cache, metrics=metrics)
+    return service, limiter
+
+
+def service_name(value: str) -> str:
+    """命令行里的翻译服务名, 不区分大小写, 用作 argparse 的 type"""
+    name = value.lower()
+    if name not in _providers:
+        raise argparse.ArgumentTypeError(f"不支持的翻译服务: {value}, 可选: {', '.join(_providers)}")
+    return name
+
+
+def add_translation_arguments(parser: argparse.ArgumentParser):
+    """
+    translator.py 和 pipeline.py 的 translate 阶段共用的参数, 两边的默认值和分段方式保持一致;
+    --workers, --no-cache, --metrics 同时用于别的阶段, 由各自的命令行定义
+    """
+    parser.add_argument("--cache", default=None,
+                        help="翻译缓存文件路径 (默认: ~/.cache/subtitles-translator-ai/translations.sqlite3)")
+    parser.add_argument("--cache-size-mb", type=int, default=256, help="翻译缓存大小上限, 单位 MB (默认: 256)")
+    parser.add_argument("--token-budget", type=int, default=_token_budget,
+                        help=f"每次请求的预计 token 上限, 按预算切分分段; 设为 0 则按 --chunk-size 条数切分 (默认: {_token_budget})")
+    parser.add_argument("--chunk-size", type=int, default=_chunk_size,
+                        help=f"--token-budget 为 0 时, 每个分段的字幕条数 (默认: {_chunk_size})")
+    parser.add_argument("--max-retries", type=int, default=3,
+                        help="每个分段中缺失或索引不匹配的字幕最多重试几轮 (默认: 3)")
+    parser.add_argument("--retry-budget", type=int, default=100, help="整个文件所有分段合计最多重试几轮 (默认: 100)")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式接收返回体, 每条字幕校验通过后立即写出, 返回格式出错时提前取消请求")
+    parser.add_argument("--rpm", type=float, default=None, help="服务商每分钟请求数配额, 不设置则不限制请求速率")
+    parser.add_argument("--tpm", type=float, default=None, help="服务商每分钟 token 数配额, 不设置则不限制 token 速率")
+    parser.add_argument("--memory", default=None,
+                        help="翻译记忆文件 (memory.py build 生成), 完全匹配的字幕直接使用以前的译文, 其余请求带上术语和相似字幕")
+
+
+def open_cache(args) -> Optional[TranslationCache]:
+    """按 add_translation_arguments 的参数打开翻译缓存, --no-cache 时返回 None"""
+    if args.no_cache:
+        return None
+    return TranslationCache(args.cache, max_bytes=args.cache_size_mb * 1024 * 1024)
+
+
+def translator_from_args(args, translation_service: Optional[TranslationService], metrics: Optional[RunMetrics] = None,
+                         memory: Optional[TranslationMemory] = None) -> SubtitleTranslator:
+    """按 add_translation_arguments 的参数和 --workers 创建 SubtitleTranslator"""
+    return SubtitleTranslator(
+        translation_service=translation_service,
+        chunk_size=args.chunk_size,
+        max_workers=args.workers,
+        token_budget=args.token_budget,
+        retry_policy=RetryPolicy(max_attempts=args.max_retries, budget=args.retry_budget),
+        stream=args.stream,
+        metrics=metrics,
+        memory=memory
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="使用 AI 翻译 srt 字幕文件")
+    parser.add_argument("input_file", help="输入的 srt 字幕文件")
+    parser.add_argument("service", type=service_name, help=f"翻译服务, 可选值: {' 或 '.join(provider_names())}")
+    parser.add_argument("--workers", type=int, default=_max_workers,
+                        help=f"同时翻译的分段数, 1 表示顺序翻译 (默认: {_max_workers})")
+    parser.add_argument("--no-cache", action="store_true", help="不使用翻译缓存")
+    parser.add_argument("--resume", action="store_true", help="从上次中断的翻译日志继续, 只翻译未完成的分段")
+    parser.add_argument("--dry-run", action="store_true", help="只打印分段计划和预计 token 用量, 不调用翻译服务")
+    add_translation_arguments(parser)
+    parser.add_argument("--metrics", default=None,
+                        help="把每次请求和每个分段的耗时, 排队时间, 重试, token 数, 缓存命中写入这个 JSONL 文件")
+    parser.add_argument("--batch", action="store_true", help="使用 OpenAI Batch API 批量翻译, 价格减半, 需要等待任务完成")
+    parser.add_argument("--batch-id", default=None, help="继续等待已提交的批量任务, 需与提交时的参数一致")
+    parser.add_argument("--batch-poll-interval", type=float, default=30, help="批量任务状态轮询间隔, 单位秒 (默认: 30)")
+    args = parser.parse_args()
+
+    input_file = args.input_file
+    service_type = args.service
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     output_file = f"{Path(input_file).stem}_{timestamp}.srt"
 
+    cache = None
+    memory = None
+    metrics = RunMetrics(args.metrics)
     try:
-        if service_type == "openai":
-            translation_service = OpenAITranslationService(
-                api_key=os.getenv("OPENAI_API_KEY"),
-                model="gpt-4"
-            )
-        elif service_type == "gemini":
-            translation_service = GeminiTranslationService(
-                api_key=os.getenv("GOOGLE_API_KEY"),
-                model="gemini-pro"
-            )
-        else:
-            print(f"不支持的翻译服务: {service_type}")
-            sys.exit(1)
-
-        translator = SubtitleTranslator(
-            translation_service=translation_service,
-            chunk_size=20
-        )
-        translator.translate_file(input_file, output_file)
+        if args.dry_run:
+            print(translator_from_args(args, None).plan(load_srt(input_file)).summary())
+            return
+
+        translation_service = create_service(service_type)
+        if args.memory:
+            memory = TranslationMemory.load(args.memory)
+
+        batch_backend = None
+        if args.batch or args.batch_id:
+            if service_type != "openai":
+                print("批量翻译只支持 openai 服务")
+                sys.exit(1)
+            batch_backend = OpenAIBatchBackend(translation_service.client)
+
+        # 批量请求直接发给 OpenAI, 不经过限流和缓存层
+        limiter = None
+        if not batch_backend:
+            cache = open_cache(args)
+            translation_service, limiter = wrap_service(translation_service, args.workers, args.rpm, args.tpm, cache,
+                                                        metrics)
+
+        translator = translator_from_args(args, translation_service, metrics, memory)
+        translator.translate_file(input_file, output_file, resume=args.resume, batch_backend=batch_backend,
+                                  batch_id=args.batch_id, batch_poll_interval=args.batch_poll_interval)
+        if limiter:
+            print(limiter.summary())
+        if cache:
+            print(cache.summary())
+        if memory:
+            print(memory.summary())
+        print(metrics.summary())
 
     except SubtitleError as e:
         print(f"字幕处理错误: {str(e)}")
@@ -250,6 +952,10 @@ def main():
     except Exception as e:
         print(f"未知错误: {str(e)}")
         sys.exit(1)
+    finally:
+        metrics.close()
+        if cache:
+            cache.close()
 
 
 if __name__ == "__main__":
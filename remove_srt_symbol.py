@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
+from pathlib import Path
+
+from srtkit import SubtitleError, TextRules, add_batch_arguments, expand_inputs, is_pattern, output_jobs, run_batch
 
 """
 知识点1:
@@ -19,29 +23,48 @@ else:
     print("name is empty")
 """
 
-# 检查命令行参数
-if len(sys.argv) != 3:
-    print("去掉字幕结尾中的标点符号, 使用方法: remove_srt_symbol.py 输入文件.srt 输出文件.srt")
-    sys.exit(1)
-
-# 获取输入输出文件名
-input_file = sys.argv[1]
-output_file = sys.argv[2]
-
-# 读取文件内容
-with open(input_file, 'r', encoding='utf-8') as f:
-    lines = f.readlines()
-
-# 处理每一行
-processed_lines = []
-for line in lines:
-    content = line.strip()
-    # 如果行不为空且末尾是标点符号，则去掉标点
-    if content and content[-1] in '.。!！?？,，':
-        content = content[:-1]
-    # 保持原有的换行格式
-    processed_lines.append(content + '\n')
-
-# 写入处理后的内容到新文件
-with open(output_file, 'w', encoding='utf-8') as f:
-    f.writelines(processed_lines)
+
+# 等同于 normalize.py --rule strip-punctuation
+_rules = TextRules(["strip-punctuation"])
+
+
+def remove_symbols(input_file: str, output_file: str) -> int:
+    """处理一个文件, 每行字幕内容如果末尾是标点符号则去掉, 序号和时间戳不变, 返回字幕条数"""
+    return _rules.apply_file(input_file, output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="去掉字幕结尾中的标点符号")
+    parser.add_argument("inputs", nargs="+",
+                        help="输入文件.srt 输出文件.srt; 批量模式下是输入文件, 目录或通配符")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    # 批量模式: 按原文件名写到输出目录
+    if args.output_dir:
+        try:
+            report = run_batch(output_jobs(expand_inputs(args.inputs), args.output_dir), remove_symbols,
+                               "remove_srt_symbol", args.workers, args.force)
+        except SubtitleError as e:
+            print(f"字幕处理错误: {str(e)}")
+            sys.exit(1)
+        print(report.summary())
+        sys.exit(1 if report.failed else 0)
+
+    # 检查命令行参数
+    if len(args.inputs) != 2 or is_pattern(args.inputs[0]) or Path(args.inputs[0]).is_dir():
+        print("去掉字幕结尾中的标点符号, 使用方法: remove_srt_symbol.py 输入文件.srt 输出文件.srt, "
+              "处理多个文件时用 --output-dir 指定输出目录")
+        sys.exit(1)
+
+    # 获取输入输出文件名
+    input_file, output_file = args.inputs
+    try:
+        remove_symbols(input_file, output_file)
+    except SubtitleError as e:
+        print(f"字幕处理错误: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+调整字幕时间轴: 平移, 帧率转换/缩放, 按锚点校准, 合并零碎的短字幕, 拆分过长的字幕
+
+按 锚点校准 -> 缩放 -> 平移 -> 合并 -> 拆分 的顺序执行, 锚点和缩放都按原字幕的时间给出
+
+用法:
+  retime.py ep01.srt --shift -2.5
+  retime.py ep01.srt --shift -1500ms
+  retime.py ep01.srt --shift -00:00:01,500
+  retime.py ep01.srt out.srt --fps 25:23.976
+  retime.py ep01.srt --anchor 00:00:05,000=00:00:06,200 --anchor 00:40:00,000=00:41:30,000
+  retime.py ep01.srt --merge-shorter-than 800 --max-cps 20 --split-longer-than 7000
+  retime.py season1/ --shift 1.2 --output-dir out/
+"""
+import argparse
+import re
+import sys
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+from srtkit import (SubtitleError, SubtitleTrack, add_batch_arguments, expand_inputs, fps_factor, is_pattern,
+                    load_srt, merge_cues, output_jobs, resync, run_batch, save_srt, scale, shift, split_cues)
+
+# 00:01:02,345 / 1:02.5 / 62.345 (秒) / 1500ms, 可以带正负号
+_time_value = re.compile(r'([+-]?)(?:(?:(\d+):)?(\d+):)?(\d+(?:[.,]\d+)?)(ms)?')
+
+
+class TimingPlan(NamedTuple):
+    anchors: Tuple[Tuple[int, int], ...] = ()
+    factor: float = 1.0
+    offset: int = 0
+    min_duration: int = 0
+    max_cps: Optional[float] = None
+    max_gap: int = 500
+    merge_max_chars: int = 84
+    split_duration: Optional[int] = None
+    split_chars: Optional[int] = None
+
+    def merges(self) -> bool:
+        return bool(self.min_duration or self.max_cps)
+
+
+def parse_time_value(text: str) -> int:
+    """时间转为毫秒, 接受 srt 时间格式, 分:秒, 秒数 (可带小数) 和 500ms 这种毫秒数"""
+    match = _time_value.fullmatch(text.strip())
+    if not match:
+        raise SubtitleError(f"无法识别的时间: {text}")
+    sign, hours, minutes, seconds, ms_unit = match.groups()
+    seconds = float(seconds.replace(',', '.'))
+    value = round(seconds) if ms_unit else round(((int(hours or 0) * 60 + int(minutes or 0)) * 60 + seconds) * 1000)
+    return -value if sign == '-' else value
+
+
+def _parse_anchor(text: str) -> Tuple[int, int]:
+    old, separator, new = text.partition('=')
+    if not separator:
+        raise SubtitleError(f"锚点的格式是 原时间=正确时间: {text}")
+    return parse_time_value(old), parse_time_value(new)
+
+
+def _parse_fps(text: str) -> float:
+    source, separator, target = text.partition(':')
+    try:
+        return fps_factor(float(source), float(target))
+    except ValueError:
+        raise SubtitleError(f"帧率的格式是 原帧率:目标帧率, 如 25:23.976: {text}")
+
+
+def add_timing_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--shift", default=None, help="整体平移, 如 -2.5 (秒), -1500ms, -00:00:01,200, 可以是负数")
+    parser.add_argument("--fps", default=None, help="帧率转换 原帧率:目标帧率, 如 25:23.976")
+    parser.add_argument("--scale", type=float, default=None, help="时间按这个比例缩放, 与 --fps 相乘")
+    parser.add_argument("--anchor", action="append", default=[],
+                        help="校准锚点 原时间=正确时间, 可以重复; 锚点之间按两端的偏差线性插值")
+    parser.add_argument("--merge-shorter-than", type=int, default=0, help="短于这么多毫秒的字幕与相邻的合并")
+    parser.add_argument("--max-cps", type=float, default=None, help="每秒字数超过这个值的字幕与相邻的合并")
+    parser.add_argument("--max-gap", type=int, default=500, help="合并时两条字幕最多间隔多少毫秒 (默认: 500)")
+    parser.add_argument("--merge-max-chars", type=int, default=84, help="合并后最多多少个字符 (默认: 84)")
+    parser.add_argument("--split-longer-than", type=int, default=None, help="长于这么多毫秒的字幕拆成几条")
+    parser.add_argument("--split-max-chars", type=int, default=None, help="多于这么多字符的字幕拆成几条")
+
+
+def join_negative_values(argv: List[str]) -> List[str]:
+    """
+    argparse 只把 -2.5 这种像负数的参数当成值, -1500ms, -00:00:01,500 会被当成选项而报 "expected one argument",
+    这里把 --shift 后面以 - 开头的值并成 --shift=-1500ms
+    """
+    result = []
+    arguments = iter(argv)
+    for argument in arguments:
+        if argument == "--shift":
+            value = next(arguments, None)
+            if value is not None and value.startswith('-') and _time_value.fullmatch(value):
+                result.append(f"{argument}={value}")
+                continue
+            result.append(argument)
+            if value is not None:
+                result.append(value)
+            continue
+        result.append(argument)
+    return result
+
+
+def timing_plan(args) -> TimingPlan:
+    factor = (_parse_fps(args.fps) if args.fps else 1.0) * (args.scale or 1.0)
+    if factor <= 0:
+        raise SubtitleError(f"缩放比例必须大于 0: {factor}")
+    return TimingPlan(tuple(_parse_anchor(anchor) for anchor in args.anchor), factor,
+                      parse_time_value(args.shift) if args.shift else 0, args.merge_shorter_than, args.max_cps,
+                      args.max_gap, args.merge_max_chars, args.split_longer_than, args.split_max_chars)
+
+
+def apply_plan(track: SubtitleTrack, plan: TimingPlan) -> SubtitleTrack:
+    if plan.anchors:
+        track = resync(track, plan.anchors)
+    if plan.factor != 1.0:
+        track = scale(track, plan.factor)
+    if plan.offset:
+        track = shift(track, plan.offset)
+    if plan.merges():
+        track = merge_cues(track, plan.min_duration, plan.max_cps, plan.max_gap, plan.merge_max_chars)
+    if plan.split_duration or plan.split_chars:
+        track = split_cues(track, plan.split_duration, plan.split_chars)
+    return track
+
+
+def retime_file(input_file: str, output_file: str, plan: TimingPlan) -> int:
+    """处理一个文件, 返回输出的字幕条数"""
+    track = apply_plan(load_srt(input_file), plan)
+    save_srt(track, output_file)
+    return len(track)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="调整字幕时间轴: 平移, 帧率转换, 锚点校准, 合并/拆分字幕")
+    parser.add_argument("inputs", nargs="+",
+                        help="输入文件.srt [输出文件.srt]; 批量模式下是输入文件, 目录或通配符")
+    add_timing_arguments(parser)
+    add_batch_arguments(parser)
+    args = parser.parse_args(join_negative_values(sys.argv[1:]))
+
+    try:
+        plan = timing_plan(args)
+    except SubtitleError as e:
+        print(f"参数错误: {str(e)}")
+        sys.exit(1)
+    if plan == TimingPlan():
+        print("没有指定任何调整, 见 retime.py --help")
+        sys.exit(1)
+
+    if args.output_dir:
+        try:
+            # 参数不同的输出不能互相跳过, 把调整方式写进工具名
+            report = run_batch(output_jobs(expand_inputs(args.inputs), args.output_dir),
+                               partial(retime_file, plan=plan), f"retime {tuple(plan)}", args.workers, args.force)
+        except SubtitleError as e:
+            print(f"字幕处理错误: {str(e)}")
+            sys.exit(1)
+        print(report.summary())
+        sys.exit(1 if report.failed else 0)
+
+    if len(args.inputs) > 2 or is_pattern(args.inputs[0]) or Path(args.inputs[0]).is_dir():
+        print("用法: retime.py 输入文件.srt [输出文件.srt] [调整参数], 处理多个文件时用 --output-dir 指定输出目录")
+        sys.exit(1)
+
+    input_file = args.inputs[0]
+    if len(args.inputs) == 2:
+        output_file = args.inputs[1]
+    else:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_file = f"{Path(input_file).stem}_retimed_{timestamp}.srt"
+    try:
+        cues = retime_file(input_file, output_file, plan)
+    except SubtitleError as e:
+        print(f"字幕处理错误: {str(e)}")
+        sys.exit(1)
+    print(f"处理完成: {input_file} -> {output_file}, {cues} 条字幕")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+根目录脚本和 python/ 下各工具共用的字幕处理代码, 只依赖标准库
+
+parser 和 track 是其余模块的基础, 直接导入; 其余子模块 (对齐, 批处理, 编码缓存, 统计, 时间轴, 文本规则, 输出)
+在第一次访问其中的名字时才导入, 只用到解析和输出的脚本不必加载 sqlite3, hashlib, glob 等用不到的标准库模块
+"""
+from importlib import import_module
+
+from .parser import (SubtitleError, SubtitleItem, format_timestamp, iter_srt, iter_srt_text, parse_srt,
+                     parse_timestamp)
+from .track import SubtitleTrack, load_srt
+
+# 子模块 -> 从中导出的名字
+_lazy_exports = {
+    "align": ("AlignedCue", "Alignment", "align_translations", "join_lines", "split_line"),
+    "batch": ("BatchJob", "BatchReport", "add_batch_arguments", "expand_inputs", "is_pattern", "output_jobs",
+              "run_batch"),
+    "encoding": ("EncodingCache", "detect_encoding", "open_text", "read_text"),
+    "metrics": ("RunMetrics",),
+    "timing": ("fps_factor", "merge_cues", "resync", "scale", "shift", "split_cues"),
+    "transforms": ("Rule", "TextRules", "add_rule_arguments", "capitalize_line", "map_lines", "named_rules",
+                   "normalize_whitespace", "space_cjk_latin", "strip_trailing_punctuation"),
+    "writer": ("OrderedSrtWriter", "add_output_arguments", "atomic_write", "bilingual_texts", "format_for_path",
+               "output_formats", "save_srt", "write_items", "write_track"),
+}
+_lazy_modules = {name: module for module, names in _lazy_exports.items() for name in names}
+
+__all__ = ["SubtitleError", "SubtitleItem", "SubtitleTrack", "format_timestamp", "iter_srt", "iter_srt_text",
+           "load_srt", "parse_srt", "parse_timestamp", *_lazy_modules]
+
+
+def __getattr__(name: str):
+    module = _lazy_modules.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    # 之后的访问直接命中模块字典, 不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_modules))
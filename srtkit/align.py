@@ -0,0 +1,370 @@
+"""
+译文行数与字幕条数不一致时, 把译文行对齐到字幕上
+
+模型翻译时常把相邻的几条字幕合并成一行, 或把一条拆成两行, 偶尔漏掉或多出一行;
+这里用动态规划找总代价最小的对应方式, 每一步是下面的一种:
+  1 条字幕 <- 1 行译文          match
+  2~3 条字幕 <- 1 行译文        merged, 按长度比例在标点处把这行拆给这几条字幕
+  1 条字幕 <- 2 行译文          joined, 两行拼起来
+  1 条字幕 <- 没有译文          missing, 保留原文
+  没有字幕 <- 1 行译文          这行译文丢弃
+代价由长度比例 (按全文的平均比例换算), 句末的问号/叹号/省略号是否一致, 数字是否一致, 以及被合并的字幕之间的时间间隔决定
+
+只在对应位置附近的带状区域内搜索, 耗时与字幕条数成正比: 每条字幕的带中心是按累计长度估计的位置,
+加上前一条字幕处实际的偏差 (动态规划到前一条为止代价最小的译文行与估计位置的差), 漏行和长度比例的误差累积起来
+带也会跟着移动; 最优路径仍然碰到带的边界时把带宽加倍重新搜索, 最多到 _max_band
+"""
+import math
+import re
+from array import array
+from itertools import accumulate
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .parser import SubtitleError
+from .track import SubtitleTrack
+
+# (字幕条数, 译文行数, 这种步骤的固定代价)
+_steps = ((1, 1, 0.0), (2, 1, 0.8), (1, 2, 0.8), (3, 1, 1.8), (1, 0, 2.5), (0, 1, 2.5))
+# 被合并的字幕之间每隔 1 秒加的代价, 中间隔了很久的两条字幕不太可能被翻成一行
+_gap_cost_per_second = 0.5
+# 前一条字幕没有句末标点时 (句子跨了两条字幕), 合并的代价打折
+_continuation_discount = 0.5
+# 搜索带的初始半宽和最大半宽
+_min_band = 16
+_max_band = 256
+
+_sentence_end = '.。!！?？…'
+# 问句, 感叹, 省略号在译文中一般会保留, 这几种结尾不一致时加代价
+_marked_ends = ('?', '!', '…')
+_punctuation_classes = {'?': '?', '？': '?', '!': '!', '！': '!', '…': '…'}
+# 动态规划里用的句末编号: 没有标记的结尾都是 0, 编号不同即结尾不一致
+_end_codes = {'?': 1, '!': 2, '…': 3}
+_digits = re.compile(r'\d+')
+# 拆分一行译文时优先选的位置: 这些标点之后
+_break_after = re.compile(r'[,，、;；:：.。!！?？…]+\s*')
+
+
+class AlignedCue(NamedTuple):
+    kind: str  # match, merged, joined, missing
+    confidence: float
+    lines: Tuple[int, ...]  # 用到的译文行号 (从 0 开始)
+
+
+class Alignment(NamedTuple):
+    texts: List[str]
+    cues: List[AlignedCue]
+    dropped_lines: List[int]
+
+    def low_confidence(self, threshold: float) -> List[int]:
+        return [position for position, cue in enumerate(self.cues) if cue.confidence < threshold]
+
+    def summary(self) -> str:
+        counts = {}
+        for cue in self.cues:
+            counts[cue.kind] = counts.get(cue.kind, 0) + 1
+        average = sum(cue.confidence for cue in self.cues) / len(self.cues) if self.cues else 0
+        parts = [f"{kind} {counts[kind]}" for kind in ("match", "merged", "joined", "missing") if kind in counts]
+        return (f"对齐 {len(self.cues)} 条字幕: {', '.join(parts)}; 丢弃译文 {len(self.dropped_lines)} 行; "
+                f"平均置信度 {average:.2f}")
+
+
+def _length(text: str) -> int:
+    # 不计空白的字数
+    return len(''.join(text.split()))
+
+
+def _end_class(text: str) -> str:
+    text = text.rstrip()
+    if not text:
+        return ''
+    if text.endswith('...'):
+        return '…'
+    return _punctuation_classes.get(text[-1], '.' if text[-1] in _sentence_end else '')
+
+
+def _is_cjk(char: str) -> bool:
+    return '　' <= char <= '鿿' or '＀' <= char <= '￯'
+
+
+def join_lines(lines: Sequence[str]) -> str:
+    """拼接几行译文, 中文之间不加空格"""
+    text = ''
+    for line in lines:
+        if text and not (_is_cjk(text[-1]) or _is_cjk(line[:1])):
+            text += ' '
+        text += line
+    return text
+
+
+def split_line(text: str, weights: Sequence[int]) -> Tuple[List[str], bool]:
+    """
+    按 weights 的比例把一行拆成 len(weights) 段, 优先在标点之后拆, 其次在空格处, 都没有时按字符位置拆
+    返回 (各段, 是否都在标点处拆开)
+    """
+    total = sum(weights) or 1
+    candidates = [match.end() for match in _break_after.finditer(text) if match.end() < len(text)]
+    spaces = None
+    parts, position, at_punctuation = [], 0, True
+    cumulative = 0
+    for weight in weights[:-1]:
+        cumulative += weight
+        target = round(len(text) * cumulative / total)
+        # 离比例位置不超过全长 1/4 的标点才用, 否则拆出来的两段长度差太多
+        near = [c for c in candidates if c > position and abs(c - target) <= len(text) / 4]
+        if near:
+            cut = min(near, key=lambda c: abs(c - target))
+        else:
+            at_punctuation = False
+            if spaces is None:
+                spaces = [match.end() for match in re.finditer(r'\s+', text) if match.end() < len(text)]
+            near = [c for c in spaces if c > position]
+            cut = min(near, key=lambda c: abs(c - target)) if near else max(position + 1, min(target, len(text) - 1))
+        parts.append(text[position:cut].strip())
+        position = cut
+    parts.append(text[position:].strip())
+    return parts, at_punctuation
+
+
+class _Scorer:
+    """每条字幕和每行译文的长度, 句末标点, 数字预先算好, 动态规划的每一格只做几次查表"""
+
+    def __init__(self, track: SubtitleTrack, lines: Sequence[str]):
+        self.texts = list(track.texts())
+        self.cue_lengths = [_length(text) for text in self.texts]
+        self.line_lengths = [_length(line) for line in lines]
+        # 长度的前缀和, 几条字幕或几行译文的总长度相减即得
+        self.cue_prefix = list(accumulate(self.cue_lengths, initial=0))
+        self.line_prefix = list(accumulate(self.line_lengths, initial=0))
+        self.cue_ends = [_end_class(text) for text in self.texts]
+        self.line_ends = [_end_class(line) for line in lines]
+        self.cue_digits = [frozenset(_digits.findall(text)) for text in self.texts]
+        self.line_digits = [frozenset(_digits.findall(line)) for line in lines]
+        # 第 k 条和第 k + 1 条字幕合并成一行的额外代价
+        starts, ends = track.starts, track.ends
+        self.merge_costs = [
+            _gap_cost_per_second * max(0, starts[k + 1] - ends[k]) / 1000
+            - (_continuation_discount if not self.cue_ends[k] else 0)
+            for k in range(len(self.texts) - 1)]
+        # 译文与原文的平均长度比例, 如英译中约 0.3
+        self.ratio = (self.line_prefix[-1] or 1) / (self.cue_prefix[-1] or 1)
+        self.cue_codes = [_end_codes.get(end, 0) for end in self.cue_ends]
+        self.line_codes = [_end_codes.get(end, 0) for end in self.line_ends]
+
+    def centers(self) -> List[int]:
+        """
+        每条字幕在译文中大致的位置: 前 i 条字幕的总长度按平均比例换算, 对应到译文长度前缀和中的位置
+        合并或拆分行不改变总长度, 这样估出的位置比按条数等比例的对角线准, 带宽可以窄很多
+        """
+        lines = len(self.line_prefix) - 1
+        centers, j = [], 0
+        for i, length in enumerate(self.cue_prefix):
+            target = length * self.ratio
+            while j < lines and self.line_prefix[j + 1] <= target:
+                j += 1
+            centers.append(j)
+        centers[-1] = lines
+        return centers
+
+    def cost(self, i: int, j: int, cues: int, lines: int) -> float:
+        """字幕 [i, i + cues) 对应译文 [j, j + lines) 的代价, 不含步骤的固定代价"""
+        if not cues or not lines:
+            return 0.0
+        source = self.cue_prefix[i + cues] - self.cue_prefix[i]
+        target = self.line_prefix[j + lines] - self.line_prefix[j]
+        cost = abs(math.log((target + 2) / (self.ratio * source + 2)))
+
+        source_end, target_end = self.cue_ends[i + cues - 1], self.line_ends[j + lines - 1]
+        if source_end in _marked_ends or target_end in _marked_ends:
+            cost += 0.0 if source_end == target_end else 0.5
+
+        source_digits = self.cue_digits[i] if cues == 1 else frozenset().union(*self.cue_digits[i:i + cues])
+        target_digits = self.line_digits[j] if lines == 1 else frozenset().union(*self.line_digits[j:j + lines])
+        # 数字在译文中常换单位 (250 million -> 2.5亿), 只要有一个数字相同就算一致
+        if (source_digits or target_digits) and not source_digits & target_digits:
+            cost += 0.5
+
+        for k in range(i, i + cues - 1):
+            cost += self.merge_costs[k]
+        return cost
+
+
+def _search(scorer: _Scorer, n: int, m: int, band: int) -> Tuple[Optional[list], bool]:
+    """
+    逐条字幕做动态规划, 第 i 行只算 [center - band, center + band] 这些列, 返回 (最优路径, 路径是否碰到了带的边界)
+    路径是 (字幕起点, 译文起点, 字幕条数, 译文行数, 代价) 的列表, 带内走不通时为 None
+
+    代价和 _Scorer.cost 相同, 这里展开成查表: 以 (i, j) 结尾的一步, 字幕一侧只与 i 和条数有关, 每行算一次,
+    译文一侧只与 j 和行数有关, 预先算好; 只保留最近 4 行的代价, 回溯用的步骤每行一个 array
+    """
+    infinity = float('inf')
+    log, ratio = math.log, scorer.ratio
+    cue_lengths, cue_codes, cue_digits = scorer.cue_lengths, scorer.cue_codes, scorer.cue_digits
+    merge_costs = scorer.merge_costs
+    line_lengths, line_digits = scorer.line_lengths, scorer.line_digits
+    # 以第 j 行 (不含) 结尾的 1 行和 2 行译文, j 太小时的值不会用到
+    empty = frozenset()
+    line_logs = [0.0] + [log(length + 2) for length in line_lengths]
+    pair_logs = [0.0, 0.0] + [log(a + b + 2) for a, b in zip(line_lengths, line_lengths[1:])]
+    line_codes = [-1] + scorer.line_codes
+    line_sets = [empty] + line_digits
+    pair_sets = [empty, empty] + [a | b for a, b in zip(line_digits, line_digits[1:])]
+
+    # 代价按列存在长 m + 3 的 list 里, 第 j 列在 j + 2, 前两格始终是 infinity, 取 j - 1, j - 2 列不用判断边界
+    rows = [[infinity] * (m + 3) for _ in range(4)]
+    windows = [(0, -1)] * 4
+    lows: List[int] = []
+    backs: List[array] = []
+    centers = scorer.centers()
+    offset = 0
+    for i in range(n + 1):
+        # 最早的一行不再需要, 清空后用作当前行
+        current = rows.pop()
+        lo, hi = windows.pop()
+        current[lo + 2:hi + 3] = [infinity] * (hi - lo + 1)
+        previous1, previous2, previous3 = rows
+        center = min(max(centers[i] + offset, 0), m)
+        lo, hi = max(0, center - band), min(m, center + band)
+        if i == n:
+            hi = m
+        row_backs = array('b', [-1]) * (hi - lo + 1)
+
+        if i:
+            k = i - 1
+            code, length, digits1 = cue_codes[k], cue_lengths[k], cue_digits[k]
+            source1 = log(ratio * length + 2)
+            if i >= 2:
+                length += cue_lengths[k - 1]
+                digits2 = digits1 | cue_digits[k - 1]
+                source2 = log(ratio * length + 2)
+                base2 = _steps[1][2] + merge_costs[k - 1]
+            else:
+                digits2, source2, base2 = empty, 0.0, infinity
+            if i >= 3:
+                length += cue_lengths[k - 2]
+                digits3 = digits2 | cue_digits[k - 2]
+                source3 = log(ratio * length + 2)
+                base3 = _steps[3][2] + merge_costs[k - 2] + merge_costs[k - 1]
+            else:
+                digits3, source3, base3 = empty, 0.0, infinity
+
+        for j in range(lo, hi + 1):
+            q = j + 2
+            if not i:
+                if j:
+                    current[q], row_backs[j - lo] = current[q - 1] + _steps[5][2], 5
+                else:
+                    current[q] = 0.0
+                continue
+            best, best_step = infinity, -1
+            if j:
+                penalty = 0.0 if line_codes[j] == code else 0.5
+                target, target_digits = line_logs[j], line_sets[j]
+                # 1 条字幕 <- 1 行译文
+                total = previous1[q - 1]
+                if total < best:
+                    total += abs(target - source1) + penalty
+                    if (digits1 or target_digits) and not digits1 & target_digits:
+                        total += 0.5
+                    if total < best:
+                        best, best_step = total, 0
+                # 2 条字幕 <- 1 行译文
+                total = previous2[q - 1] + base2
+                if total < best:
+                    total += abs(target - source2) + penalty
+                    if (digits2 or target_digits) and not digits2 & target_digits:
+                        total += 0.5
+                    if total < best:
+                        best, best_step = total, 1
+                # 1 条字幕 <- 2 行译文
+                total = previous1[q - 2] + _steps[2][2]
+                if total < best:
+                    pair_digits = pair_sets[j]
+                    total += abs(pair_logs[j] - source1) + penalty
+                    if (digits1 or pair_digits) and not digits1 & pair_digits:
+                        total += 0.5
+                    if total < best:
+                        best, best_step = total, 2
+                # 3 条字幕 <- 1 行译文
+                total = previous3[q - 1] + base3
+                if total < best:
+                    total += abs(target - source3) + penalty
+                    if (digits3 or target_digits) and not digits3 & target_digits:
+                        total += 0.5
+                    if total < best:
+                        best, best_step = total, 3
+            # 没有译文
+            total = previous1[q] + _steps[4][2]
+            if total < best:
+                best, best_step = total, 4
+            # 丢弃一行译文, 来自当前行左边的一格
+            total = current[q - 1] + _steps[5][2]
+            if total < best:
+                best, best_step = total, 5
+            current[q] = best
+            row_backs[j - lo] = best_step
+
+        # 到这条字幕为止代价最小的位置与估计位置的差, 作为下一条字幕的带中心的修正
+        window = current[lo + 2:hi + 3]
+        lowest = min(window)
+        if lowest < infinity:
+            offset = lo + window.index(lowest) - centers[i]
+        rows.insert(0, current)
+        windows.insert(0, (lo, hi))
+        lows.append(lo)
+        backs.append(row_backs)
+
+    if rows[0][m + 2] == infinity:
+        return None, True
+
+    path = []
+    touched = False
+    i, j = n, m
+    while i or j:
+        lo, hi = lows[i], lows[i] + len(backs[i]) - 1
+        touched = touched or (j == lo and lo > 0) or (j == hi and hi < m)
+        cues, step_lines, base = _steps[backs[i][j - lo]]
+        i, j = i - cues, j - step_lines
+        path.append((i, j, cues, step_lines, base + scorer.cost(i, j, cues, step_lines)))
+    path.reverse()
+    return path, touched
+
+
+def align_translations(track: SubtitleTrack, lines: Sequence[str], band: Optional[int] = None) -> Alignment:
+    """
+    把 lines 对齐到 track 的每条字幕, 返回每条字幕的译文和置信度
+    band: 搜索带的半宽 (行数), 默认 _min_band; 最优路径碰到带的边界 (或带内走不通) 时把带宽加倍重新搜索,
+    带宽到 _max_band 或覆盖全部译文为止, 这时仍碰到边界就用带内的最优路径
+    """
+    n, m = len(track), len(lines)
+    if not n:
+        raise SubtitleError("字幕文件为空")
+    scorer = _Scorer(track, lines)
+    width = band or _min_band
+    while True:
+        path, touched = _search(scorer, n, m, width)
+        if not touched or width >= min(_max_band, max(n, m)):
+            break
+        width *= 2
+    if path is None:
+        raise SubtitleError(f"无法对齐: 字幕 {n} 条, 译文 {m} 行, 搜索带半宽 {width} 行内找不到对应方式")
+
+    texts: List[str] = list(scorer.texts)
+    aligned: List[Optional[AlignedCue]] = [None] * n
+    dropped = []
+    for i, j, cues, step_lines, cost in path:
+        line_numbers = tuple(range(j, j + step_lines))
+        if not cues:
+            dropped.append(j)
+        elif not step_lines:
+            aligned[i] = AlignedCue("missing", 0.0, ())
+        elif cues == 1:
+            texts[i] = join_lines(lines[j:j + step_lines])
+            aligned[i] = AlignedCue("match" if step_lines == 1 else "joined", min(1.0, math.exp(-cost)), line_numbers)
+        else:
+            parts, at_punctuation = split_line(lines[j], scorer.cue_lengths[i:i + cues])
+            # 没找到标点拆开的, 拆分位置靠猜, 置信度再打折
+            confidence = min(1.0, math.exp(-cost)) * (1 if at_punctuation else 0.7)
+            for k, part in enumerate(parts):
+                texts[i + k] = part
+                aligned[i + k] = AlignedCue("merged", confidence, line_numbers)
+    return Alignment(texts, aligned, dropped)
@@ -0,0 +1,173 @@
+"""
+批量处理: 把目录/通配符展开成文件列表, 用进程池并行处理, 跳过输出已是最新的文件
+
+输出目录下的 .srtkit-batch.json 记录每个输出文件由哪个工具, 从什么内容的输入生成;
+输出比输入新时直接跳过, 输入的 mtime 变了但内容哈希没变 (如重新拷贝过) 也跳过
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .parser import SubtitleError
+
+_manifest_name = ".srtkit-batch.json"
+
+
+class BatchJob(NamedTuple):
+    # 输入文件 (如字幕和它的译文), 依次作为位置参数传给处理函数, 最后一个参数是输出路径
+    sources: Tuple[str, ...]
+    output: str
+
+
+class BatchReport(NamedTuple):
+    processed: int
+    skipped: int
+    failed: int
+    cues: int
+    elapsed: float
+
+    def summary(self) -> str:
+        seconds = max(self.elapsed, 1e-9)
+        return (f"处理 {self.processed} 个文件, 跳过 {self.skipped} 个 (已是最新), 失败 {self.failed} 个, "
+                f"{self.cues} 条字幕, 耗时 {self.elapsed:.2f}s, "
+                f"{self.processed / seconds:.1f} 文件/s, {self.cues / seconds:.0f} 条/s")
+
+
+def is_pattern(path: str) -> bool:
+    return glob.has_magic(path)
+
+
+def expand_inputs(paths: Sequence[str], suffix: str = ".srt") -> List[Path]:
+    """文件原样保留, 目录展开为其中的 suffix 文件, 通配符按 glob 展开, 结果去重并保持顺序"""
+    files: Dict[Path, None] = {}
+    for path in paths:
+        if is_pattern(path):
+            matches = sorted(Path(match) for match in glob.glob(path, recursive=True))
+            files.update(dict.fromkeys(match for match in matches if match.is_file()))
+        elif Path(path).is_dir():
+            files.update(dict.fromkeys(sorted(Path(path).glob(f"*{suffix}"))))
+        else:
+            files[Path(path)] = None
+    return list(files)
+
+
+def add_batch_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="批量模式: 处理结果按原文件名写到这个目录, 输入可以是多个文件, 目录或通配符")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="批量模式的进程数 (默认: CPU 核数)")
+    parser.add_argument("--force", action="store_true", help="批量模式: 不跳过已是最新的输出, 全部重新处理")
+
+
+def output_jobs(files: Sequence[Path], output_dir: str) -> List[BatchJob]:
+    """每个输入文件对应输出目录中的同名文件"""
+    return [BatchJob((str(path),), str(Path(output_dir) / path.name)) for path in files]
+
+
+def _hash_sources(sources: Sequence[str]) -> str:
+    digest = hashlib.sha256()
+    for source in sources:
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class _Manifest:
+    """输出目录中的记录: 输出文件名 -> {"tool": 工具名, "sha256": 输入内容哈希}"""
+
+    def __init__(self, directory: Path):
+        self.path = directory / _manifest_name
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def is_up_to_date(self, job: BatchJob, tool: str) -> bool:
+        entry = self.entries.get(Path(job.output).name)
+        # 没有记录说明输出不是这个工具生成的, 不能跳过
+        if not entry or entry.get("tool") != tool:
+            return False
+        try:
+            output_mtime = os.stat(job.output).st_mtime_ns
+            if output_mtime >= max(os.stat(source).st_mtime_ns for source in job.sources):
+                return True
+            if entry.get("sha256") == _hash_sources(job.sources):
+                # 内容没变, 更新输出的 mtime, 下次直接按 mtime 跳过, 不用再算哈希
+                os.utime(job.output)
+                return True
+        except FileNotFoundError:
+            pass
+        return False
+
+    def record(self, job: BatchJob, tool: str):
+        self.entries[Path(job.output).name] = {"tool": tool, "sha256": _hash_sources(job.sources)}
+
+    def save(self):
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def run_batch(jobs: Sequence[BatchJob], process: Callable[..., int], tool: str, workers: Optional[int] = None,
+              force: bool = False) -> BatchReport:
+    """
+    用进程池执行 process(*job.sources, job.output), process 返回处理的字幕条数
+    process 必须是模块级函数, 才能传给子进程; 只有一个待处理文件时直接在当前进程执行, 省掉进程池的启动开销
+    tool 写进记录, 换了工具 (或工具的参数) 时不会误用别的工具的输出
+    """
+    start = time.perf_counter()
+    manifests: Dict[Path, _Manifest] = {}
+    pending = []
+    outputs = set()
+    for job in jobs:
+        output = Path(job.output).resolve()
+        if output in outputs:
+            raise SubtitleError(f"多个输入文件会写到同一个输出文件: {job.output}")
+        outputs.add(output)
+        if any(output == Path(source).resolve() for source in job.sources):
+            raise SubtitleError(f"输出文件不能覆盖输入文件: {job.output}")
+        directory = Path(job.output).parent
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = manifests.setdefault(directory, _Manifest(directory))
+        if force or not manifest.is_up_to_date(job, tool):
+            pending.append(job)
+
+    cues = failed = 0
+    done = []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+    if workers == 1:
+        for job in pending:
+            try:
+                cues += process(*job.sources, job.output)
+                done.append(job)
+            except Exception as e:
+                failed += 1
+                print(f"处理失败: {job.sources[0]}: {str(e)}")
+    else:
+        # concurrent.futures 和 multiprocessing 导入要几十毫秒, srtkit 被所有脚本共用, 只在真的要开进程池时导入
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process, *job.sources, job.output): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    cues += future.result()
+                    done.append(job)
+                except Exception as e:
+                    # 一个文件失败不影响其余文件
+                    failed += 1
+                    print(f"处理失败: {job.sources[0]}: {str(e)}")
+
+    for job in done:
+        manifests[Path(job.output).parent].record(job, tool)
+    for manifest in manifests.values():
+        manifest.save()
+    return BatchReport(len(done), len(jobs) - len(pending), failed, cues, time.perf_counter() - start)
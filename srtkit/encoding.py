@@ -0,0 +1,183 @@
+"""
+字幕文件的编码识别: 收到的字幕除了 UTF-8, 常见的还有 GBK, Big5, UTF-16 和 Windows-1252
+
+只读取文件开头的一段样本判断编码, 之后按识别出的编码用文本模式流式解码,
+BOM 和 CRLF 在解码时一起去掉; 非 UTF-8 的识别结果按 路径 + mtime + 大小 缓存
+"""
+import codecs
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, TextIO, Tuple
+
+from .parser import SubtitleError
+
+_default_cache_path = Path.home() / ".cache" / "srtkit" / "encodings.sqlite3"
+_sample_size = 64 * 1024
+
+# 带 BOM 的文件直接按 BOM 确定编码, UTF-32 要在 UTF-16 之前判断 (UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头)
+_boms = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 简体和繁体中文里最常用的字, 用来判断按 GBK 还是 Big5 解码出来的才是正常的文字:
+# 解码错了的文本是随机的汉字, 很少落在常用字里
+_simplified = frozenset("的一是不了人我在有他这中大来上个们到说国和地也子时道出而要于就下得可你年生自会那后能对着事其里所去"
+                        "行过家十用发天如然作方成者多日都三小二无同么经法当起与好看将还没吗呢吧啊她它为什想样现")
+_traditional = frozenset("的一是不了人我在有他這中大來上個們到說國和地也子時道出而要於就下得可你年生自會那後能對著事其裡所去"
+                         "行過家十用發天如然作方成者多日都三小二無同麼經法當起與好看將還沒嗎呢吧啊她它為什想樣現")
+# 按顺序尝试的中文编码: GB18030 兼容 GBK 和 GB2312, CP950 是 Windows 上的 Big5
+_cjk_candidates = (('gb18030', _simplified), ('cp950', _traditional))
+# 非 ASCII 字符中常用字至少占这个比例才认为是中文
+_min_common_ratio = 0.1
+
+
+def _decodes(sample: bytes, encoding: str) -> Optional[str]:
+    """样本能按 encoding 解码时返回解码结果; 样本可能在一个多字节字符中间截断, 末尾不完整的字符不算错误"""
+    try:
+        return codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return None
+
+
+def _utf16_without_bom(sample: bytes) -> Optional[str]:
+    # 字幕里的序号和时间戳都是 ASCII, UTF-16 编码后每两个字节就有一个 0
+    even, odd = sample[0::2].count(0), sample[1::2].count(0)
+    if max(even, odd) < len(sample) // 8:
+        return None
+    return 'utf-16-le' if odd > even else 'utf-16-be'
+
+
+def _guess_legacy(sample: bytes) -> str:
+    """不是 UTF-8 也不是 UTF-16 时, 在中文编码和 Windows-1252 之间选一个"""
+    best, best_ratio = None, _min_common_ratio
+    for encoding, common in _cjk_candidates:
+        text = _decodes(sample, encoding)
+        if text is None:
+            continue
+        non_ascii = [char for char in text if char > '\x7f']
+        ratio = sum(1 for char in non_ascii if char in common) / max(len(non_ascii), 1)
+        if ratio >= best_ratio:
+            best, best_ratio = encoding, ratio
+    if best:
+        return best
+    # CP1252 有 5 个未定义的字节, 包含这些字节时按 Latin-1 解码, 不会出错
+    return 'cp1252' if _decodes(sample, 'cp1252') is not None else 'latin-1'
+
+
+class EncodingCache:
+    """
+    非 UTF-8 文件的编码识别结果, 存在 SQLite 里, 批量模式的多个进程可以同时读写
+    key = (绝对路径, mtime, 大小), 文件改过之后不会用旧结果; 缓存打不开 (如目录只读) 时不缓存
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or str(_default_cache_path)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._memory: Dict[Tuple[str, int, int], str] = {}
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            try:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS encodings (
+                        path TEXT NOT NULL,
+                        mtime INTEGER NOT NULL,
+                        size INTEGER NOT NULL,
+                        encoding TEXT NOT NULL,
+                        PRIMARY KEY (path, mtime, size)
+                    )""")
+                self._conn.commit()
+            except (OSError, sqlite3.Error):
+                self._conn = False
+        return self._conn or None
+
+    def get(self, key: Tuple[str, int, int]) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute("SELECT encoding FROM encodings WHERE path = ? AND mtime = ? AND size = ?",
+                                   key).fetchone()
+            except sqlite3.Error:
+                return None
+            if row:
+                self._memory[key] = row[0]
+            return row[0] if row else None
+
+    def put(self, key: Tuple[str, int, int], encoding: str):
+        with self._lock:
+            self._memory[key] = encoding
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                # 同一路径的旧记录 (文件改过之前的) 没用了, 一起删掉
+                conn.execute("DELETE FROM encodings WHERE path = ?", key[:1])
+                conn.execute("INSERT INTO encodings VALUES (?, ?, ?, ?)", (*key, encoding))
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+
+_default_cache: Optional[EncodingCache] = None
+
+
+def _get_default_cache() -> EncodingCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EncodingCache()
+    return _default_cache
+
+
+def detect_encoding(file_path: str, cache: Optional[EncodingCache] = None) -> str:
+    """
+    识别文件编码, 返回可以直接传给 open() 的编码名
+    BOM 和 UTF-8 只需检查开头的样本, 比查缓存还快, 不缓存; 其余编码的识别结果存入 cache (默认 ~/.cache/srtkit)
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            sample = f.read(_sample_size)
+            stat = os.fstat(f.fileno())
+    except FileNotFoundError:
+        raise SubtitleError(f"找不到文件: {file_path}")
+    for bom, encoding in _boms:
+        if sample.startswith(bom):
+            return encoding
+    # 纯 ASCII 也按 UTF-8 处理, utf-8-sig 兼容有无 BOM;
+    # 0 字节也是合法的 UTF-8, 但文本字幕里不会有, 有 0 字节的是没有 BOM 的 UTF-16, 交给下面判断
+    if b'\0' not in sample and _decodes(sample, 'utf-8') is not None:
+        return 'utf-8-sig'
+
+    cache = cache or _get_default_cache()
+    key = (str(Path(file_path).resolve()), stat.st_mtime_ns, stat.st_size)
+    encoding = cache.get(key)
+    if encoding is None:
+        encoding = _utf16_without_bom(sample) or _guess_legacy(sample)
+        cache.put(key, encoding)
+    return encoding
+
+
+def open_text(file_path: str, cache: Optional[EncodingCache] = None) -> TextIO:
+    """按识别出的编码以文本模式打开, 解码时去掉 BOM, CRLF 和单独的 CR 都转为 '\\n'"""
+    return open(file_path, 'r', encoding=detect_encoding(file_path, cache), newline=None)
+
+
+def read_text(file_path: str, cache: Optional[EncodingCache] = None) -> str:
+    """读取整个文本文件, 编码同 open_text"""
+    with open_text(file_path, cache) as f:
+        try:
+            return f.read()
+        except UnicodeDecodeError as e:
+            raise SubtitleError(f"无法按 {f.encoding} 解码文件 {file_path}: {e.reason}")
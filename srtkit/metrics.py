@@ -0,0 +1,72 @@
+"""
+运行指标: 翻译和配音的每次请求记录为一个事件, 写入 JSONL 跟踪文件, 结束时打印汇总
+
+事件字段的约定: 以 _ms 结尾的是耗时, 汇总时给出 p50/p95; 以 _id 结尾的 (如字幕序号) 只写进跟踪文件;
+其他数值字段汇总时求和; 字符串和布尔字段按取值计数 (如 status: ok 118, throttled 2)
+"""
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+class RunMetrics:
+    """
+    record(event, **fields) 可以被多个线程同时调用
+    trace_path 为空时只在内存中汇总, 不写文件
+    """
+
+    def __init__(self, trace_path: Optional[str] = None):
+        self.trace_path = trace_path
+        self._file = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._counts: Counter = Counter()
+        self._timings: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._totals: Dict[str, Counter] = defaultdict(Counter)
+        self._values: Dict[str, Dict[str, Counter]] = defaultdict(lambda: defaultdict(Counter))
+
+    def record(self, event: str, **fields):
+        with self._lock:
+            self._counts[event] += 1
+            for name, value in fields.items():
+                if name.endswith("_id"):
+                    continue
+                if isinstance(value, bool) or isinstance(value, str):
+                    self._values[event][name][str(value).lower()] += 1
+                elif isinstance(value, (int, float)):
+                    if name.endswith("_ms"):
+                        self._timings[event][name].append(value)
+                    else:
+                        self._totals[event][name] += value
+            if self._file:
+                line = {"time": round(time.time(), 3), "event": event, **fields}
+                self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    def summary(self) -> str:
+        with self._lock:
+            lines = [f"运行指标 ({time.time() - self._started:.1f}s):"]
+            for event, count in self._counts.items():
+                parts = [f"{count} 次"]
+                for name, values in self._timings[event].items():
+                    parts.append(f"{name} p50 {_percentile(values, 50):.0f} / p95 {_percentile(values, 95):.0f}")
+                for name, total in self._totals[event].items():
+                    parts.append(f"{name} 共 {total:.1f}" if isinstance(total, float) else f"{name} 共 {total}")
+                for name, counter in self._values[event].items():
+                    parts.append(f"{name}: " + ", ".join(f"{value} {n}" for value, n in counter.most_common()))
+                lines.append(f"  {event}: " + "; ".join(parts))
+            if self.trace_path:
+                lines.append(f"  每个事件的明细: {self.trace_path}")
+            return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
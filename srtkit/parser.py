@@ -0,0 +1,185 @@
+"""
+流式 srt 解析, 分段读取文件, 边读边 yield 出字幕块, 不会把整个文件读进内存
+"""
+import gc
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+
+class SubtitleError(Exception):
+    """字幕处理相关的异常"""
+    pass
+
+
+# 00:01:02,345 --> 00:01:04,000, 毫秒分隔符兼容 ',' 和 '.'
+_timestamp_pattern = re.compile(
+    r'\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})')
+
+
+_standard_timestamp = r'\d{2,}:\d\d:\d\d,\d\d\d --> \d{2,}:\d\d:\d\d,\d\d\d'
+_standard_timestamps = re.compile(rf'(?:{_standard_timestamp}\n)*{_standard_timestamp}')
+_timestamp_digits = str.maketrans({':': None, ',': None, '-': None, '>': None})
+# 数字都换成 0 之后, 小时为两位的标准时间戳都是这个样子
+_digit_shape = str.maketrans('0123456789', '0' * 10)
+_standard_shape = '00:00:00,000 --> 00:00:00,000'
+
+# 空行(允许夹杂空格)分隔字幕块
+_block_separator = re.compile(r'\n[ \t]*\n\s*')
+_read_size = 1 << 18
+
+
+def format_timestamp(ms: int) -> str:
+    """毫秒转为 srt 时间格式, 如 62345 -> 00:01:02,345"""
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def _parse_time(hours: str, minutes: str, seconds: str, fraction: str) -> int:
+    # 毫秒部分不足 3 位时按小数处理, 如 "5" 表示 500 毫秒
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, '0'))
+
+
+def parse_timestamp(line: str) -> Tuple[int, int]:
+    """解析时间戳行, 返回 (开始毫秒, 结束毫秒)"""
+    match = _timestamp_pattern.match(line)
+    if not match:
+        raise SubtitleError(f"格式错误的时间戳: {line.strip()}")
+    groups = match.groups()
+    return _parse_time(*groups[:4]), _parse_time(*groups[4:])
+
+
+@dataclass
+class SubtitleItem:
+    # 大文件有上百万个字幕块, 用 __slots__ 省掉每个对象的 __dict__
+    __slots__ = ('index', 'start', 'end', 'content')
+
+    index: int
+    start: int  # 毫秒
+    end: int  # 毫秒
+    content: str
+
+    @property
+    def timestamp(self) -> str:
+        return f"{format_timestamp(self.start)} --> {format_timestamp(self.end)}"
+
+    def __str__(self):
+        return f"{self.index}\n{self.timestamp}\n{self.content}\n"
+
+
+def _parse_index(line: str) -> int:
+    try:
+        return int(line)
+    except ValueError:
+        # 兼容序号前后带杂字符的情况
+        digits = re.sub(r'\D', '', line)
+        if not digits:
+            raise SubtitleError(f"格式错误的字幕序号: {line}")
+        return int(digits)
+
+
+def _parse_block(block: str) -> SubtitleItem:
+    # 最多切 2 次: 序号, 时间戳, 剩下的就是内容(可能有多行)
+    lines = block.split('\n', 2)
+    if len(lines) < 2:
+        raise SubtitleError(f"格式错误的字幕块: {block}")
+    start, end = parse_timestamp(lines[1])
+    return SubtitleItem(_parse_index(lines[0]), start, end, lines[2] if len(lines) == 3 else '')
+
+
+def _all_standard(timestamps: str, count: int) -> bool:
+    """
+    换行分隔的 count 个时间戳是否都是标准格式
+    一百小时以内的字幕把数字都换成 0 后与标准格式整段比较, 比正则快十倍; 对不上 (如小时有三位) 时再用正则确认
+    """
+    if timestamps.translate(_digit_shape) == '\n'.join([_standard_shape] * count):
+        return True
+    return _standard_timestamps.fullmatch(timestamps) is not None
+
+
+def _parse_blocks(blocks: List[str]) -> List[SubtitleItem]:
+    """
+    批量解析字幕块, 逐条用正则解析时间戳太慢, 这里把一批时间戳拼在一起:
+    1. 用一个正则确认全部是标准格式 00:01:02,345 --> 00:01:04,000
+    2. 去掉 ':' ',' '-->' 后按空白切开, "000102345" 即 时分秒毫秒, 一个时间只需要一次 int()
+    不是标准格式时退回逐块解析, 也能报出具体是哪一块格式有问题
+    """
+    splits = [block.split('\n', 2) for block in blocks]
+    shortest = min(map(len, splits), default=0)
+    if shortest < 2:
+        return [_parse_block(block) for block in blocks]
+    if shortest == 2:
+        # 内容为空的字幕块补一个空字符串, 下面就不用逐条判断
+        for lines in splits:
+            if len(lines) == 2:
+                lines.append('')
+    timestamps = '\n'.join([lines[1] for lines in splits])
+    if not _all_standard(timestamps, len(splits)):
+        return [_parse_block(block) for block in blocks]
+
+    try:
+        indices = list(map(int, [lines[0] for lines in splits]))
+    except ValueError:
+        indices = [_parse_index(lines[0]) for lines in splits]
+    values = iter(map(int, timestamps.translate(_timestamp_digits).split()))
+    return [SubtitleItem(index,
+                         (start // 10_000_000 * 60 + start // 100_000 % 100) * 60_000 + start % 100_000,
+                         (end // 10_000_000 * 60 + end // 100_000 % 100) * 60_000 + end % 100_000,
+                         lines[2])
+            for index, lines, start, end in zip(indices, splits, values, values)]
+
+
+def iter_srt_text(chunks: Iterable[str]) -> Iterator[SubtitleItem]:
+    """
+    从一段段文本中解析字幕块, 文本可以在任意位置被切开
+    字幕块之间可以有任意多个空行(包括只有空格的行), 内容为空的字幕块也能接受
+    """
+    remainder = ''
+    for chunk in chunks:
+        # 上一段末尾不完整的字幕块拼到这一段开头, lstrip 去掉可能跨段的多余空行
+        blocks = _block_separator.split((remainder + chunk).lstrip())
+        # 最后一块后面还没遇到空行, 可能不完整, 留到下一段
+        remainder = blocks.pop()
+        yield from _parse_blocks(blocks)
+    remainder = remainder.rstrip()
+    if remainder:
+        yield _parse_block(remainder)
+
+
+def iter_srt(file_path: str) -> Iterator[SubtitleItem]:
+    """
+    逐个产出文件中的字幕块
+    每次读取 _read_size 个字符, 内存占用与文件大小无关
+    编码按文件开头的样本识别 (见 encoding.py), 解码时去掉 BOM, 文本模式默认的 newline=None 会把 CRLF 统一成 '\n'
+    """
+    # encoding.py 用到这里的 SubtitleError, 在函数里导入避免循环导入
+    from .encoding import open_text
+
+    if not Path(file_path).exists():
+        raise SubtitleError(f"找不到字幕文件: {file_path}")
+    with open_text(file_path) as f:
+        try:
+            yield from iter_srt_text(iter(lambda: f.read(_read_size), ''))
+        except UnicodeDecodeError as e:
+            raise SubtitleError(f"无法按 {f.encoding} 解码字幕文件 {file_path}: {e.reason}")
+
+
+def parse_srt(file_path: str) -> List[SubtitleItem]:
+    """
+    解析整个字幕文件, 返回字幕块列表
+    SubtitleItem 之间没有循环引用, 构建列表时暂停循环垃圾回收: 否则每新建几百个对象就扫描一遍新对象,
+    列表越长, 被反复扫描的对象越多, 几十万条字幕时这部分开销占到解析时间的两成
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        subtitle_items = list(iter_srt(file_path))
+    finally:
+        if enabled:
+            gc.enable()
+    if not subtitle_items:
+        raise SubtitleError("字幕文件为空")
+    return subtitle_items
@@ -0,0 +1,231 @@
+"""
+时间轴调整: 整体平移, 按比例缩放 (帧率转换), 按锚点分段校准, 以及按时长和每秒字数合并/拆分字幕
+
+平移, 缩放, 校准只生成新的开始/结束时间数组, 序号和文本与原轨道共用, 百万条字幕也只要零点几秒;
+合并和拆分会改变字幕条数, 结果重新编号: 先按时间和字数数组一次算出哪些字幕需要处理, 只对这些字幕拼接或拆分文本,
+其余字幕整段复制数组 (SubtitleTrack.splice); 拆分每条都要找标点, 要拆的字幕很多时耗时与要拆的条数成正比
+"""
+import gc
+import math
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import compress, islice
+from operator import le, or_, sub
+from typing import List, Optional, Sequence, Tuple
+
+from .align import join_lines, split_line
+from .parser import SubtitleError
+from .track import SubtitleTrack
+
+
+def _clamp(values: array) -> array:
+    # 移到 0 之前的时间改为 0, 大多数情况下没有负数, 先用 min 判断一次
+    if values and min(values) < 0:
+        return array('q', [value if value > 0 else 0 for value in values])
+    return values
+
+
+def shift(track: SubtitleTrack, offset: int) -> SubtitleTrack:
+    """所有时间加上 offset 毫秒, 可以是负数"""
+    starts = array('q', [value + offset for value in track.starts])
+    ends = array('q', [value + offset for value in track.ends])
+    return track.with_times(_clamp(starts), _clamp(ends))
+
+
+def scale(track: SubtitleTrack, factor: float, origin: int = 0) -> SubtitleTrack:
+    """以 origin 毫秒为原点按 factor 缩放时间, 如 25 fps 转 23.976 fps 用 fps_factor(25, 23.976)"""
+    if factor <= 0:
+        raise SubtitleError(f"缩放比例必须大于 0: {factor}")
+    return track.with_times(_clamp(_linear(track.starts, factor, origin - origin * factor)),
+                            _clamp(_linear(track.ends, factor, origin - origin * factor)))
+
+
+def _linear(values, slope: float, intercept: float) -> array:
+    # floor(x + 0.5) 即四舍五入, 比逐个调用 round() 快
+    return array('q', map(math.floor, [value * slope + intercept + 0.5 for value in values]))
+
+
+def fps_factor(source_fps: float, target_fps: float) -> float:
+    """字幕原来对应 source_fps 的视频, 要用在 target_fps 的视频上时的缩放比例"""
+    if source_fps <= 0 or target_fps <= 0:
+        raise SubtitleError(f"帧率必须大于 0: {source_fps}, {target_fps}")
+    return source_fps / target_fps
+
+
+def _segments(anchors: Sequence[Tuple[int, int]]) -> List[Tuple[int, float, float]]:
+    """锚点 (原时间, 新时间) 转为分段: (分段的起点, 斜率, 截距), 第一段向前延伸, 最后一段向后延伸"""
+    points = sorted(anchors)
+    if not points:
+        raise SubtitleError("至少需要一个锚点")
+    if len({old for old, _ in points}) != len(points):
+        raise SubtitleError("锚点的原时间不能重复")
+    if len(points) == 1:
+        old, new = points[0]
+        return [(0, 1.0, float(new - old))]
+    segments = []
+    for k, ((old, new), (next_old, next_new)) in enumerate(zip(points, points[1:])):
+        slope = (next_new - new) / (next_old - old)
+        if slope <= 0:
+            raise SubtitleError(f"锚点的新时间必须随原时间递增: {points[k]} -> {points[k + 1]}")
+        # 第一段从最早的时间开始, 锚点之前的字幕按第一段的比例外推
+        segments.append((old if k else -(1 << 62), slope, new - old * slope))
+    return segments
+
+
+def _is_sorted(values) -> bool:
+    return all(map(le, values, islice(values, 1, None)))
+
+
+def _piecewise(values: memoryview, segments: List[Tuple[int, float, float]]) -> array:
+    if len(segments) == 1:
+        _, slope, intercept = segments[0]
+        return _linear(values, slope, intercept)
+    if not _is_sorted(values):
+        # 时间不是递增的 (字幕顺序乱了), 逐个二分查找所在的分段
+        bounds = [start for start, _, _ in segments]
+        result = array('q')
+        for value in values:
+            _, slope, intercept = segments[max(0, bisect_left(bounds, value + 1) - 1)]
+            result.append(math.floor(value * slope + intercept + 0.5))
+        return result
+    # 时间递增时, 每个分段对应一段连续的下标, 整段一起换算
+    result = array('q')
+    starts = [bisect_left(values, start) for start, _, _ in segments[1:]]
+    for (_, slope, intercept), lo, hi in zip(segments, [0] + starts, starts + [len(values)]):
+        result.extend(_linear(values[lo:hi], slope, intercept))
+    return result
+
+
+def resync(track: SubtitleTrack, anchors: Sequence[Tuple[int, int]]) -> SubtitleTrack:
+    """
+    按锚点 (原时间毫秒, 正确时间毫秒) 分段线性校准, 如片头对上了但越往后差得越多, 或中间插了广告
+    一个锚点等于平移; 锚点之间按两端的偏差线性插值, 第一个锚点之前和最后一个之后沿用相邻分段的比例
+    """
+    segments = _segments(anchors)
+    return track.with_times(_clamp(_piecewise(track.starts, segments)), _clamp(_piecewise(track.ends, segments)))
+
+
+@contextmanager
+def _gc_paused():
+    # 合并和拆分新建的元组, 列表, 字符串之间没有循环引用, 同 parse_srt 暂停循环垃圾回收,
+    # 否则百万条字幕时反复扫描这些新对象的时间比合并本身还长
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _chars(text: str) -> int:
+    # 不计空白的字数
+    return len(''.join(text.split()))
+
+
+def _char_counts(texts: List[str]) -> List[int]:
+    # 同 _chars, 一次算一批, 不逐条调用函数
+    return list(map(len, map(''.join, map(str.split, texts))))
+
+
+def merge_cues(track: SubtitleTrack, min_duration: int = 0, max_cps: Optional[float] = None, max_gap: int = 500,
+               max_chars: int = 84, max_duration: int = 7000) -> SubtitleTrack:
+    """
+    把太短 (短于 min_duration 毫秒) 或太快 (每秒字数超过 max_cps) 的字幕与下一条合并,
+    两条之间的间隔不超过 max_gap 毫秒, 合并后不超过 max_chars 个字符和 max_duration 毫秒时才合并
+    如翻译前把 "Yeah." "I know." 这种零碎的字幕并起来, 译文更连贯, 也读得过来
+    """
+    def needs_merge(duration: int, chars: int) -> bool:
+        if duration < min_duration:
+            return True
+        return bool(max_cps) and chars * 1000 > max_cps * max(duration, 1)
+
+    with _gc_paused():
+        starts, ends = track.starts.tolist(), track.ends.tolist()
+        count = len(starts)
+        if max_cps:
+            texts = list(track.texts())
+            chars = _char_counts(texts)
+            flags = list(map(needs_merge, map(sub, ends, starts), chars))
+        else:
+            flags = [end - start < min_duration for start, end in zip(starts, ends)]
+            # 不按每秒字数合并时, 只有短于 min_duration 的字幕和它前后的两条可能被合并,
+            # 只有这些字幕要取文本数字数; 要合并的不多时逐条取, 比整批取全部文本快
+            near = list(map(or_, flags, [False] + flags))
+            touched = list(compress(range(count), map(or_, near, flags[1:] + [False])))
+            if len(touched) > count // 4:
+                texts = list(track.texts())
+                chars = _char_counts(texts)
+            else:
+                texts, chars = [''] * count, [0] * count
+                for k in touched:
+                    texts[k] = track.text(k)
+                    chars[k] = _chars(texts[k])
+        replacements = []
+        # 这条或下一条需要合并时才可能合并; last 是上一组的最后一条, 组内的字幕已经处理过
+        last = -1
+        for first in compress(range(count - 1), map(or_, flags, islice(flags, 1, None))):
+            if first <= last:
+                continue
+            start = starts[first]
+            last, end, total, flag = first, ends[first], chars[first], flags[first]
+            following = first + 1
+            while following < count:
+                if not ((flag or flags[following])
+                        and starts[following] - end <= max_gap
+                        and total + chars[following] <= max_chars
+                        and ends[following] - start <= max_duration):
+                    break
+                last, end, total = following, max(end, ends[following]), total + chars[following]
+                flag = needs_merge(end - start, total)
+                following += 1
+            if last > first:
+                replacements.append((first, last + 1, [(start, end, join_lines(texts[first:last + 1]))]))
+        return track.splice(replacements)
+
+
+def split_cues(track: SubtitleTrack, max_duration: Optional[int] = None,
+               max_chars: Optional[int] = None) -> SubtitleTrack:
+    """
+    把长于 max_duration 毫秒或多于 max_chars 个字符的字幕拆成几条, 优先在标点处拆开,
+    时间按每段的字数比例分配
+    """
+    with _gc_paused():
+        starts, ends = track.starts.tolist(), track.ends.tolist()
+        durations = list(map(sub, ends, starts))
+        # 只按时长拆时, 只有要拆的字幕才取文本数字数
+        chars = None
+        if max_chars:
+            chars = _char_counts(list(track.texts()))
+            candidates = [k for k, (duration, count) in enumerate(zip(durations, chars))
+                          if count > max_chars or (max_duration and duration > max_duration)]
+        elif max_duration:
+            candidates = [k for k, duration in enumerate(durations) if duration > max_duration]
+        else:
+            candidates = []
+
+        replacements = []
+        for k in candidates:
+            text = track.text(k)
+            duration, count = durations[k], chars[k] if chars else _chars(text)
+            parts = 1
+            if max_duration:
+                parts = max(parts, math.ceil(duration / max_duration))
+            if max_chars:
+                parts = max(parts, math.ceil(count / max_chars))
+            # 每段至少留两个字, 太短的字幕不拆
+            parts = min(parts, count // 2)
+            if parts <= 1:
+                continue
+            pieces, _ = split_line(join_lines(text.split('\n')), [1] * parts)
+            lengths = [max(length, 1) for length in _char_counts(pieces)]
+            total, elapsed, start = sum(lengths), 0, starts[k]
+            cues = []
+            for piece, length in zip(pieces, lengths):
+                elapsed += length
+                end = starts[k] + round(duration * elapsed / total)
+                cues.append((start, end, piece))
+                start = end
+            replacements.append((k, k + 1, cues))
+        return track.splice(replacements)
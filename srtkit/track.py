@@ -0,0 +1,176 @@
+"""
+按列存储的字幕轨道, 百万级字幕块时比 List[SubtitleItem] 省很多内存
+"""
+from array import array
+from typing import Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+from .parser import SubtitleError, SubtitleItem, iter_srt
+
+_dedup_max_len = 32
+
+
+class SubtitleTrack:
+    """
+    序号, 开始/结束毫秒分别存在 array('q') 中, 所有文本拼成一个字符串池,
+    每条字幕只记录自己在池中的起止位置, 内容相同的短文本在池中只存一份
+
+    track[i] 返回 SubtitleItem, track[a:b] 返回共用底层数组的视图, 不复制数据, 适合切分翻译分段
+    """
+
+    __slots__ = ('_indices', '_starts', '_ends', '_pool', '_text_starts', '_text_ends', '_lo', '_hi')
+
+    def __init__(self, indices: array, starts: array, ends: array, pool: str,
+                 text_starts: array, text_ends: array, lo: int = 0, hi: Optional[int] = None):
+        self._indices = indices
+        self._starts = starts
+        self._ends = ends
+        self._pool = pool
+        self._text_starts = text_starts
+        self._text_ends = text_ends
+        self._lo = lo
+        self._hi = len(indices) if hi is None else hi
+
+    @classmethod
+    def from_items(cls, items: Iterable[SubtitleItem]) -> 'SubtitleTrack':
+        indices, starts, ends = array('q'), array('q'), array('q')
+
+        def contents():
+            # 边遍历边填充时间轴数组, 文本直接交给 _build_pool, 不会先攒一个列表
+            for item in items:
+                indices.append(item.index)
+                starts.append(item.start)
+                ends.append(item.end)
+                yield item.content
+
+        pool, text_starts, text_ends = _build_pool(contents())
+        return cls(indices, starts, ends, pool, text_starts, text_ends)
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[SubtitleItem, 'SubtitleTrack']:
+        if isinstance(key, slice):
+            lo, hi, step = key.indices(len(self))
+            if step != 1:
+                return SubtitleTrack.from_items(self[i] for i in range(lo, hi, step))
+            return SubtitleTrack(self._indices, self._starts, self._ends, self._pool,
+                                 self._text_starts, self._text_ends, self._lo + lo, self._lo + max(lo, hi))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("字幕序号超出范围")
+        i = self._lo + key
+        return SubtitleItem(self._indices[i], self._starts[i], self._ends[i],
+                            self._pool[self._text_starts[i]:self._text_ends[i]])
+
+    def __iter__(self) -> Iterator[SubtitleItem]:
+        pool = self._pool
+        for i in range(self._lo, self._hi):
+            yield SubtitleItem(self._indices[i], self._starts[i], self._ends[i],
+                               pool[self._text_starts[i]:self._text_ends[i]])
+
+    @property
+    def indices(self) -> memoryview:
+        return memoryview(self._indices)[self._lo:self._hi]
+
+    @property
+    def starts(self) -> memoryview:
+        return memoryview(self._starts)[self._lo:self._hi]
+
+    @property
+    def ends(self) -> memoryview:
+        return memoryview(self._ends)[self._lo:self._hi]
+
+    def text(self, i: int) -> str:
+        i = self._lo + (i + len(self) if i < 0 else i)
+        return self._pool[self._text_starts[i]:self._text_ends[i]]
+
+    def texts(self) -> Iterator[str]:
+        pool = self._pool
+        for i in range(self._lo, self._hi):
+            yield pool[self._text_starts[i]:self._text_ends[i]]
+
+    def with_texts(self, texts: Iterable[str]) -> 'SubtitleTrack':
+        """替换全部文本, 序号和时间轴与原轨道共用, 如用译文生成新字幕"""
+        pool, text_starts, text_ends = _build_pool(texts)
+        if len(text_starts) != len(self):
+            raise SubtitleError(f"文本数量 ({len(text_starts)}) 与字幕数量 ({len(self)}) 不匹配")
+        # 文本位置数组从 0 开始, 这里补齐视图前面的位置, 让下标与共用的时间轴数组对齐
+        padding = array('q', bytes(8 * self._lo))
+        return SubtitleTrack(self._indices, self._starts, self._ends, pool,
+                             padding + text_starts, padding + text_ends, self._lo, self._hi)
+
+    def with_times(self, starts: Iterable[int], ends: Iterable[int]) -> 'SubtitleTrack':
+        """替换时间轴, 序号和文本与原轨道共用, 如整体平移或缩放"""
+        # 已经是 array('q') 时直接使用, 百万条字幕时省掉两次复制
+        starts = starts if isinstance(starts, array) and starts.typecode == 'q' else array('q', starts)
+        ends = ends if isinstance(ends, array) and ends.typecode == 'q' else array('q', ends)
+        if len(starts) != len(self) or len(ends) != len(self):
+            raise SubtitleError(f"时间数量 ({len(starts)}, {len(ends)}) 与字幕数量 ({len(self)}) 不匹配")
+        if self._lo:
+            padding = array('q', bytes(8 * self._lo))
+            starts, ends = padding + starts, padding + ends
+        return SubtitleTrack(self._indices, starts, ends, self._pool, self._text_starts, self._text_ends,
+                             self._lo, self._hi)
+
+    def splice(self, replacements: Iterable[Tuple[int, int, Sequence[Tuple[int, int, str]]]]) -> 'SubtitleTrack':
+        """
+        把第 [lo, hi) 条字幕换成新的 (开始, 结束, 文本) 列表, replacements 按 lo 递增且互不重叠, 结果从 1 重新编号
+        没换掉的字幕整段复制时间和文本位置, 文本仍指向原来的字符串池, 新文本追加在池的后面
+        """
+        columns = [self._starts, self._ends, self._text_starts, self._text_ends]
+        starts, ends, text_starts, text_ends = outputs = [array('q') for _ in columns]
+        added, position = [], len(self._pool)
+        copied = self._lo
+        for lo, hi, cues in replacements:
+            lo, hi = self._lo + lo, self._lo + hi
+            if lo > copied:
+                for output, column in zip(outputs, columns):
+                    output += column[copied:lo]
+            for start, end, text in cues:
+                starts.append(start)
+                ends.append(end)
+                text_starts.append(position)
+                position += len(text)
+                text_ends.append(position)
+                added.append(text)
+            copied = hi
+        for output, column in zip(outputs, columns):
+            output += column[copied:self._hi]
+        pool = self._pool + ''.join(added) if added else self._pool
+        return SubtitleTrack(array('q', range(1, len(starts) + 1)), starts, ends, pool, text_starts, text_ends)
+
+
+def _build_pool(texts: Iterable[str]):
+    """
+    把文本拼成一个字符串池, 返回 (池, 每条的起始位置, 每条的结束位置)
+    只对短文本去重, 像 "Yeah." "What?" 这种重复台词很多, 长句几乎不会重复, 记下来反而占内存
+    每攒够一批就先拼接成一段, 构建过程中不会同时存在上百万个小字符串对象
+    """
+    segments, batch = [], []
+    seen = {}
+    text_starts, text_ends = array('q'), array('q')
+    position = 0
+    for text in texts:
+        start = seen.get(text) if len(text) <= _dedup_max_len else None
+        if start is None:
+            start = position
+            if len(text) <= _dedup_max_len:
+                seen[text] = start
+            batch.append(text)
+            position += len(text)
+            if len(batch) >= 4096:
+                segments.append(''.join(batch))
+                batch = []
+        text_starts.append(start)
+        text_ends.append(start + len(text))
+    segments.append(''.join(batch))
+    return ''.join(segments), text_starts, text_ends
+
+
+def load_srt(file_path: str) -> SubtitleTrack:
+    """流式解析字幕文件, 直接构建 SubtitleTrack, 不会产生完整的 SubtitleItem 列表"""
+    track = SubtitleTrack.from_items(iter_srt(file_path))
+    if not len(track):
+        raise SubtitleError("字幕文件为空")
+    return track
@@ -0,0 +1,127 @@
+"""
+字幕文本的清理规则, 根目录脚本和 pipeline 共用, 都以一行文本为单位
+"""
+import argparse
+import re
+from typing import Callable, Dict, Sequence, Tuple, Union
+
+from .parser import SubtitleError, iter_srt
+from .writer import write_items
+
+# 去掉这些结尾标点, 中文字幕里句末标点通常用空格或换行代替
+_trailing_punctuation = '.。!！?？,，'
+
+
+def strip_trailing_punctuation(line: str) -> str:
+    """去掉首尾空白和结尾的一个标点符号"""
+    content = line.strip()
+    if content and content[-1] in _trailing_punctuation:
+        content = content[:-1]
+    return content
+
+
+def capitalize_line(line: str) -> str:
+    """行首是字母时改为大写"""
+    if line.strip() and line[0].isalpha():
+        return line[0].upper() + line[1:]
+    return line
+
+
+def map_lines(text: str, transform: Callable[[str], str]) -> str:
+    """对字幕内容的每一行分别应用 transform"""
+    return '\n'.join(transform(line) for line in text.split('\n'))
+
+
+def normalize_whitespace(line: str) -> str:
+    """去掉首尾空白, 连续的空白 (包括全角空格和制表符) 合并成一个空格"""
+    return ' '.join(line.split())
+
+
+_cjk_before_latin = re.compile(r'([぀-ヿ㐀-䶿一-鿿])([A-Za-z0-9])')
+_latin_before_cjk = re.compile(r'([A-Za-z0-9])([぀-ヿ㐀-䶿一-鿿])')
+
+
+def space_cjk_latin(line: str) -> str:
+    """中日文与英文字母, 数字之间加一个空格, 如 "由于Elon Musk的影响" -> "由于 Elon Musk 的影响" """
+    return _latin_before_cjk.sub(r'\1 \2', _cjk_before_latin.sub(r'\1 \2', line))
+
+
+# 规则名 -> 对一行文本的处理
+named_rules: Dict[str, Callable[[str], str]] = {
+    "capitalize": capitalize_line,
+    "strip-punctuation": strip_trailing_punctuation,
+    "whitespace": normalize_whitespace,
+    "cjk-spacing": space_cjk_latin,
+}
+
+# 规则: named_rules 中的名字, 或 (正则, 替换) 表示一条正则替换
+Rule = Union[str, Tuple[str, str]]
+
+
+def _regex_rule(pattern: str, replacement: str) -> Callable[[str], str]:
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise SubtitleError(f"正则表达式错误 {pattern}: {e}")
+    return lambda line: compiled.sub(replacement, line)
+
+
+class TextRules:
+    """
+    按顺序应用的一组文本规则, 创建时编译一次, 只作用于字幕内容, 不碰序号和时间戳
+    所有规则都以行为单位, 每行依次经过全部规则, 多条规则也只遍历一次文本
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = tuple(rule if isinstance(rule, str) else tuple(rule) for rule in rules)
+        functions = []
+        for rule in self.rules:
+            if isinstance(rule, str):
+                if rule not in named_rules:
+                    raise SubtitleError(f"未知的规则: {rule}, 可选: {', '.join(named_rules)}")
+                functions.append(named_rules[rule])
+            else:
+                functions.append(_regex_rule(*rule))
+        self._functions = functions
+
+    def __reduce__(self):
+        # 编译好的函数不能序列化, 传给批量模式的子进程时按规则重新编译
+        return TextRules, (self.rules,)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def apply_line(self, line: str) -> str:
+        for function in self._functions:
+            line = function(line)
+        return line
+
+    def apply(self, text: str) -> str:
+        if '\n' not in text:
+            return self.apply_line(text)
+        return '\n'.join(map(self.apply_line, text.split('\n')))
+
+    def apply_file(self, input_file: str, output_file: str) -> int:
+        """流式读取字幕文件, 处理每条字幕的内容后写出, 返回字幕条数; 输出文件可以就是输入文件"""
+        def applied():
+            for item in iter_srt(input_file):
+                item.content = self.apply(item.content)
+                yield item
+
+        return write_items(applied(), output_file, "srt")
+
+
+class _RuleAction(argparse.Action):
+    """--rule 和 --replace 追加到同一个列表, 保留命令行上的先后顺序"""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        rules = list(getattr(namespace, self.dest) or [])
+        rules.append(values if isinstance(values, str) else tuple(values))
+        setattr(namespace, self.dest, rules)
+
+
+def add_rule_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--rule", dest="rules", action=_RuleAction, default=[], choices=list(named_rules),
+                        help="按顺序应用的文本规则, 可以重复")
+    parser.add_argument("--replace", dest="rules", action=_RuleAction, nargs=2, metavar=("PATTERN", "REPLACEMENT"),
+                        help="正则替换 (按行匹配), 与 --rule 按命令行上的顺序执行, 可以重复")
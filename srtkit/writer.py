@@ -0,0 +1,257 @@
+"""
+字幕文件输出: srt, WebVTT, ASS 三种格式, 以及原文 + 译文的双语字幕
+
+所有输出都先写入 <输出文件>.part, 写完后改名为输出文件, 中途崩溃不会留下截断的输出文件;
+每 4096 条字幕拼成一段再写, 时间戳按批查表生成, 不会为每条字幕创建 SubtitleItem
+"""
+import argparse
+import os
+import re
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from .parser import SubtitleError, SubtitleItem
+from .track import SubtitleTrack
+
+_batch_size = 4096
+
+
+@contextmanager
+def atomic_write(output_path: str) -> Iterator[TextIO]:
+    """写入 <output_path>.part, 正常结束时改名为 output_path, 出错时删掉 .part, 原来的输出文件保持不变"""
+    part_path = f"{output_path}.part"
+    f = open(part_path, 'w', encoding='utf-8')
+    try:
+        with f:
+            yield f
+    except BaseException:
+        Path(part_path).unlink(missing_ok=True)
+        raise
+    os.replace(part_path, output_path)
+
+
+# 时间戳查表生成: 按分钟的 "时:分:" 前缀只有几百种, 再拼上查表得到的秒和毫秒, 比逐个 divmod 格式化快几倍
+_seconds = {separator: [f"{second:02d}{separator}" for second in range(60)] for separator in ',.'}
+_millis = [f"{ms:03d}" for ms in range(1000)]
+_centis = [f"{cs:02d}" for cs in range(100)]
+
+
+def _minute_heads(values: Sequence[int], hour_width: int = 2) -> Tuple[int, List[str]]:
+    """一批时间覆盖的每一分钟的 "时:分:" 前缀, 返回 (第一分钟, 前缀列表)"""
+    first = min(values) // 60000
+    return first, [f"{minute // 60:0{hour_width}d}:{minute % 60:02d}:"
+                   for minute in range(first, max(values) // 60000 + 1)]
+
+
+def _timestamps(values: Sequence[int], separator: str = ',') -> List[str]:
+    """毫秒转为 00:01:02,345 (separator 为 '.' 时是 WebVTT 的 00:01:02.345)"""
+    if not len(values):
+        return []
+    (first, heads), seconds, millis = _minute_heads(values), _seconds[separator], _millis
+    return [f"{heads[value // 60000 - first]}{seconds[value // 1000 % 60]}{millis[value % 1000]}"
+            for value in values]
+
+
+def _ass_timestamps(values: Sequence[int]) -> List[str]:
+    """毫秒转为 ASS 的 0:01:02.34, 精确到百分之一秒"""
+    if not len(values):
+        return []
+    (first, heads), seconds, centis = _minute_heads(values, 1), _seconds['.'], _centis
+    return [f"{heads[value // 60000 - first]}{seconds[value // 1000 % 60]}{centis[value % 1000 // 10]}"
+            for value in values]
+
+
+def _srt_batch(indices: Sequence[int], starts: Sequence[int], ends: Sequence[int], texts: List[str]) -> str:
+    return ''.join([f"{index}\n{start} --> {end}\n{text}\n\n" for index, start, end, text
+                    in zip(indices, _timestamps(starts), _timestamps(ends), texts)])
+
+
+def _vtt_batch(indices: Sequence[int], starts: Sequence[int], ends: Sequence[int], texts: List[str]) -> str:
+    # WebVTT 的内容里不能出现 "-->", <i> <b> 等标签与 srt 相同, 原样保留
+    return ''.join([f"{index}\n{start} --> {end}\n{text.replace('-->', '->')}\n\n" for index, start, end, text
+                    in zip(indices, _timestamps(starts, '.'), _timestamps(ends, '.'), texts)])
+
+
+# srt 中常见的 <i> <b> <u> 标签转为 ASS 的覆盖标签, 其余标签 (如 <font>) 去掉
+_srt_tag = re.compile(r'<(/?)([ibu])>|</?font[^>]*>', re.IGNORECASE)
+
+
+# 字幕原文中的 { } 会被当作覆盖标签块, \ 加字母 (如 \N \h \i1) 会被当作换行或样式命令:
+# 花括号换成全角, 反斜杠和字母之间插入不可见的 U+2060, 与 vtt 里把 "-->" 换掉一样, 保证原文按字面显示
+_ass_braces = str.maketrans("{}", "｛｝")
+_ass_command = re.compile(r'\\(?=[A-Za-z])')
+
+
+def _ass_text(text: str) -> str:
+    if '{' in text or '}' in text:
+        text = text.translate(_ass_braces)
+    if '\\' in text:
+        text = _ass_command.sub('\\\u2060', text)
+    if '<' in text:
+        text = _srt_tag.sub(lambda m: f"{{\\{m.group(2).lower()}{0 if m.group(1) else 1}}}" if m.group(2) else '', text)
+    return text.replace('\n', '\\N')
+
+
+def _ass_batch(indices: Sequence[int], starts: Sequence[int], ends: Sequence[int], texts: List[str]) -> str:
+    return ''.join([f"Dialogue: 0,{start},{end},Default,,0,0,0,,{_ass_text(text)}\n" for start, end, text
+                    in zip(_ass_timestamps(starts), _ass_timestamps(ends), texts)])
+
+
+_ass_header = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, \
+Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, \
+MarginV, Encoding
+Style: Default,Arial,60,&H00FFFFFF,&H000000FF,&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,2,1,2,40,40,40,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+# 格式名 -> (文件头, 一批字幕的格式化函数)
+output_formats: Dict[str, Tuple[str, Callable[..., str]]] = {
+    "srt": ("", _srt_batch),
+    "vtt": ("WEBVTT\n\n", _vtt_batch),
+    "ass": (_ass_header, _ass_batch),
+}
+_suffix_formats = {".srt": "srt", ".vtt": "vtt", ".ass": "ass"}
+
+
+def format_for_path(file_path: str) -> str:
+    """按扩展名确定输出格式, 不认识的扩展名按 srt 输出"""
+    return _suffix_formats.get(Path(file_path).suffix.lower(), "srt")
+
+
+def bilingual_texts(originals: Iterable[str], translations: Iterable[str],
+                    translation_first: bool = False) -> Iterator[str]:
+    """双语字幕的内容: 每条原文和译文各占一行 (默认原文在上), 译文为空的只保留原文"""
+    for original, translation in zip(originals, translations):
+        if not translation.strip():
+            yield original
+        elif translation_first:
+            yield f"{translation}\n{original}"
+        else:
+            yield f"{original}\n{translation}"
+
+
+def _output_format(output_path: str, output_format: Optional[str]) -> Tuple[str, Callable[..., str]]:
+    output_format = output_format or format_for_path(output_path)
+    if output_format not in output_formats:
+        raise SubtitleError(f"不支持的输出格式: {output_format}, 可选: {', '.join(output_formats)}")
+    return output_formats[output_format]
+
+
+def write_track(track: SubtitleTrack, output_path: str, output_format: Optional[str] = None,
+                texts: Optional[Iterable[str]] = None) -> int:
+    """
+    把字幕轨道写成 output_format (默认按扩展名) 格式的文件, 返回字幕条数
+    texts 不为空时代替轨道中的文本, 如译文或 bilingual_texts(), 不用先生成一条新的轨道
+    """
+    header, format_batch = _output_format(output_path, output_format)
+    texts = iter(track.texts() if texts is None else texts)
+    indices, starts, ends = track.indices, track.starts, track.ends
+    with atomic_write(output_path) as f:
+        f.write(header)
+        for lo in range(0, len(track), _batch_size):
+            hi = min(lo + _batch_size, len(track))
+            batch = list(islice(texts, hi - lo))
+            if len(batch) != hi - lo:
+                raise SubtitleError(f"文本数量 ({lo + len(batch)}) 少于字幕数量 ({len(track)})")
+            f.write(format_batch(indices[lo:hi], starts[lo:hi], ends[lo:hi], batch))
+    return len(track)
+
+
+def write_items(items: Iterable[SubtitleItem], output_path: str, output_format: Optional[str] = None) -> int:
+    """边读边写一串字幕 (如 iter_srt 的结果), 不需要先构建轨道, 返回字幕条数"""
+    header, format_batch = _output_format(output_path, output_format)
+    items = iter(items)
+    count = 0
+    with atomic_write(output_path) as f:
+        f.write(header)
+        while True:
+            batch = list(islice(items, _batch_size))
+            if not batch:
+                break
+            f.write(format_batch([item.index for item in batch], [item.start for item in batch],
+                                 [item.end for item in batch], [item.content for item in batch]))
+            count += len(batch)
+    return count
+
+
+def save_srt(track: SubtitleTrack, file_path: str):
+    """把字幕轨道写成 srt 文件"""
+    write_track(track, file_path, "srt")
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--format", dest="output_format", default="srt", choices=list(output_formats),
+                        help="输出格式 (默认: srt)")
+    parser.add_argument("--bilingual", action="store_true", help="输出双语字幕: 每条原文在上, 译文在下")
+
+
+class OrderedSrtWriter:
+    """
+    按轨道顺序边翻译边写出字幕: 文本可以以任意顺序到达, 前面的字幕都齐了才会写进文件
+    先写入 <输出文件>.part, commit() 时确认全部写完再改名为输出文件, 中途崩溃不会留下截断的输出文件
+    可以被多个线程同时调用
+    """
+
+    def __init__(self, output_path: str, track: SubtitleTrack):
+        self.output_path = output_path
+        self.part_path = f"{output_path}.part"
+        self.track = track
+        self._pending = {}
+        self._next = 0
+        self._lock = threading.Lock()
+        self._file = open(self.part_path, 'w', encoding='utf-8')
+
+    def put(self, position: int, text: str):
+        """提交轨道中第 position 条字幕的文本, 重复提交时保留第一次的文本"""
+        with self._lock:
+            if position >= self._next:
+                self._pending.setdefault(position, text)
+            self._flush_ready()
+
+    def put_many(self, start: int, texts: Iterable[str]):
+        with self._lock:
+            for position, text in enumerate(texts, start):
+                if position >= self._next:
+                    self._pending.setdefault(position, text)
+            self._flush_ready()
+
+    @property
+    def written(self) -> int:
+        return self._next
+
+    def _flush_ready(self):
+        if self._next not in self._pending:
+            return
+        lo, texts = self._next, []
+        while self._next in self._pending:
+            texts.append(self._pending.pop(self._next))
+            self._next += 1
+        track = self.track
+        self._file.write(_srt_batch(track.indices[lo:self._next], track.starts[lo:self._next],
+                                    track.ends[lo:self._next], texts))
+        self._file.flush()
+
+    def commit(self):
+        with self._lock:
+            if self._next != len(self.track):
+                raise SubtitleError(f"字幕没有全部写完: {self._next}/{len(self.track)}")
+            self._file.close()
+            os.replace(self.part_path, self.output_path)
+
+    def close(self):
+        """放弃写出, 保留已写的 .part 文件"""
+        with self._lock:
+            self._file.close()